@@ -33,12 +33,17 @@ Several things happen when you do:
     file which was constructed and installed during SCons installation.
 
  3) All available input plugins and TrueType fonts are automatically registered.
+    With MAPNIK_LAZY_PLUGINS=1 input plugins are only indexed and each one is
+    loaded on first use.
 
 """
 
 import itertools
+import json
 import os
+import threading
 import warnings
+from collections import OrderedDict
 
 def bootstrap_env():
     """
@@ -90,7 +95,7 @@ def CSV(**keywords):
       file -- path to csv
 
     Optional keyword arguments:
-      inline -- inline CSV string (if provided 'file' argument will be ignored and non-needed)
+      inline -- inline CSV string, or bytes-like object such as bytes or mmap (if provided 'file' argument will be ignored and non-needed)
       base -- path prefix (default None)
       encoding -- file encoding (default 'utf-8')
       row_limit -- integer limit of rows to return (default: 0)
@@ -100,6 +105,7 @@ def CSV(**keywords):
       separator -- The separator character to use for parsing data
       headers -- A comma separated list of header names that can be set to add headers to data that lacks them
       filesize_max -- The maximum filesize in MB that will be accepted
+      share_instance -- reuse the parsed datasource for identical arguments (default: see DatasourceCache.enable_sharing)
 
     >>> from mapnik import CSV
     >>> csv = CSV(file='test.csv')
@@ -107,6 +113,10 @@ def CSV(**keywords):
     >>> from mapnik import CSV
     >>> csv = CSV(inline='''wkt,Name\n"POINT (120.15 48.47)","Winthrop, WA"''')
 
+    >>> import mmap
+    >>> with open('big.csv', 'rb') as f:
+    ...     csv = CSV(inline=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), share_instance=True)
+
     For more information see https://github.com/mapnik/mapnik/wiki/CSV-Plugin
 
     """
@@ -122,6 +132,8 @@ def GeoJSON(**keywords):
     Optional keyword arguments:
       encoding -- file encoding (default 'utf-8')
       base -- path prefix (default None)
+      inline -- inline GeoJSON string, or bytes-like object such as bytes or mmap (if provided 'file' argument will be ignored)
+      share_instance -- reuse the parsed datasource for identical arguments (default: see DatasourceCache.enable_sharing)
 
     >>> from mapnik import GeoJSON
     >>> geojson = GeoJSON(file='test.json')
@@ -376,30 +388,152 @@ def Rasterlite(**keywords):
     keywords['type'] = 'rasterlite'
     return CreateDatasource(**keywords)
 
-def register_plugins(path=None):
-    """Register plugins located by specified path"""
+# encoded blank tiles, least recently used first
+_blank_tiles = OrderedDict()
+_blank_tiles_lock = threading.Lock()
+_BLANK_TILES_MAX = 32
+
+
+def render_tile(m, format='png', scale_factor=1.0, skip_empty=False):
+    """Render the map at its current extent and return the encoded image.
+
+    With skip_empty=True the layers are first probed with Map.has_features
+    and when nothing can be drawn a cached encoding of the background is
+    returned instead of rendering and encoding the tile again.
+
+    >>> from mapnik import Map, load_map, render_tile
+    >>> m = Map(256, 256)
+    >>> load_map(m, 'mapfile.xml')
+    >>> m.zoom_to_box(bbox)
+    >>> png = render_tile(m, 'png8', skip_empty=True)
+
+    """
+    if skip_empty and not m.has_features():
+        key = (m.width, m.height, str(m.background), m.background_image,
+               m.background_image_comp_op, m.background_image_opacity,
+               format, scale_factor)
+        with _blank_tiles_lock:
+            encoded = _blank_tiles.get(key)
+            if encoded is not None:
+                _blank_tiles.move_to_end(key)
+                return encoded
+        im = Image(m.width, m.height)
+        render(m, im, scale_factor)
+        encoded = im.to_string(format)
+        with _blank_tiles_lock:
+            _blank_tiles[key] = encoded
+            while len(_blank_tiles) > _BLANK_TILES_MAX:
+                _blank_tiles.popitem(last=False)
+        return encoded
+    im = Image(m.width, m.height)
+    render(m, im, scale_factor)
+    return im.to_string(format)
+
+
+def register_plugins(path=None, lazy=None):
+    """Register plugins located by specified path
+
+    With lazy=True plugins are only indexed by name and each one is loaded
+    by the first datasource that needs it. lazy defaults to the
+    MAPNIK_LAZY_PLUGINS environment variable.
+    """
     if not path:
         if 'MAPNIK_INPUT_PLUGINS_DIRECTORY' in os.environ:
             path = os.environ.get('MAPNIK_INPUT_PLUGINS_DIRECTORY')
         else:
             from .paths import inputpluginspath
             path = inputpluginspath
-    DatasourceCache.register_datasources(path, False)
+    if lazy is None:
+        lazy = os.environ.get('MAPNIK_LAZY_PLUGINS', '').lower() in ('1', 'true', 'yes', 'on')
+    if not lazy:
+        DatasourceCache.register_datasources(path, False)
+        return
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith('.input'):
+            DatasourceCache.register_datasource_lazy(os.path.join(path, filename))
+
+
+def _font_cache_path():
+    if 'MAPNIK_FONT_CACHE' in os.environ:
+        return os.environ['MAPNIK_FONT_CACHE'] or None
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'mapnik', 'fonts.json')
+
+
+def _load_font_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+        if cache.get('version') == 1:
+            return cache['files']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {}
+
+
+def _save_font_cache(cache_path, files):
+    tmp = '%s.%d.tmp' % (cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp, 'w') as f:
+            json.dump({'version': 1, 'files': files}, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        # a read-only home directory only costs the next import a rescan
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
 
 
 def register_fonts(path=None, valid_extensions=[
-                   '.ttf', '.otf', '.ttc', '.pfa', '.pfb', '.ttc', '.dfont', '.woff']):
-    """Recursively register fonts using path argument as base directory"""
+                   '.ttf', '.otf', '.ttc', '.pfa', '.pfb', '.ttc', '.dfont', '.woff'],
+                   cache=True):
+    """Recursively register fonts using path argument as base directory
+
+    Face names and indices are kept in a cache file keyed by font path,
+    modification time and size, so unchanged fonts are registered without
+    opening them; FreeType only reads a font when it is first rendered.
+    The cache lives in $XDG_CACHE_HOME/mapnik/fonts.json unless
+    MAPNIK_FONT_CACHE names another file; an empty MAPNIK_FONT_CACHE or
+    cache=False disables it.
+    """
     if not path:
         if 'MAPNIK_FONT_DIRECTORY' in os.environ:
             path = os.environ.get('MAPNIK_FONT_DIRECTORY')
         else:
             from .paths import fontscollectionpath
             path = fontscollectionpath
+    cache_path = _font_cache_path() if cache else None
+    if cache_path is None:
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                if os.path.splitext(filename.lower())[1] in valid_extensions:
+                    FontEngine.register_font(os.path.join(dirpath, filename))
+        return
+    files = _load_font_cache(cache_path)
+    changed = False
     for dirpath, _, filenames in os.walk(path):
-        for filename in filenames:
-            if os.path.splitext(filename.lower())[1] in valid_extensions:
-                FontEngine.register_font(os.path.join(dirpath, filename))
+        for filename in sorted(filenames):
+            if os.path.splitext(filename.lower())[1] not in valid_extensions:
+                continue
+            font = os.path.abspath(os.path.join(dirpath, filename))
+            try:
+                st = os.stat(font)
+            except OSError:
+                continue
+            entry = files.get(font)
+            if entry is None or entry['mtime'] != st.st_mtime or entry['size'] != st.st_size:
+                entry = files[font] = {'mtime': st.st_mtime, 'size': st.st_size,
+                                       'faces': FontEngine.scan_font(font)}
+                changed = True
+            for name, index in entry['faces']:
+                FontEngine.register_face(name, font, index)
+    if changed:
+        # forget fonts that were removed from disk
+        for font in [f for f in files if not os.path.exists(f)]:
+            del files[font]
+        _save_font_cache(cache_path, files)
 
 # # auto-register known plugins and fonts
 register_plugins()
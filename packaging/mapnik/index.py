@@ -0,0 +1,196 @@
+#
+# This file is part of Mapnik (c++ mapping toolkit)
+# Copyright (C) 2024 Artem Pavlenko
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+"""Build spatial index files for shapefile, CSV and GeoJSON datasources.
+
+The files written are the same as the ones produced by the `shapeindex`
+and `mapnik-index` command line tools, so the input plugins pick them up
+automatically:
+
+    >>> from mapnik import index
+    >>> index.build(['roads.shp', 'pois.csv', 'parks.geojson'], threads=4)
+    {'roads.shp': 1520, 'pois.csv': 80, 'parks.geojson': 12}
+
+Records can also be rewritten in Hilbert curve order first, so features
+that are close in space are close on disk and bbox reads stay contiguous:
+
+    >>> index.build('roads.shp', hilbert=True)
+
+Files are scanned natively and streamed, they are never read into memory
+as a whole.
+"""
+
+import os
+import struct
+
+from mapnik._mapnik import _build_index, _hilbert_records
+
+__all__ = ['build', 'hilbert_sort', 'DEFAULT_DEPTH', 'DEFAULT_RATIO']
+
+DEFAULT_DEPTH = 8
+DEFAULT_RATIO = 0.55
+
+_KINDS = {'.shp': 'shape', '.csv': 'csv', '.tsv': 'csv',
+          '.json': 'geojson', '.geojson': 'geojson'}
+_KNOWN_KINDS = ('shape', 'csv', 'geojson')
+
+
+def _shape_base(path):
+    base, ext = os.path.splitext(path)
+    return base if ext.lower() == '.shp' else path
+
+
+def _copy(src, offset, size, dst):
+    src.seek(offset)
+    while size > 0:
+        chunk = src.read(min(size, 1 << 20))
+        if not chunk:
+            raise RuntimeError('%s: unexpected end of file' % src.name)
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def _sort_shape(path):
+    base = _shape_base(path)
+    records = _hilbert_records(path, 'shape')
+    with open(base + '.shp', 'rb') as shp, open(base + '.shx', 'rb') as shx, \
+            open(base + '.dbf', 'rb') as dbf, \
+            open(base + '.shp.tmp', 'wb') as shp_out, open(base + '.shx.tmp', 'wb') as shx_out, \
+            open(base + '.dbf.tmp', 'wb') as dbf_out:
+        dbf_header = dbf.read(32)
+        num_records, header_length, record_length = struct.unpack_from('<IHH', dbf_header, 4)
+        if num_records != len(records):
+            raise RuntimeError('%s: .dbf and .shx record counts differ' % path)
+        shp_out.write(shp.read(100))
+        shx_out.write(shx.read(100))
+        _copy(dbf, 0, header_length, dbf_out)
+        offset = 100
+        for number, (i, record_offset, size) in enumerate(records, 1):
+            shp_out.write(struct.pack('>ii', number, size // 2))
+            _copy(shp, record_offset + 8, size, shp_out)
+            shx_out.write(struct.pack('>ii', offset // 2, size // 2))
+            offset += 8 + size
+            _copy(dbf, header_length + i * record_length, record_length, dbf_out)
+        # the end of file marker and anything else following the records
+        dbf.seek(header_length + num_records * record_length)
+        dbf_out.write(dbf.read())
+    for ext in ('.shp', '.shx', '.dbf'):
+        os.replace(base + ext + '.tmp', base + ext)
+    return len(records)
+
+
+def _sort_geojson(path):
+    records = _hilbert_records(path, 'geojson')
+    if not records:
+        return 0
+    start = min(offset for _, offset, _ in records)
+    end = max(offset + size for _, offset, size in records)
+    tmp = path + '.tmp'
+    # everything around the features array is kept as is
+    with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+        _copy(src, 0, start, dst)
+        for n, (_, offset, size) in enumerate(records):
+            if n:
+                dst.write(b',')
+            _copy(src, offset, size, dst)
+        src.seek(end)
+        for chunk in iter(lambda: src.read(1 << 20), b''):
+            dst.write(chunk)
+    os.replace(tmp, path)
+    return len(records)
+
+
+def _path(path):
+    # the native side works on str paths, bytes are decoded like os does
+    return os.fsdecode(os.fspath(path))
+
+
+def _kind(path, kind):
+    if kind != 'auto':
+        if kind not in _KNOWN_KINDS:
+            raise ValueError("Unknown index kind '%s'" % kind)
+        return kind
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _KINDS:
+        raise ValueError("Can't guess the index kind of '%s', pass kind='shape', 'csv' or 'geojson'" % path)
+    return _KINDS[ext]
+
+
+def _index_path(path, kind):
+    return (_shape_base(path) if kind == 'shape' else path) + '.index'
+
+
+def _sort(path, kind):
+    if kind not in ('shape', 'geojson'):
+        raise ValueError("Hilbert ordering is only supported for shapefiles and GeoJSON")
+    # an index left next to the rewritten file would point at old offsets,
+    # drop it before the records move
+    index_path = _index_path(path, kind)
+    indexed = os.path.exists(index_path)
+    if indexed:
+        os.remove(index_path)
+    count = _sort_shape(path) if kind == 'shape' else _sort_geojson(path)
+    return count, indexed
+
+
+def hilbert_sort(path, kind='auto'):
+    """Rewrite the records of a shapefile or GeoJSON file in Hilbert curve order.
+
+    Records are ordered by the Hilbert distance of their bounding box centre,
+    records without geometry are kept at the end. Shapefile ids follow the
+    new record order. An existing spatial index is rebuilt for the new
+    offsets with the default depth and ratio. Returns the number of records.
+    """
+    path = _path(path)
+    kind = _kind(path, kind)
+    count, indexed = _sort(path, kind)
+    if indexed:
+        _build_index([path], [kind], DEFAULT_DEPTH, DEFAULT_RATIO, '', '"', 1)
+    return count
+
+
+def build(paths, kind='auto', threads=None, depth=DEFAULT_DEPTH, ratio=DEFAULT_RATIO,
+          hilbert=False, separator=None, quote='"'):
+    """Build or refresh the spatial index of one or more files.
+
+    paths is a path or a list of paths, as str, bytes or path-like objects.
+    kind is 'shape', 'csv', 'geojson' or 'auto' to pick by file extension.
+    Files are indexed in parallel by up to `threads` native threads (one per
+    CPU when None) with the GIL released. depth and ratio control the quad
+    tree like the command line tools. With hilbert=True shapefiles and
+    GeoJSON files are rewritten in Hilbert curve order before indexing.
+    separator and quote apply to CSV.
+
+    Index files are replaced atomically. Returns a dict mapping every path
+    to the number of indexed features.
+    """
+    if isinstance(paths, (str, bytes, os.PathLike)):
+        paths = [paths]
+    paths = [_path(p) for p in paths]
+    kinds = [_kind(p, kind) for p in paths]
+    if separator is not None and len(separator) != 1:
+        raise ValueError('separator must be a single character')
+    if len(quote) != 1:
+        raise ValueError('quote must be a single character')
+    if hilbert:
+        for path, k in zip(paths, kinds):
+            if k != 'csv':
+                _sort(path, k)
+    counts = _build_index(paths, kinds, depth, ratio, separator or '', quote, threads or 0)
+    return dict(zip(paths, counts))
@@ -0,0 +1,169 @@
+#
+# This file is part of Mapnik (c++ mapping toolkit)
+# Copyright (C) 2024 Artem Pavlenko
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+"""Helpers for seeding XYZ tile caches in spherical mercator (epsg:3857).
+
+    >>> from mapnik import Map, load_map, render_tile, tiles
+    >>> m = Map(tiles.TILE_SIZE, tiles.TILE_SIZE, 'epsg:3857')
+    >>> load_map(m, 'mapfile.xml')
+    >>> for tile in tiles.plan(m, range(0, 17), (5.9, 45.8, 10.5, 47.8)):
+    ...     m.zoom_to_box(tiles.tile_bbox(tile.z, tile.x, tile.y))
+    ...     png = render_tile(m, 'png8')
+"""
+
+import collections
+import math
+
+from mapnik import Box2d, Projection, ProjTransform
+
+MERCATOR_MAX = 20037508.342789244
+TILE_SIZE = 256
+# scale denominator of zoom 0 for 256 pixel tiles at the standard 0.28mm pixel
+ZOOM0_SCALE_DENOMINATOR = 559082264.0287178
+
+Tile = collections.namedtuple('Tile', ['z', 'x', 'y', 'empty'])
+Tile.__doc__ = """An XYZ tile; empty is True when no layer can draw anything in it."""
+
+
+def tile_bbox(z, x, y):
+    """Return the spherical mercator Box2d of tile z/x/y (y counted from the top)."""
+    size = 2 * MERCATOR_MAX / (1 << z)
+    minx = -MERCATOR_MAX + x * size
+    maxy = MERCATOR_MAX - y * size
+    return Box2d(minx, maxy - size, minx + size, maxy)
+
+
+def scale_denominator(z, tile_size=TILE_SIZE):
+    """Return the scale denominator Mapnik uses when rendering zoom z."""
+    return ZOOM0_SCALE_DENOMINATOR * TILE_SIZE / tile_size / (1 << z)
+
+
+class _LayerProbe(object):
+
+    def __init__(self, layer, zooms, tile_size, map_buffer_size):
+        self.layer = layer
+        # the layer buffer size wins over the map one, as in the renderer
+        self.buffer_size = layer.buffer_size if layer.buffer_size is not None else map_buffer_size
+        self.datasource = layer.datasource
+        self.envelope = layer.envelope()
+        self.transform = ProjTransform(Projection('epsg:3857'), Projection(layer.srs))
+        self.zooms = set(z for z in zooms if layer.visible(scale_denominator(z, tile_size)))
+        self.max_zoom = max(self.zooms) if self.zooms else -1
+
+    def may_draw(self, tile_box, pixel_size):
+        bbox = Box2d(tile_box.minx, tile_box.miny, tile_box.maxx, tile_box.maxy)
+        if self.buffer_size:
+            bbox.pad(pixel_size * self.buffer_size)
+        try:
+            box = self.transform.forward(bbox)
+        except Exception:
+            # bbox outside the layer projection bounds, stay conservative
+            return True
+        if not box.intersects(self.envelope):
+            return False
+        return self.datasource.has_features(box)
+
+
+def _in_range(z, x, y, ranges):
+    minx, miny, maxx, maxy = ranges[z]
+    return minx <= x <= maxx and miny <= y <= maxy
+
+
+def _tile_ranges(bbox, max_zoom):
+    transform = ProjTransform(Projection('epsg:4326'), Projection('epsg:3857'))
+    merc = transform.forward(bbox)
+    ranges = []
+    for z in range(max_zoom + 1):
+        n = 1 << z
+        size = 2 * MERCATOR_MAX / n
+
+        def clamp(value):
+            return min(max(int(math.floor(value)), 0), n - 1)
+        # keep tiles that merely touch the bbox edge out of the range
+        eps = size * 1e-9
+        ranges.append((clamp((merc.minx + MERCATOR_MAX) / size),
+                       clamp((MERCATOR_MAX - merc.maxy) / size),
+                       clamp((merc.maxx + MERCATOR_MAX - eps) / size),
+                       clamp((MERCATOR_MAX - merc.miny - eps) / size)))
+    return ranges
+
+
+def _empty_descendants(z, x, y, zooms, max_zoom, ranges):
+    stack = [(z, x, y)]
+    while stack:
+        z, x, y = stack.pop()
+        if not _in_range(z, x, y, ranges):
+            continue
+        if z in zooms:
+            yield Tile(z, x, y, True)
+        if z < max_zoom:
+            for dx, dy in ((1, 1), (0, 1), (1, 0), (0, 0)):
+                stack.append((z + 1, 2 * x + dx, 2 * y + dy))
+
+
+def plan(m, zooms, bbox=None, include_empty=False, tile_size=TILE_SIZE):
+    """Yield the tiles of the given zooms that can contain rendered features.
+
+    The tile pyramid is walked from zoom 0 and a subtree is dropped as soon
+    as no layer has data below it. Layers are checked against their
+    envelope, their min/max scale denominators and finally with
+    Datasource.has_features for the tile extent buffered by the layer
+    buffer size, or the map one when the layer has none, which uses the
+    datasource's spatial index where there is one. Like Map.has_features,
+    inactive layers and layers without styles are ignored.
+
+    bbox is a Box2d or (minx, miny, maxx, maxy) tuple in longitude/latitude,
+    the whole world by default. With include_empty=True provably empty
+    tiles are yielded too, flagged with Tile.empty, so a seeder can store a
+    shared blank tile instead of rendering them.
+
+    Tiles are yielded depth first, parents before their children.
+    """
+    zooms = set(zooms)
+    if not zooms:
+        return
+    max_zoom = max(zooms)
+    if bbox is None:
+        bbox = Box2d(-180, -85.0511287798066, 180, 85.0511287798066)
+    elif not isinstance(bbox, Box2d):
+        bbox = Box2d(*bbox)
+    ranges = _tile_ranges(bbox, max_zoom)
+    probes = [_LayerProbe(layer, zooms, tile_size, m.buffer_size) for layer in m.layers
+              if layer.active and layer.datasource is not None and len(layer.styles)]
+
+    stack = [(0, 0, 0, [p for p in probes if p.zooms])]
+    while stack:
+        z, x, y, candidates = stack.pop()
+        if not _in_range(z, x, y, ranges):
+            continue
+        box = tile_bbox(z, x, y)
+        pixel_size = box.width() / tile_size
+        candidates = [p for p in candidates if p.max_zoom >= z and p.may_draw(box, pixel_size)]
+        if not candidates:
+            if include_empty:
+                for tile in _empty_descendants(z, x, y, zooms, max_zoom, ranges):
+                    yield tile
+            continue
+        if z in zooms:
+            empty = not any(z in p.zooms for p in candidates)
+            if include_empty or not empty:
+                yield Tile(z, x, y, empty)
+        if z < max_zoom:
+            for dx, dy in ((1, 1), (0, 1), (1, 0), (0, 0)):
+                stack.append((z + 1, 2 * x + dx, 2 * y + dy, candidates))
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+"""Compare `import mapnik` times with and without MAPNIK_LAZY_PLUGINS.
+
+Usage: python scripts/lazy_plugins_benchmark.py [iterations]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+def import_time(lazy):
+    env = dict(os.environ, MAPNIK_LAZY_PLUGINS='1' if lazy else '0')
+    start = time.time()
+    subprocess.run([sys.executable, '-c', 'import mapnik'], env=env, check=True)
+    return time.time() - start
+
+
+def main(iterations=5):
+    for lazy in (False, True):
+        timings = [import_time(lazy) for _ in range(iterations)]
+        print('import mapnik, MAPNIK_LAZY_PLUGINS=%d | min: %.1fms | avg: %.1fms' %
+              (lazy, min(timings) * 1000, sum(timings) / len(timings) * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
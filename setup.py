@@ -102,8 +102,12 @@ ext_modules = [
                "src/mapnik_expression.cpp",
                "src/mapnik_datasource.cpp",
                "src/mapnik_datasource_cache.cpp",
+               "src/mapnik_index.cpp",
+               "src/mapnik_python_datasource.cpp",
+               "src/mapnik_caching_datasource.cpp",
                "src/mapnik_gamma_method.cpp",
                "src/mapnik_geometry.cpp",
+               "src/mapnik_geometry_array.cpp",
                "src/mapnik_feature.cpp",
                "src/mapnik_featureset.cpp",
                "src/mapnik_font_engine.cpp",
@@ -0,0 +1,372 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_CACHE_TRACKER_HPP
+#define MAPNIK_PYTHON_CACHE_TRACKER_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/datasource.hpp>
+#include <mapnik/layer.hpp>
+#include <mapnik/map.hpp>
+#include <mapnik/marker.hpp>
+#include <mapnik/marker_cache.hpp>
+#include <mapnik/util/file_io.hpp>
+#include <mapnik/util/fs.hpp>
+#include "map_resources.hpp"
+#if defined(SHAPE_MEMORY_MAPPED_FILE)
+#include <mapnik/mapped_memory_cache.hpp>
+// boost
+#include <boost/interprocess/mapped_region.hpp>
+#endif
+// stl
+#include <atomic>
+#include <cstddef>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <set>
+#include <string>
+#include <unordered_map>
+#include <unordered_set>
+#include <utility>
+#include <vector>
+
+namespace python_mapnik {
+
+// Sizes, LRU order and byte budgets for the entries of mapnik's marker and mapped
+// memory caches. Neither cache can be enumerated, so entries are registered by key:
+// markers and patterns with a static path when a map using them is rendered or
+// warmed up, and the files of file based datasources once mapnik has mapped them.
+// Markers from paths built with feature attributes are not accounted for.
+// Accounting is off until it is enabled or a budget is set, renders then only
+// pay for an atomic load.
+class cache_tracker
+{
+public:
+    enum cache_kind : std::size_t { markers = 0, mapped_memory = 1 };
+
+    struct stats
+    {
+        std::size_t entries = 0;
+        std::size_t bytes = 0;
+        std::size_t evictions = 0;
+        std::size_t budget = 0; // 0: unlimited
+    };
+
+    static cache_tracker & instance()
+    {
+        static cache_tracker tracker;
+        return tracker;
+    }
+
+    bool active() const
+    {
+        return active_.load(std::memory_order_relaxed);
+    }
+
+    void set_enabled(bool enabled)
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        enabled_ = enabled;
+        update_active();
+    }
+
+    // Registers the markers and mapped files used when rendering `map` (or only
+    // `only` of its layers) at `scale_denom`, then enforces the budgets. Keys are
+    // looked up in mapnik's caches once, outside the lock, keys that turned out
+    // not to be cached are not probed again until the caches are cleared.
+    void track(mapnik::Map const& map, double scale_denom, mapnik::layer const* only = nullptr)
+    {
+        if (!active()) return;
+        std::vector<mapnik::layer const*> layers;
+        if (only) layers.push_back(only);
+        else collect_layers(map.layers(), layers);
+        std::set<std::string> style_names;
+        std::vector<std::string> mapped;
+        for (mapnik::layer const* lyr : layers)
+        {
+            if (!lyr->active() || !lyr->visible(scale_denom)) continue;
+            for (auto const& name : lyr->styles()) style_names.insert(name);
+            if (lyr->datasource()) datasource_files(*lyr->datasource(), mapped);
+        }
+        map_resources resources;
+        resources.add_styles(map, style_names, [&](mapnik::rule const& r) { return r.active(scale_denom); });
+        if (!only && map.background_image()) resources.files.insert(*map.background_image());
+
+        std::vector<std::string> new_markers;
+        std::vector<std::string> new_mapped;
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            for (auto const& file : resources.files)
+            {
+                if (!touch(markers, file) && probed_[markers].insert(file).second) new_markers.push_back(file);
+            }
+            for (auto const& file : mapped)
+            {
+                if (!touch(mapped_memory, file) && probed_[mapped_memory].insert(file).second) new_mapped.push_back(file);
+            }
+        }
+        if (new_markers.empty() && new_mapped.empty()) return;
+
+        std::vector<std::pair<std::string, std::size_t>> found_markers;
+        for (auto const& file : new_markers)
+        {
+            // the render has just loaded the markers it used
+            std::shared_ptr<mapnik::marker const> marker = mapnik::marker_cache::instance().find(file, true);
+            if (marker && !marker->is<mapnik::marker_null>())
+            {
+                found_markers.emplace_back(file, marker_bytes(file, *marker));
+            }
+        }
+        std::vector<std::pair<std::string, std::size_t>> found_mapped;
+#if defined(SHAPE_MEMORY_MAPPED_FILE)
+        for (auto const& file : new_mapped)
+        {
+            if (!mapnik::util::exists(file)) continue;
+            // without updating the cache, an uncached file comes back as a fresh
+            // mapping nobody else holds; a cached region is also held by the cache
+            auto region = mapnik::mapped_memory_cache::instance().find(file, false);
+            if (region && *region && region->use_count() > 1)
+            {
+                found_mapped.emplace_back(file, (*region)->get_size());
+            }
+        }
+#endif
+        std::lock_guard<std::mutex> lock(mutex_);
+        for (auto const& kv : found_markers) add(markers, kv.first, kv.second);
+        for (auto const& kv : found_mapped) add(mapped_memory, kv.first, kv.second);
+        enforce(markers);
+        enforce(mapped_memory);
+    }
+
+    // Registers a marker already loaded into the marker cache
+    void add_marker(std::string const& key, mapnik::marker const& marker)
+    {
+        if (!active()) return;
+        std::size_t bytes = marker_bytes(key, marker);
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (!touch(markers, key)) add(markers, key, bytes);
+        enforce(markers);
+    }
+
+    bool evict(std::string const& key)
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        bool evicted = false;
+        if (caches_[markers].entries.count(key))
+        {
+            evict_markers({key});
+            evicted = true;
+        }
+        if (caches_[mapped_memory].entries.count(key))
+        {
+            evict_mapped(key);
+            evicted = true;
+        }
+        return evicted;
+    }
+
+    // Forgets all entries, called when the caches are cleared
+    void clear()
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        for (auto & cache : caches_)
+        {
+            cache.lru.clear();
+            cache.entries.clear();
+            cache.bytes = 0;
+        }
+        for (auto & probed : probed_) probed.clear();
+    }
+
+    void set_budget(cache_kind kind, std::size_t bytes)
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        caches_[kind].budget = bytes;
+        update_active();
+        enforce(kind);
+    }
+
+    stats get_stats(cache_kind kind) const
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        cache_state const& cache = caches_[kind];
+        stats result;
+        result.entries = cache.entries.size();
+        result.bytes = cache.bytes;
+        result.evictions = cache.evictions;
+        result.budget = cache.budget;
+        return result;
+    }
+
+private:
+    struct entry
+    {
+        std::size_t bytes;
+        std::list<std::string>::iterator pos;
+    };
+
+    struct cache_state
+    {
+        std::list<std::string> lru; // most recently used first
+        std::unordered_map<std::string, entry> entries;
+        std::size_t bytes = 0;
+        std::size_t evictions = 0;
+        std::size_t budget = 0;
+    };
+
+    cache_tracker() = default;
+
+    void update_active()
+    {
+        active_.store(enabled_ || caches_[markers].budget > 0 || caches_[mapped_memory].budget > 0,
+                      std::memory_order_relaxed);
+    }
+
+    // Candidate mapped memory keys of a file based datasource: the file itself,
+    // the shapefile components and the spatial index written by shapeindex/mapnik-index
+    static void datasource_files(mapnik::datasource const& ds, std::vector<std::string> & out)
+    {
+        mapnik::parameters const& params = ds.params();
+        auto file = params.get<std::string>("file");
+        if (!file) return;
+        auto base = params.get<std::string>("base");
+        std::string path = base ? *base + "/" + *file : *file;
+        out.push_back(path);
+        out.push_back(path + ".index");
+        std::string stem = path;
+        if (stem.size() > 4 && stem.compare(stem.size() - 4, 4, ".shp") == 0) stem.erase(stem.size() - 4);
+        for (char const* ext : {".shp", ".shx", ".dbf", ".index"}) out.push_back(stem + ext);
+    }
+
+    // Decoded size of raster markers, source size of SVG markers
+    static std::size_t marker_bytes(std::string const& key, mapnik::marker const& marker)
+    {
+        if (marker.is<mapnik::marker_rgba8>())
+        {
+            return marker.get<mapnik::marker_rgba8>().get_data().size();
+        }
+        if (marker.is<mapnik::marker_svg>())
+        {
+            if (mapnik::marker_cache::instance().is_svg_uri(key)) return key.size();
+            mapnik::util::file source(key);
+            return source.is_open() ? source.size() : 0;
+        }
+        return 0;
+    }
+
+    // Moves a tracked key to the front of the LRU list, false if it is not tracked
+    bool touch(cache_kind kind, std::string const& key)
+    {
+        cache_state & cache = caches_[kind];
+        auto itr = cache.entries.find(key);
+        if (itr == cache.entries.end()) return false;
+        cache.lru.splice(cache.lru.begin(), cache.lru, itr->second.pos);
+        return true;
+    }
+
+    void add(cache_kind kind, std::string const& key, std::size_t bytes)
+    {
+        cache_state & cache = caches_[kind];
+        if (cache.entries.count(key)) return;
+        cache.lru.push_front(key);
+        cache.entries.emplace(key, entry{bytes, cache.lru.begin()});
+        cache.bytes += bytes;
+        probed_[kind].insert(key);
+    }
+
+    void forget(cache_kind kind, std::string const& key)
+    {
+        cache_state & cache = caches_[kind];
+        auto itr = cache.entries.find(key);
+        if (itr == cache.entries.end()) return;
+        cache.bytes -= itr->second.bytes;
+        cache.lru.erase(itr->second.pos);
+        cache.entries.erase(itr);
+        ++cache.evictions;
+        // reloaded by a later render, account for it again
+        probed_[kind].erase(key);
+    }
+
+    // marker_cache has no way to drop a single key, it can only be cleared as a
+    // whole: the tracked markers that are kept are put back, the untracked ones
+    // are reloaded on their next use. SVG markers share their parsed paths, only
+    // raster markers are copied.
+    void evict_markers(std::vector<std::string> const& keys)
+    {
+        for (auto const& key : keys) forget(markers, key);
+        mapnik::marker_cache & cache = mapnik::marker_cache::instance();
+        std::vector<std::pair<std::string, std::shared_ptr<mapnik::marker const>>> kept;
+        kept.reserve(caches_[markers].entries.size());
+        for (auto const& key : caches_[markers].lru)
+        {
+            std::shared_ptr<mapnik::marker const> marker = cache.find(key, false);
+            if (marker) kept.emplace_back(key, marker);
+        }
+        cache.clear();
+        for (auto & kv : kept)
+        {
+            cache.insert_marker(kv.first, mapnik::marker(*kv.second));
+        }
+    }
+
+    void evict_mapped(std::string const& key)
+    {
+        forget(mapped_memory, key);
+#if defined(SHAPE_MEMORY_MAPPED_FILE)
+        mapnik::mapped_memory_cache::instance().remove(key);
+#endif
+    }
+
+    void enforce(cache_kind kind)
+    {
+        cache_state & cache = caches_[kind];
+        if (cache.budget == 0 || cache.bytes <= cache.budget) return;
+        std::vector<std::string> evicted;
+        std::size_t bytes = cache.bytes;
+        for (auto itr = cache.lru.rbegin(); itr != cache.lru.rend() && bytes > cache.budget; ++itr)
+        {
+            bytes -= cache.entries.at(*itr).bytes;
+            evicted.push_back(*itr);
+        }
+        if (kind == markers)
+        {
+            evict_markers(evicted);
+        }
+        else
+        {
+            for (auto const& key : evicted) evict_mapped(key);
+        }
+    }
+
+    mutable std::mutex mutex_;
+    cache_state caches_[2];
+    // keys looked up in mapnik's caches since they were last cleared
+    std::unordered_set<std::string> probed_[2];
+    bool enabled_ = false;
+    std::atomic<bool> active_{false};
+};
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_CACHE_TRACKER_HPP
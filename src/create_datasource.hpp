@@ -26,6 +26,20 @@
 // mapnik
 #include <mapnik/config.hpp>
 #include <mapnik/datasource.hpp>
+#include <mapnik/datasource_cache.hpp>
+#include <mapnik/params.hpp>
+#include <mapnik/util/conversions.hpp>
+// stl
+#include <cstddef>
+#include <functional>
+#include <list>
+#include <map>
+#include <mutex>
+#include <regex>
+#include <stdexcept>
+#include <string>
+#include <unordered_map>
+#include <vector>
 //pybind11
 #include <pybind11/pybind11.h>
 #include <pybind11/operators.h>
@@ -33,7 +47,329 @@
 
 namespace py = pybind11;
 
-inline std::shared_ptr<mapnik::datasource> create_datasource(py::kwargs const& kwargs)
+namespace python_mapnik {
+
+struct param_to_string
+{
+    std::string operator() (mapnik::value_null const&) const { return std::string(); }
+    std::string operator() (std::string const& val) const { return val; }
+    std::string operator() (mapnik::value_bool val) const { return val ? "true" : "false"; }
+    std::string operator() (mapnik::value_integer val) const
+    {
+        std::string str;
+        mapnik::util::to_string(str, val);
+        return str;
+    }
+    std::string operator() (mapnik::value_double val) const
+    {
+        std::string str;
+        mapnik::util::to_string(str, val);
+        return str;
+    }
+};
+
+} // namespace python_mapnik
+
+// Process-wide cache of open datasources keyed by their parameters, so identical
+// datasource definitions share one plugin instance (file handles, connection pools,
+// spatial indexes) instead of opening a new one per layer and per map.
+// Sharing is off by default and enabled with DatasourceCache.enable_sharing(),
+// or for a single datasource by passing share_instance=True.
+class shared_datasource_cache
+{
+  public:
+    static constexpr std::size_t max_key_value_size = 1024;
+
+    static shared_datasource_cache & instance()
+    {
+        static shared_datasource_cache cache;
+        return cache;
+    }
+
+    static std::string make_key(mapnik::parameters const& params)
+    {
+        // parameters is an ordered map, so identical sets always yield the same key.
+        // Values are compared by their string form: XML and Python definitions match.
+        // Large values (inline CSV/GeoJSON payloads) are keyed by size and hash
+        // rather than copied into the key.
+        std::string key;
+        for (auto const& kv : params)
+        {
+            key += kv.first;
+            key += '=';
+            if (kv.second.is<std::string>() && kv.second.get<std::string>().size() > max_key_value_size)
+            {
+                std::string const& value = kv.second.get<std::string>();
+                key += '#';
+                key += std::to_string(value.size());
+                key += ':';
+                key += std::to_string(std::hash<std::string>()(value));
+            }
+            else
+            {
+                key += mapnik::util::apply_visitor(python_mapnik::param_to_string(), kv.second);
+            }
+            key += '\x1f';
+        }
+        return key;
+    }
+
+    bool enabled() const
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        return enabled_;
+    }
+
+    void enable(std::size_t max_entries)
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        enabled_ = true;
+        max_entries_ = max_entries;
+        evict_unlocked();
+    }
+
+    void disable()
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        enabled_ = false;
+        clear_unlocked();
+    }
+
+    std::shared_ptr<mapnik::datasource> create(mapnik::parameters const& params)
+    {
+        std::string key = make_key(params);
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            if (auto ds = lookup_unlocked(key)) return ds;
+        }
+        // open the datasource outside the lock, plugins may take a while to connect
+        return insert(key, mapnik::datasource_cache::instance().create(params));
+    }
+
+    // Returns the cached instance for an already opened datasource, or caches it.
+    std::shared_ptr<mapnik::datasource> share(std::shared_ptr<mapnik::datasource> const& ds)
+    {
+        std::string key = make_key(ds->params());
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            if (auto cached = lookup_unlocked(key)) return cached;
+        }
+        return insert(key, ds);
+    }
+
+    bool invalidate(mapnik::parameters const& params)
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        auto itr = index_.find(make_key(params));
+        if (itr == index_.end()) return false;
+        entries_.erase(itr->second);
+        index_.erase(itr);
+        return true;
+    }
+
+    void clear()
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        clear_unlocked();
+    }
+
+    py::dict stats() const
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        py::dict d;
+        d["enabled"] = enabled_;
+        d["entries"] = entries_.size();
+        d["max_entries"] = max_entries_;
+        d["hits"] = hits_;
+        d["misses"] = misses_;
+        d["evictions"] = evictions_;
+        return d;
+    }
+
+  private:
+    using entry_type = std::pair<std::string, std::shared_ptr<mapnik::datasource>>;
+
+    shared_datasource_cache() = default;
+
+    std::shared_ptr<mapnik::datasource> lookup_unlocked(std::string const& key)
+    {
+        auto itr = index_.find(key);
+        if (itr == index_.end()) return nullptr;
+        ++hits_;
+        // most recently used entries live at the front
+        entries_.splice(entries_.begin(), entries_, itr->second);
+        return itr->second->second;
+    }
+
+    std::shared_ptr<mapnik::datasource> insert(std::string const& key, std::shared_ptr<mapnik::datasource> const& ds)
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        // another thread may have opened the same datasource meanwhile
+        if (auto cached = lookup_unlocked(key)) return cached;
+        ++misses_;
+        if (!ds) return ds;
+        entries_.emplace_front(key, ds);
+        index_[key] = entries_.begin();
+        evict_unlocked();
+        return ds;
+    }
+
+    void evict_unlocked()
+    {
+        while (entries_.size() > max_entries_)
+        {
+            index_.erase(entries_.back().first);
+            entries_.pop_back();
+            ++evictions_;
+        }
+    }
+
+    void clear_unlocked()
+    {
+        entries_.clear();
+        index_.clear();
+    }
+
+    mutable std::mutex mutex_;
+    bool enabled_ = false;
+    std::size_t max_entries_ = 64;
+    std::size_t hits_ = 0;
+    std::size_t misses_ = 0;
+    std::size_t evictions_ = 0;
+    std::list<entry_type> entries_;
+    std::unordered_map<std::string, std::list<entry_type>::iterator> index_;
+};
+
+// Index of input plugins that are known by name but not loaded yet. Plugins
+// are dlopen'ed on the first datasource of their type, so processes only pay
+// for the plugins (and their GDAL, libpq... dependencies) they actually use.
+class lazy_plugins
+{
+  public:
+    static lazy_plugins & instance()
+    {
+        static lazy_plugins plugins;
+        return plugins;
+    }
+
+    // Indexes a plugin file under the names in its file name, 'gdal+ogr.input'
+    // provides both 'gdal' and 'ogr'. Returns the names.
+    std::vector<std::string> add(std::string const& path)
+    {
+        std::string stem = path.substr(path.find_last_of("/\\") + 1);
+        stem = stem.substr(0, stem.rfind('.'));
+        std::vector<std::string> names;
+        std::string::size_type start = 0;
+        while (start <= stem.size())
+        {
+            std::string::size_type end = stem.find('+', start);
+            if (end == std::string::npos) end = stem.size();
+            if (end > start) names.push_back(stem.substr(start, end - start));
+            start = end + 1;
+        }
+        std::lock_guard<std::mutex> lock(mutex_);
+        for (auto const& name : names)
+        {
+            if (!mapnik::datasource_cache::instance().plugin_registered(name)) pending_[name] = path;
+        }
+        return names;
+    }
+
+    // Loads the plugin providing `type` if it has not been loaded yet
+    void ensure(std::string const& type)
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        auto itr = pending_.find(type);
+        if (itr != pending_.end()) load_unlocked(itr->second);
+    }
+
+    void ensure(mapnik::parameters const& params)
+    {
+        if (auto type = params.get<std::string>("type")) ensure(*type);
+    }
+
+    // Loads the plugins a map definition may need. The types named in
+    // <Parameter name="type"> elements are loaded, everything when the
+    // document uses entities that could hide datasource definitions.
+    void ensure_xml(std::string const& xml)
+    {
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            if (pending_.empty()) return;
+            if (xml.find("<!ENTITY") != std::string::npos || xml.find("xi:include") != std::string::npos)
+            {
+                ensure_all_unlocked();
+                return;
+            }
+        }
+        static std::regex const type_param("name\\s*=\\s*[\"']type[\"']\\s*>\\s*(?:<!\\[CDATA\\[)?\\s*([A-Za-z0-9_]+)");
+        for (std::sregex_iterator itr(xml.begin(), xml.end(), type_param), end; itr != end; ++itr)
+        {
+            ensure((*itr)[1].str());
+        }
+    }
+
+    void ensure_all()
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        ensure_all_unlocked();
+    }
+
+    bool empty() const
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        return pending_.empty();
+    }
+
+    std::vector<std::string> names() const
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        std::vector<std::string> result;
+        for (auto const& kv : pending_) result.push_back(kv.first);
+        return result;
+    }
+
+  private:
+    lazy_plugins() = default;
+
+    void load_unlocked(std::string path)
+    {
+        mapnik::datasource_cache::instance().register_datasource(path);
+        // a plugin file may provide several types, none of them is pending any more
+        for (auto itr = pending_.begin(); itr != pending_.end();)
+        {
+            if (itr->second == path) itr = pending_.erase(itr);
+            else ++itr;
+        }
+    }
+
+    void ensure_all_unlocked()
+    {
+        while (!pending_.empty()) load_unlocked(pending_.begin()->second);
+    }
+
+    mutable std::mutex mutex_;
+    std::map<std::string, std::string> pending_;
+};
+
+inline std::string buffer_to_string(py::buffer const& buffer)
+{
+    py::buffer_info info = buffer.request();
+    if (info.ndim > 1 || (info.ndim == 1 && info.strides[0] != info.itemsize))
+    {
+        throw std::runtime_error("datasource parameters only accept contiguous buffers");
+    }
+    char const* data = static_cast<char const*>(info.ptr);
+    std::size_t size = static_cast<std::size_t>(info.size * info.itemsize);
+    std::string str;
+    {
+        py::gil_scoped_release release;
+        str.assign(data, size);
+    }
+    return str;
+}
+
+inline mapnik::parameters kwargs_to_params(py::kwargs const& kwargs)
 {
     mapnik::parameters params;
     for (auto param : kwargs)
@@ -56,11 +392,41 @@ inline std::shared_ptr<mapnik::datasource> create_datasource(py::kwargs const& k
         {
             params[key] = handle.cast<mapnik::value_integer>();
         }
+        else if (py::isinstance<py::buffer>(handle))
+        {
+            // bytes, bytearray, memoryview, mmap: take the raw bytes as they are,
+            // without decoding them to str first
+            params[key] = buffer_to_string(py::reinterpret_borrow<py::buffer>(handle));
+        }
         else
         {
             params[key] = py::str(handle).cast<std::string>();
         }
     }
+    return params;
+}
+
+// Creates a datasource from keyword parameters. Identical parameter sets share
+// one instance when sharing is enabled globally or share_instance=True is passed,
+// so a large inline payload is only parsed once. share_instance is the only
+// parameter consumed here, everything else is handed to the plugin.
+inline std::shared_ptr<mapnik::datasource> create_datasource(py::kwargs const& kwargs)
+{
+    shared_datasource_cache & cache = shared_datasource_cache::instance();
+    bool shared = cache.enabled();
+    if (kwargs.contains("share_instance"))
+    {
+        shared = kwargs["share_instance"].cast<bool>();
+    }
+    mapnik::parameters params = kwargs_to_params(kwargs);
+    params.erase("share_instance");
+    // parsing inline data or opening a connection does not need the GIL
+    py::gil_scoped_release release;
+    lazy_plugins::instance().ensure(params);
+    if (shared)
+    {
+        return cache.create(params);
+    }
     return mapnik::datasource_cache::instance().create(params);
 }
 
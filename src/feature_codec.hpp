@@ -0,0 +1,341 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_FEATURE_CODEC_HPP
+#define MAPNIK_PYTHON_FEATURE_CODEC_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/feature_factory.hpp>
+#include <mapnik/feature_kv_iterator.hpp>
+#include <mapnik/geometry.hpp>
+#include <mapnik/unicode.hpp>
+#include <mapnik/util/geometry_to_wkb.hpp>
+#include <mapnik/util/variant.hpp>
+#include <mapnik/value.hpp>
+#include <mapnik/wkb.hpp>
+// stl
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+#include <tuple>
+#include <unordered_map>
+#include <vector>
+
+namespace python_mapnik {
+
+template <std::size_t N> struct codec_unsigned;
+template <> struct codec_unsigned<1> { using type = std::uint8_t; };
+template <> struct codec_unsigned<2> { using type = std::uint16_t; };
+template <> struct codec_unsigned<4> { using type = std::uint32_t; };
+template <> struct codec_unsigned<8> { using type = std::uint64_t; };
+
+// Compact binary encoding of features, used for pickling and for
+// dumps_features/loads_features. Numbers are little endian on every host so
+// the data can be loaded on any machine. Layout:
+//
+//   header    "MNKF" version:u8
+//   contexts  count:u32, per context count:u32 then (index:u32 name:str)*
+//   features  count:u64, per feature context:u32 id:i64 wkb:bytes
+//             count:u32 then (index:u32 tag:u8 payload)*, null values are skipped
+//
+// where str and bytes are a u32 length followed by the raw bytes. Features
+// sharing a context in the input share one again after decoding.
+class feature_codec
+{
+  public:
+    enum value_tag : std::uint8_t { tag_bool = 1, tag_integer = 2, tag_double = 3, tag_string = 4 };
+
+
+    static std::string encode(std::vector<mapnik::feature_ptr> const& features)
+    {
+        writer out;
+        out.raw("MNKF", 4);
+        out.pod(std::uint8_t(1));
+
+        std::vector<mapnik::context_ptr> contexts;
+        std::unordered_map<mapnik::context_type const*, std::uint32_t> context_index;
+        std::vector<std::uint32_t> feature_context;
+        feature_context.reserve(features.size());
+        for (auto const& feature : features)
+        {
+            auto const& ctx = feature->context();
+            auto itr = context_index.emplace(ctx.get(), static_cast<std::uint32_t>(contexts.size()));
+            if (itr.second) contexts.push_back(ctx);
+            feature_context.push_back(itr.first->second);
+        }
+        out.pod(static_cast<std::uint32_t>(contexts.size()));
+        for (auto const& ctx : contexts)
+        {
+            out.pod(static_cast<std::uint32_t>(ctx->size()));
+            for (auto const& kv : *ctx)
+            {
+                out.pod(static_cast<std::uint32_t>(kv.second));
+                out.str(kv.first);
+            }
+        }
+
+        out.pod(static_cast<std::uint64_t>(features.size()));
+        value_writer write_value{out};
+        for (std::size_t i = 0; i < features.size(); ++i)
+        {
+            mapnik::feature_impl const& feature = *features[i];
+            out.pod(feature_context[i]);
+            out.pod(static_cast<std::int64_t>(feature.id()));
+            // an empty geometry has no WKB and is written as zero bytes
+            mapnik::util::wkb_buffer_ptr wkb = mapnik::util::to_wkb(feature.get_geometry(), mapnik::wkbNDR);
+            if (wkb) out.bytes(wkb->buffer(), wkb->size());
+            else out.pod(std::uint32_t(0));
+
+            std::uint32_t count = 0;
+            for (std::size_t index = 0; index < feature.size(); ++index)
+            {
+                if (!feature.get(index).is_null()) ++count;
+            }
+            out.pod(count);
+            for (std::size_t index = 0; index < feature.size(); ++index)
+            {
+                mapnik::value const& val = feature.get(index);
+                if (val.is_null()) continue;
+                out.pod(static_cast<std::uint32_t>(index));
+                mapnik::util::apply_visitor(write_value, val);
+            }
+        }
+        return std::move(out.buffer);
+    }
+
+    // Features sharing a context in the input share one again, on contexts
+    // private to the result, so decoding can run without the GIL
+    static std::vector<mapnik::feature_ptr> decode(char const* data, std::size_t size)
+    {
+        reader in{data, data + size};
+        if (size < 5 || std::memcmp(in.raw(4), "MNKF", 4) != 0)
+        {
+            throw std::runtime_error("loads_features: not an encoded feature batch");
+        }
+        if (in.pod<std::uint8_t>() != 1)
+        {
+            throw std::runtime_error("loads_features: unsupported encoding version");
+        }
+        // counts are checked against the bytes left before allocating for them:
+        // a context takes at least 4 bytes, a key at least 8
+        std::uint32_t num_contexts = in.pod<std::uint32_t>();
+        if (num_contexts > in.remaining() / 4) throw std::runtime_error("loads_features: truncated data");
+        std::vector<mapnik::context_ptr> contexts;
+        contexts.reserve(num_contexts);
+        std::vector<std::vector<std::string>> names(num_contexts);
+        for (std::uint32_t i = 0; i < num_contexts; ++i)
+        {
+            std::uint32_t num_keys = in.pod<std::uint32_t>();
+            if (num_keys > in.remaining() / 8) throw std::runtime_error("loads_features: truncated data");
+            names[i].resize(num_keys);
+            for (std::uint32_t k = 0; k < num_keys; ++k)
+            {
+                std::uint32_t index = in.pod<std::uint32_t>();
+                if (index >= num_keys) throw std::runtime_error("loads_features: invalid attribute index");
+                names[i][index] = in.str();
+            }
+            mapnik::context_ptr decoded = std::make_shared<mapnik::context_type>();
+            for (auto const& name : names[i]) decoded->push(name);
+            contexts.push_back(std::move(decoded));
+        }
+
+        std::uint64_t num_features = in.pod<std::uint64_t>();
+        std::vector<mapnik::feature_ptr> features;
+        // every feature takes at least 20 bytes, guard the reservation against garbage
+        features.reserve(static_cast<std::size_t>(std::min<std::uint64_t>(num_features, size / 20)));
+        mapnik::transcoder tr("utf8");
+        for (std::uint64_t n = 0; n < num_features; ++n)
+        {
+            std::uint32_t c = in.pod<std::uint32_t>();
+            if (c >= num_contexts) throw std::runtime_error("loads_features: invalid context index");
+            std::int64_t id = in.pod<std::int64_t>();
+            mapnik::feature_ptr feature(mapnik::feature_factory::create(contexts[c], id));
+            std::uint32_t wkb_size = in.pod<std::uint32_t>();
+            if (wkb_size > 0)
+            {
+                feature->set_geometry(mapnik::geometry_utils::from_wkb(in.raw(wkb_size), wkb_size,
+                                                                       mapnik::wkbGeneric));
+            }
+            std::uint32_t count = in.pod<std::uint32_t>();
+            for (std::uint32_t v = 0; v < count; ++v)
+            {
+                std::uint32_t index = in.pod<std::uint32_t>();
+                if (index >= names[c].size()) throw std::runtime_error("loads_features: invalid attribute index");
+                feature->put_new(names[c][index], read_value(in, tr));
+            }
+            features.push_back(std::move(feature));
+        }
+        if (in.pos != in.end) throw std::runtime_error("loads_features: trailing data after the last feature");
+        return features;
+    }
+
+    // Moves decoded features onto ctx, which gets all their attribute names.
+    // ctx may be shared with Python code, so this has to run with the GIL held.
+    static void rebind(std::vector<mapnik::feature_ptr> & features, mapnik::context_ptr const& ctx)
+    {
+        mapnik::context_type const* pushed = nullptr;
+        for (auto & feature : features)
+        {
+            mapnik::context_type const& decoded = *feature->context();
+            if (&decoded != pushed)
+            {
+                for (auto const& kv : decoded) ctx->push(kv.first);
+                pushed = &decoded;
+            }
+            mapnik::feature_ptr rebound(mapnik::feature_factory::create(ctx, feature->id()));
+            rebound->set_geometry(std::move(feature->get_geometry()));
+            for (auto const& kv : *feature)
+            {
+                rebound->put_new(std::get<0>(kv), std::get<1>(kv));
+            }
+            feature = std::move(rebound);
+        }
+    }
+
+  private:
+    // numbers go through an unsigned integer of the same size and are
+    // written least significant byte first, whatever the host byte order
+    template <typename T>
+    using bits_type = typename codec_unsigned<sizeof(T)>::type;
+
+    struct writer
+    {
+        std::string buffer;
+
+        void raw(char const* data, std::size_t size) { buffer.append(data, size); }
+
+        template <typename T>
+        void pod(T val)
+        {
+            bits_type<T> bits;
+            std::memcpy(&bits, &val, sizeof(T));
+            char bytes[sizeof(T)];
+            for (std::size_t i = 0; i < sizeof(T); ++i)
+            {
+                bytes[i] = static_cast<char>((bits >> (8 * i)) & 0xff);
+            }
+            raw(bytes, sizeof(T));
+        }
+
+        void bytes(char const* data, std::size_t size)
+        {
+            if (size > UINT32_MAX) throw std::runtime_error("dumps_features: value too large to encode");
+            pod(static_cast<std::uint32_t>(size));
+            raw(data, size);
+        }
+
+        void str(std::string const& s) { bytes(s.data(), s.size()); }
+    };
+
+    struct reader
+    {
+        char const* pos;
+        char const* end;
+
+        std::size_t remaining() const { return static_cast<std::size_t>(end - pos); }
+
+        char const* raw(std::size_t size)
+        {
+            if (static_cast<std::size_t>(end - pos) < size) throw std::runtime_error("loads_features: truncated data");
+            char const* start = pos;
+            pos += size;
+            return start;
+        }
+
+        template <typename T>
+        T pod()
+        {
+            auto bytes = reinterpret_cast<unsigned char const*>(raw(sizeof(T)));
+            bits_type<T> bits = 0;
+            for (std::size_t i = 0; i < sizeof(T); ++i)
+            {
+                bits |= static_cast<bits_type<T>>(static_cast<bits_type<T>>(bytes[i]) << (8 * i));
+            }
+            T val;
+            std::memcpy(&val, &bits, sizeof(T));
+            return val;
+        }
+
+        std::string str()
+        {
+            std::uint32_t size = pod<std::uint32_t>();
+            return std::string(raw(size), size);
+        }
+    };
+
+    struct value_writer
+    {
+        writer & out;
+
+        void operator()(mapnik::value_null) const {}
+        void operator()(mapnik::value_bool val) const
+        {
+            out.pod(std::uint8_t(tag_bool));
+            out.pod(std::uint8_t(val ? 1 : 0));
+        }
+        void operator()(mapnik::value_integer val) const
+        {
+            out.pod(std::uint8_t(tag_integer));
+            out.pod(static_cast<std::int64_t>(val));
+        }
+        void operator()(mapnik::value_double val) const
+        {
+            out.pod(std::uint8_t(tag_double));
+            out.pod(val);
+        }
+        void operator()(mapnik::value_unicode_string const& val) const
+        {
+            std::string utf8;
+            val.toUTF8String(utf8);
+            out.pod(std::uint8_t(tag_string));
+            out.str(utf8);
+        }
+    };
+
+    static mapnik::value read_value(reader & in, mapnik::transcoder const& tr)
+    {
+        switch (in.pod<std::uint8_t>())
+        {
+        case tag_bool:
+            return mapnik::value_bool(in.pod<std::uint8_t>() != 0);
+        case tag_integer:
+            return mapnik::value_integer(in.pod<std::int64_t>());
+        case tag_double:
+            return mapnik::value_double(in.pod<double>());
+        case tag_string:
+        {
+            std::uint32_t size = in.pod<std::uint32_t>();
+            return tr.transcode(in.raw(size), static_cast<std::int32_t>(size));
+        }
+        default:
+            throw std::runtime_error("loads_features: invalid value tag");
+        }
+    }
+};
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_FEATURE_CODEC_HPP
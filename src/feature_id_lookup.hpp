@@ -0,0 +1,50 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_FEATURE_ID_LOOKUP_HPP
+#define MAPNIK_PYTHON_FEATURE_ID_LOOKUP_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/featureset.hpp>
+#include <mapnik/value/types.hpp>
+// stl
+#include <set>
+#include <string>
+#include <vector>
+
+namespace python_mapnik {
+
+// Implemented by datasources that can fetch features by id without a scan.
+// Returning a null featureset means the lookup is not supported for this
+// instance and the caller should fall back to an id index.
+class feature_id_lookup
+{
+  public:
+    virtual ~feature_id_lookup() = default;
+    virtual mapnik::featureset_ptr features_by_ids(std::vector<mapnik::value_integer> const& ids,
+                                                   std::set<std::string> const& names) const = 0;
+};
+
+} // namespace python_mapnik
+
+#endif //MAPNIK_PYTHON_FEATURE_ID_LOOKUP_HPP
@@ -0,0 +1,265 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_FEATURE_STREAM_HPP
+#define MAPNIK_PYTHON_FEATURE_STREAM_HPP
+
+// mapnik
+#include <mapnik/datasource.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/query.hpp>
+#include "thread_pool.hpp"
+// stl
+#include <cstddef>
+#include <deque>
+#include <exception>
+#include <memory>
+#include <mutex>
+#include <stdexcept>
+#include <string>
+#include <vector>
+//pybind11
+#include <pybind11/pybind11.h>
+
+namespace py = pybind11;
+
+namespace python_mapnik {
+
+// Async iterator over the features of a query. Batches of features are read on
+// the shared task_pool with the GIL released and handed to the asyncio loop with
+// call_soon_threadsafe. At most max_batches batches are read ahead of the
+// consumer, reading pauses until the consumer catches up.
+class feature_stream : public std::enable_shared_from_this<feature_stream>
+{
+  public:
+    feature_stream(std::shared_ptr<mapnik::datasource> const& ds,
+                   mapnik::query const& q,
+                   std::size_t batch_size,
+                   std::size_t max_batches)
+        : ds_(ds),
+          query_(q),
+          batch_size_(batch_size),
+          max_batches_(max_batches) {}
+
+    ~feature_stream()
+    {
+        // the last reference may be dropped by a pool thread
+        if ((loop_ || waiter_) && Py_IsInitialized())
+        {
+            py::gil_scoped_acquire gil;
+            waiter_ = py::object();
+            loop_ = py::object();
+        }
+    }
+
+    // Returns a future resolving to the next feature. Requires the GIL and a
+    // running event loop.
+    py::object anext()
+    {
+        py::object loop = py::module_::import("asyncio").attr("get_running_loop")();
+        py::object future = loop.attr("create_future")();
+        if (pos_ < current_.size())
+        {
+            future.attr("set_result")(current_[pos_++]);
+            return future;
+        }
+        if (waiter_ && !waiter_.attr("done")().cast<bool>())
+        {
+            throw std::runtime_error("features_async: the previous __anext__() has not completed yet");
+        }
+        loop_ = loop;
+        waiter_ = future;
+        bool ready;
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            ready = !batches_.empty() || finished_;
+            waiting_ = !ready;
+            schedule_unlocked();
+        }
+        if (ready) resolve();
+        return future;
+    }
+
+    // Stops reading ahead and releases buffered features. Requires the GIL.
+    void close()
+    {
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            closed_ = finished_ = true;
+            waiting_ = false;
+            batches_.clear();
+            if (!fetching_) fs_.reset();
+        }
+        current_.clear();
+        pos_ = 0;
+        if (waiter_ && !waiter_.attr("done")().cast<bool>()) waiter_.attr("cancel")();
+        waiter_ = py::object();
+    }
+
+    py::object aclose()
+    {
+        close();
+        py::object future = py::module_::import("asyncio").attr("get_running_loop")().attr("create_future")();
+        future.attr("set_result")(py::none());
+        return future;
+    }
+
+  private:
+    using batch_type = std::vector<mapnik::feature_ptr>;
+
+    void schedule_unlocked()
+    {
+        if (fetching_ || finished_ || batches_.size() >= max_batches_) return;
+        fetching_ = true;
+        auto self = shared_from_this();
+        task_pool::instance().submit([self]() { self->fetch(); });
+    }
+
+    // Runs on a pool thread without the GIL
+    void fetch()
+    {
+        batch_type batch;
+        std::string error;
+        bool failed = false;
+        try
+        {
+            if (!started_)
+            {
+                fs_ = ds_->features(query_);
+                started_ = true;
+            }
+            batch.reserve(batch_size_);
+            while (fs_ && batch.size() < batch_size_)
+            {
+                mapnik::feature_ptr feature = fs_->next();
+                if (!feature) break;
+                batch.push_back(std::move(feature));
+            }
+        }
+        catch (std::exception const& ex)
+        {
+            failed = true;
+            error = ex.what();
+        }
+        catch (...)
+        {
+            failed = true;
+            error = "unknown error";
+        }
+        bool last = failed || batch.size() < batch_size_;
+        bool notify;
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            fetching_ = false;
+            if (!closed_)
+            {
+                if (!batch.empty()) batches_.push_back(std::move(batch));
+                if (failed) error_ = error;
+                finished_ = last;
+            }
+            if (finished_) fs_.reset();
+            notify = waiting_;
+            waiting_ = false;
+            schedule_unlocked();
+        }
+        if (notify) notify_loop();
+    }
+
+    void notify_loop()
+    {
+        if (!Py_IsInitialized()) return;
+        py::gil_scoped_acquire gil;
+        if (!loop_ || loop_.attr("is_closed")().cast<bool>()) return;
+        auto self = shared_from_this();
+        try
+        {
+            loop_.attr("call_soon_threadsafe")(py::cpp_function([self]() { self->resolve(); }));
+        }
+        catch (py::error_already_set & ex)
+        {
+            // the loop was closed meanwhile, nobody is waiting any more
+            ex.discard_as_unraisable("features_async");
+        }
+    }
+
+    // Completes the pending future, runs on the loop thread with the GIL
+    void resolve()
+    {
+        py::object future = waiter_;
+        if (!future || future.attr("done")().cast<bool>()) return;
+        std::string error;
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            if (!batches_.empty())
+            {
+                current_ = std::move(batches_.front());
+                batches_.pop_front();
+                pos_ = 0;
+                schedule_unlocked();
+            }
+            else if (!finished_)
+            {
+                waiting_ = true;
+                return;
+            }
+            error = error_;
+        }
+        waiter_ = py::object();
+        if (pos_ < current_.size())
+        {
+            future.attr("set_result")(current_[pos_++]);
+        }
+        else if (!error.empty())
+        {
+            future.attr("set_exception")(py::reinterpret_borrow<py::object>(PyExc_RuntimeError)(error));
+        }
+        else
+        {
+            future.attr("set_exception")(py::reinterpret_borrow<py::object>(PyExc_StopAsyncIteration)());
+        }
+    }
+
+    std::shared_ptr<mapnik::datasource> ds_;
+    mapnik::query query_;
+    std::size_t batch_size_;
+    std::size_t max_batches_;
+    // used by the pool thread while fetching_ is set, one fetch runs at a time
+    mapnik::featureset_ptr fs_;
+    bool started_ = false;
+    std::mutex mutex_;
+    // guarded by mutex_
+    std::deque<batch_type> batches_;
+    std::string error_;
+    bool fetching_ = false;
+    bool waiting_ = false;
+    bool finished_ = false;
+    bool closed_ = false;
+    // touched with the GIL held only
+    batch_type current_;
+    std::size_t pos_ = 0;
+    py::object loop_;
+    py::object waiter_;
+};
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_FEATURE_STREAM_HPP
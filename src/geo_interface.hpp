@@ -0,0 +1,292 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_GEO_INTERFACE_HPP
+#define MAPNIK_PYTHON_GEO_INTERFACE_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/feature_factory.hpp>
+#include <mapnik/geometry.hpp>
+#include <mapnik/unicode.hpp>
+#include <mapnik/value.hpp>
+#include "mapnik_value_converter.hpp"
+// stl
+#include <stdexcept>
+#include <string>
+// pybind11
+#include <pybind11/pybind11.h>
+
+namespace py = pybind11;
+
+namespace python_mapnik {
+
+// Builds the __geo_interface__ mapping of a geometry: the same nested dicts and
+// lists json.loads would return for its GeoJSON, None for an empty geometry
+struct geo_interface_builder
+{
+    static py::object make(char const* type, char const* key, py::object value)
+    {
+        py::dict result;
+        result["type"] = type;
+        result[key] = std::move(value);
+        return result;
+    }
+
+    static py::object coords(mapnik::geometry::point<double> const& pt)
+    {
+        PyObject * xy = PyList_New(2);
+        if (!xy) throw py::error_already_set();
+        PyList_SET_ITEM(xy, 0, PyFloat_FromDouble(pt.x));
+        PyList_SET_ITEM(xy, 1, PyFloat_FromDouble(pt.y));
+        return py::reinterpret_steal<py::object>(xy);
+    }
+
+    // a list of the coordinates, or of the nested lists, of every part
+    template <typename Parts, typename Fn>
+    static py::object list_of(Parts const& parts, Fn && fn)
+    {
+        PyObject * list = PyList_New(static_cast<Py_ssize_t>(parts.size()));
+        if (!list) throw py::error_already_set();
+        py::object result = py::reinterpret_steal<py::object>(list);
+        Py_ssize_t i = 0;
+        for (auto const& part : parts) PyList_SET_ITEM(list, i++, fn(part).release().ptr());
+        return result;
+    }
+
+    template <typename Points>
+    static py::object points(Points const& pts)
+    {
+        return list_of(pts, [](mapnik::geometry::point<double> const& pt) { return coords(pt); });
+    }
+
+    template <typename Polygon>
+    static py::object rings(Polygon const& poly)
+    {
+        return list_of(poly, [](mapnik::geometry::linear_ring<double> const& ring) { return points(ring); });
+    }
+
+    py::object operator()(mapnik::geometry::geometry_empty const&) const
+    {
+        return py::none();
+    }
+
+    py::object operator()(mapnik::geometry::point<double> const& pt) const
+    {
+        return make("Point", "coordinates", coords(pt));
+    }
+
+    py::object operator()(mapnik::geometry::line_string<double> const& line) const
+    {
+        return make("LineString", "coordinates", points(line));
+    }
+
+    py::object operator()(mapnik::geometry::polygon<double> const& poly) const
+    {
+        return make("Polygon", "coordinates", rings(poly));
+    }
+
+    py::object operator()(mapnik::geometry::multi_point<double> const& mp) const
+    {
+        return make("MultiPoint", "coordinates", points(mp));
+    }
+
+    py::object operator()(mapnik::geometry::multi_line_string<double> const& mls) const
+    {
+        return make("MultiLineString", "coordinates",
+                    list_of(mls, [](mapnik::geometry::line_string<double> const& line) { return points(line); }));
+    }
+
+    py::object operator()(mapnik::geometry::multi_polygon<double> const& mp) const
+    {
+        return make("MultiPolygon", "coordinates",
+                    list_of(mp, [](mapnik::geometry::polygon<double> const& poly) { return rings(poly); }));
+    }
+
+    py::object operator()(mapnik::geometry::geometry_collection<double> const& gc) const
+    {
+        return make("GeometryCollection", "geometries",
+                    list_of(gc, [this](mapnik::geometry::geometry<double> const& geom) { return (*this)(geom); }));
+    }
+
+    py::object operator()(mapnik::geometry::geometry<double> const& geom) const
+    {
+        return mapnik::util::apply_visitor(*this, geom);
+    }
+};
+
+template <typename GeometryType>
+py::object to_geo_interface(GeometryType const& geom)
+{
+    return geo_interface_builder()(geom);
+}
+
+inline py::object feature_to_geo_interface(mapnik::feature_impl const& feature)
+{
+    py::dict properties;
+    for (auto const& kv : feature)
+    {
+        mapnik::value const& val = std::get<1>(kv);
+        // null properties are left out, as in the GeoJSON output
+        if (!val.is_null()) properties[py::str(std::get<0>(kv))] = val;
+    }
+    py::dict result;
+    result["type"] = "Feature";
+    result["id"] = feature.id();
+    result["geometry"] = to_geo_interface(feature.get_geometry());
+    result["properties"] = properties;
+    return result;
+}
+
+// The mapping itself, or the __geo_interface__ of objects providing one
+inline py::object geo_interface_mapping(py::handle obj)
+{
+    if (!PyDict_Check(obj.ptr()) && py::hasattr(obj, "__geo_interface__")) return obj.attr("__geo_interface__");
+    return py::reinterpret_borrow<py::object>(obj);
+}
+
+inline py::sequence as_sequence(py::handle obj, char const* what)
+{
+    if (!PySequence_Check(obj.ptr()) || PyUnicode_Check(obj.ptr()))
+    {
+        throw std::runtime_error(std::string("from_geo_interface: expected a sequence of ") + what);
+    }
+    return py::reinterpret_borrow<py::sequence>(obj);
+}
+
+inline mapnik::geometry::point<double> point_from_coords(py::handle obj)
+{
+    py::sequence xy = as_sequence(obj, "coordinates");
+    if (xy.size() < 2) throw std::runtime_error("from_geo_interface: a position needs at least two coordinates");
+    return mapnik::geometry::point<double>(xy[0].cast<double>(), xy[1].cast<double>());
+}
+
+template <typename Points>
+Points points_from_coords(py::handle obj)
+{
+    py::sequence seq = as_sequence(obj, "positions");
+    Points pts;
+    pts.reserve(seq.size());
+    for (auto item : seq) pts.push_back(point_from_coords(item));
+    return pts;
+}
+
+inline mapnik::geometry::polygon<double> polygon_from_coords(py::handle obj)
+{
+    py::sequence seq = as_sequence(obj, "rings");
+    mapnik::geometry::polygon<double> poly;
+    poly.reserve(seq.size());
+    for (auto item : seq) poly.push_back(points_from_coords<mapnik::geometry::linear_ring<double>>(item));
+    return poly;
+}
+
+inline mapnik::geometry::geometry<double> geometry_from_geo_interface(py::handle obj)
+{
+    using namespace mapnik::geometry;
+    if (obj.is_none()) return geometry_empty();
+    py::object mapping = geo_interface_mapping(obj);
+    if (!PyMapping_Check(mapping.ptr()) || !PyMapping_HasKeyString(mapping.ptr(), "type"))
+    {
+        throw std::runtime_error("from_geo_interface: expected a mapping with a 'type'");
+    }
+    std::string type = mapping["type"].cast<std::string>();
+    if (type == "GeometryCollection")
+    {
+        geometry_collection<double> gc;
+        for (auto item : as_sequence(mapping["geometries"], "geometries"))
+        {
+            gc.push_back(geometry_from_geo_interface(item));
+        }
+        return gc;
+    }
+    if (!PyMapping_HasKeyString(mapping.ptr(), "coordinates"))
+    {
+        throw std::runtime_error("from_geo_interface: " + type + " without 'coordinates'");
+    }
+    py::object coords = mapping["coordinates"];
+    if (type == "Point") return point_from_coords(coords);
+    if (type == "LineString") return points_from_coords<line_string<double>>(coords);
+    if (type == "Polygon") return polygon_from_coords(coords);
+    if (type == "MultiPoint") return points_from_coords<multi_point<double>>(coords);
+    if (type == "MultiLineString")
+    {
+        multi_line_string<double> mls;
+        for (auto item : as_sequence(coords, "lines")) mls.push_back(points_from_coords<line_string<double>>(item));
+        return mls;
+    }
+    if (type == "MultiPolygon")
+    {
+        multi_polygon<double> mp;
+        for (auto item : as_sequence(coords, "polygons")) mp.push_back(polygon_from_coords(item));
+        return mp;
+    }
+    throw std::runtime_error("from_geo_interface: unsupported geometry type '" + type + "'");
+}
+
+inline mapnik::feature_ptr feature_from_geo_interface(py::handle obj, mapnik::context_ptr ctx)
+{
+    py::object mapping = geo_interface_mapping(obj);
+    if (!PyMapping_Check(mapping.ptr()) || !PyMapping_HasKeyString(mapping.ptr(), "type") ||
+        mapping["type"].cast<std::string>() != "Feature")
+    {
+        throw std::runtime_error("from_geo_interface: expected a mapping with type 'Feature'");
+    }
+    if (!ctx) ctx = std::make_shared<mapnik::context_type>();
+    mapnik::value_integer id = 1;
+    if (PyMapping_HasKeyString(mapping.ptr(), "id"))
+    {
+        py::object fid = mapping["id"];
+        if (PyLong_Check(fid.ptr())) id = fid.cast<mapnik::value_integer>();
+    }
+    mapnik::feature_ptr feature(mapnik::feature_factory::create(ctx, id));
+    if (PyMapping_HasKeyString(mapping.ptr(), "geometry"))
+    {
+        feature->set_geometry(geometry_from_geo_interface(mapping["geometry"]));
+    }
+    if (PyMapping_HasKeyString(mapping.ptr(), "properties") && !mapping["properties"].is_none())
+    {
+        py::object dumps;
+        mapnik::transcoder tr("utf8");
+        for (auto item : mapping["properties"].cast<py::dict>())
+        {
+            std::string name = py::str(item.first);
+            mapnik::value val;
+            try
+            {
+                val = item.second.cast<mapnik::value>();
+            }
+            catch (py::cast_error const&)
+            {
+                // nested objects and arrays are kept as their JSON text
+                if (!dumps) dumps = py::module_::import("json").attr("dumps");
+                val = tr.transcode(dumps(item.second).cast<std::string>().c_str());
+            }
+            feature->put_new(name, val);
+        }
+    }
+    return feature;
+}
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_GEO_INTERFACE_HPP
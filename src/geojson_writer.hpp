@@ -0,0 +1,321 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_GEOJSON_WRITER_HPP
+#define MAPNIK_PYTHON_GEOJSON_WRITER_HPP
+
+// mapnik
+#include <mapnik/feature.hpp>
+#include <mapnik/datasource.hpp>
+#include <mapnik/geometry.hpp>
+#include <mapnik/unicode.hpp>
+#include <mapnik/value.hpp>
+#include <mapnik/util/conversions.hpp>
+// boost
+#include <boost/optional.hpp>
+// stl
+#include <algorithm>
+#include <cmath>
+#include <cstdio>
+#include <string>
+#include <tuple>
+#include <vector>
+//pybind11
+#include <pybind11/pybind11.h>
+
+namespace py = pybind11;
+
+namespace python_mapnik {
+
+inline void append_json_string(std::string & out, std::string const& str)
+{
+    out += '"';
+    for (unsigned char c : str)
+    {
+        switch (c)
+        {
+        case '"': out += "\\\""; break;
+        case '\\': out += "\\\\"; break;
+        case '\b': out += "\\b"; break;
+        case '\f': out += "\\f"; break;
+        case '\n': out += "\\n"; break;
+        case '\r': out += "\\r"; break;
+        case '\t': out += "\\t"; break;
+        default:
+            if (c < 0x20)
+            {
+                char buf[8];
+                std::snprintf(buf, sizeof(buf), "\\u%04x", c);
+                out += buf;
+            }
+            else
+            {
+                out += static_cast<char>(c);
+            }
+        }
+    }
+    out += '"';
+}
+
+// precision < 0 writes the shortest representation, otherwise at most
+// `precision` decimals with trailing zeros dropped
+inline void append_json_number(std::string & out, double val, int precision)
+{
+    if (!std::isfinite(val))
+    {
+        out += "null";
+        return;
+    }
+    if (precision < 0)
+    {
+        mapnik::util::to_string(out, val);
+        return;
+    }
+    char buf[64];
+    int len = std::snprintf(buf, sizeof(buf), "%.*f", precision, val);
+    if (len <= 0 || len >= static_cast<int>(sizeof(buf)))
+    {
+        mapnik::util::to_string(out, val);
+        return;
+    }
+    std::string num(buf, static_cast<std::size_t>(len));
+    if (num.find('.') != std::string::npos)
+    {
+        num.erase(num.find_last_not_of('0') + 1);
+        if (num.back() == '.') num.pop_back();
+    }
+    if (num == "-0") num = "0";
+    out += num;
+}
+
+struct json_value_appender
+{
+    std::string & out;
+
+    void operator() (mapnik::value_null const&) const { out += "null"; }
+    void operator() (mapnik::value_bool val) const { out += val ? "true" : "false"; }
+    void operator() (mapnik::value_integer val) const { mapnik::util::to_string(out, val); }
+    void operator() (mapnik::value_double val) const { append_json_number(out, val, -1); }
+    void operator() (mapnik::value_unicode_string const& val) const
+    {
+        std::string utf8;
+        mapnik::to_utf8(val, utf8);
+        append_json_string(out, utf8);
+    }
+};
+
+struct json_geometry_appender
+{
+    std::string & out;
+    int precision;
+
+    void coord(mapnik::geometry::point<double> const& pt) const
+    {
+        out += '[';
+        append_json_number(out, pt.x, precision);
+        out += ',';
+        append_json_number(out, pt.y, precision);
+        out += ']';
+    }
+
+    template <typename Points>
+    void coords(Points const& points) const
+    {
+        out += '[';
+        bool first = true;
+        for (auto const& pt : points)
+        {
+            if (!first) out += ',';
+            coord(pt);
+            first = false;
+        }
+        out += ']';
+    }
+
+    void rings(mapnik::geometry::polygon<double> const& poly) const
+    {
+        out += '[';
+        bool first = true;
+        for (auto const& ring : poly)
+        {
+            if (!first) out += ',';
+            coords(ring);
+            first = false;
+        }
+        out += ']';
+    }
+
+    void operator() (mapnik::geometry::geometry_empty const&) const
+    {
+        out += "null";
+    }
+
+    void operator() (mapnik::geometry::point<double> const& pt) const
+    {
+        out += "{\"type\":\"Point\",\"coordinates\":";
+        coord(pt);
+        out += '}';
+    }
+
+    void operator() (mapnik::geometry::line_string<double> const& line) const
+    {
+        out += "{\"type\":\"LineString\",\"coordinates\":";
+        coords(line);
+        out += '}';
+    }
+
+    void operator() (mapnik::geometry::polygon<double> const& poly) const
+    {
+        out += "{\"type\":\"Polygon\",\"coordinates\":";
+        rings(poly);
+        out += '}';
+    }
+
+    void operator() (mapnik::geometry::multi_point<double> const& multi) const
+    {
+        out += "{\"type\":\"MultiPoint\",\"coordinates\":";
+        coords(multi);
+        out += '}';
+    }
+
+    void operator() (mapnik::geometry::multi_line_string<double> const& multi) const
+    {
+        out += "{\"type\":\"MultiLineString\",\"coordinates\":[";
+        bool first = true;
+        for (auto const& line : multi)
+        {
+            if (!first) out += ',';
+            coords(line);
+            first = false;
+        }
+        out += "]}";
+    }
+
+    void operator() (mapnik::geometry::multi_polygon<double> const& multi) const
+    {
+        out += "{\"type\":\"MultiPolygon\",\"coordinates\":[";
+        bool first = true;
+        for (auto const& poly : multi)
+        {
+            if (!first) out += ',';
+            rings(poly);
+            first = false;
+        }
+        out += "]}";
+    }
+
+    void operator() (mapnik::geometry::geometry_collection<double> const& collection) const
+    {
+        out += "{\"type\":\"GeometryCollection\",\"geometries\":[";
+        bool first = true;
+        for (auto const& geom : collection)
+        {
+            if (!first) out += ',';
+            mapnik::util::apply_visitor(*this, geom);
+            first = false;
+        }
+        out += "]}";
+    }
+};
+
+// Serializes featuresets as a GeoJSON FeatureCollection or as newline
+// delimited GeoJSON into a Python binary file object. Features are encoded
+// without the GIL into a buffer that is handed to fileobj.write() whenever it
+// grows past chunk_size, so memory use stays flat regardless of output size.
+class geojson_writer
+{
+  public:
+    static constexpr std::size_t chunk_size = 1 << 20;
+
+    geojson_writer(py::object const& fileobj,
+                   bool ndjson,
+                   boost::optional<int> const& precision,
+                   boost::optional<std::vector<std::string>> const& fields)
+        : write_(fileobj.attr("write")),
+          ndjson_(ndjson),
+          precision_(precision ? std::max(*precision, 0) : -1),
+          fields_(fields) {}
+
+    // Writes all features of fs and returns their number. Requires the GIL.
+    std::size_t write(mapnik::featureset_ptr const& fs)
+    {
+        std::string buffer;
+        buffer.reserve(chunk_size + chunk_size / 4);
+        if (!ndjson_) buffer += "{\"type\":\"FeatureCollection\",\"features\":[";
+        std::size_t count = 0;
+        bool done = false;
+        while (!done)
+        {
+            {
+                py::gil_scoped_release release;
+                while (buffer.size() < chunk_size)
+                {
+                    mapnik::feature_ptr feature = fs ? fs->next() : mapnik::feature_ptr();
+                    if (!feature)
+                    {
+                        done = true;
+                        break;
+                    }
+                    if (!ndjson_ && count > 0) buffer += ',';
+                    append_feature(buffer, *feature);
+                    if (ndjson_) buffer += '\n';
+                    ++count;
+                }
+            }
+            if (done && !ndjson_) buffer += "]}";
+            write_(py::bytes(buffer));
+            buffer.clear();
+        }
+        return count;
+    }
+
+  private:
+    void append_feature(std::string & out, mapnik::feature_impl const& feature) const
+    {
+        out += "{\"type\":\"Feature\",\"id\":";
+        mapnik::util::to_string(out, feature.id());
+        out += ",\"geometry\":";
+        mapnik::util::apply_visitor(json_geometry_appender{out, precision_}, feature.get_geometry());
+        out += ",\"properties\":{";
+        bool first = true;
+        for (auto const& kv : feature)
+        {
+            std::string const& name = std::get<0>(kv);
+            if (fields_ && std::find(fields_->begin(), fields_->end(), name) == fields_->end()) continue;
+            if (!first) out += ',';
+            append_json_string(out, name);
+            out += ':';
+            mapnik::util::apply_visitor(json_value_appender{out}, std::get<1>(kv));
+            first = false;
+        }
+        out += "}}";
+    }
+
+    py::object write_;
+    bool ndjson_;
+    int precision_;
+    boost::optional<std::vector<std::string>> fields_;
+};
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_GEOJSON_WRITER_HPP
@@ -0,0 +1,106 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_GEOMETRY_ARRAY_HPP
+#define MAPNIK_PYTHON_GEOMETRY_ARRAY_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/geometry.hpp>
+// stl
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+#include <type_traits>
+#include <vector>
+// pybind11
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+
+namespace py = pybind11;
+
+namespace python_mapnik {
+
+using coord_array = py::array_t<double, py::array::c_style | py::array::forcecast>;
+using offset_array = py::array_t<std::int64_t, py::array::c_style | py::array::forcecast>;
+
+// Number of points in an (N, 2) array or a flat array of x,y pairs
+inline std::size_t num_coords(coord_array const& coords)
+{
+    if (coords.ndim() == 2 && coords.shape(1) == 2) return static_cast<std::size_t>(coords.shape(0));
+    if (coords.ndim() == 1 && coords.shape(0) % 2 == 0) return static_cast<std::size_t>(coords.shape(0) / 2);
+    throw std::runtime_error("coordinates must be an array of shape (N, 2) or a flat array of x,y pairs");
+}
+
+// Offsets into the next level (points, rings or parts): starts with 0, ends with `size`
+// and never decreases, so part i spans [offsets[i], offsets[i + 1])
+inline std::size_t check_offsets(offset_array const& offsets, std::size_t size, char const* name)
+{
+    if (offsets.ndim() != 1 || offsets.shape(0) < 1)
+    {
+        throw std::runtime_error(std::string(name) + " must be a non-empty 1-dimensional array");
+    }
+    auto o = offsets.unchecked<1>();
+    std::size_t count = static_cast<std::size_t>(offsets.shape(0)) - 1;
+    if (o(0) != 0 || static_cast<std::size_t>(o(count)) != size)
+    {
+        throw std::runtime_error(std::string(name) + " must start with 0 and end with " + std::to_string(size));
+    }
+    for (std::size_t i = 0; i < count; ++i)
+    {
+        if (o(i + 1) < o(i)) throw std::runtime_error(std::string(name) + " must not decrease");
+    }
+    return count;
+}
+
+template <typename T>
+void fill_points(T & geom, double const* xy, std::size_t count)
+{
+    using point_type = typename T::value_type;
+    static_assert(sizeof(point_type) == 2 * sizeof(double) && std::is_trivially_copyable<point_type>::value,
+                  "points are expected to be two packed doubles");
+    geom.resize(count);
+    if (count > 0) std::memcpy(geom.data(), xy, count * 2 * sizeof(double));
+}
+
+// Appends one part per offset range, each filled with its points
+template <typename T>
+void fill_parts(T & geom, double const* xy, std::int64_t const* offsets, std::size_t first, std::size_t last)
+{
+    geom.reserve(geom.size() + last - first);
+    for (std::size_t i = first; i < last; ++i)
+    {
+        geom.emplace_back();
+        fill_points(geom.back(), xy + 2 * offsets[i], static_cast<std::size_t>(offsets[i + 1] - offsets[i]));
+    }
+}
+
+// A columnar container of geometries, operated on in bulk without the GIL
+struct geometry_array
+{
+    std::vector<mapnik::geometry::geometry<double>> geometries;
+};
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_GEOMETRY_ARRAY_HPP
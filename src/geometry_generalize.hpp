@@ -0,0 +1,322 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_GEOMETRY_GENERALIZE_HPP
+#define MAPNIK_PYTHON_GEOMETRY_GENERALIZE_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/geometry/box2d.hpp>
+#include <mapnik/geometry.hpp>
+#include <mapnik/geometry/boost_adapters.hpp>
+#include <mapnik/geometry/correct.hpp>
+#include <mapnik/geometry/envelope.hpp>
+#include <mapnik/simplify.hpp>
+#include <mapnik/simplify_converter.hpp>
+#include <mapnik/vertex.hpp>
+#include <mapnik/vertex_adapters.hpp>
+// boost
+#include <boost/geometry/algorithms/intersection.hpp>
+// stl
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+namespace python_mapnik {
+
+inline mapnik::simplify_algorithm_e simplify_algorithm(std::string const& name)
+{
+    auto algorithm = mapnik::simplify_algorithm_from_string(name);
+    if (!algorithm)
+    {
+        throw std::runtime_error("unknown simplify algorithm '" + name + "', expected one of "
+                                 "'radial-distance', 'douglas-peucker', 'visvalingam-whyatt' or 'zhao-saalfeld'");
+    }
+    return *algorithm;
+}
+
+// Clips a geometry to a box with Boost.Geometry: lines are cut at the box edges
+// and polygons intersected with it, so a polygon may come back as a MultiPolygon.
+// Parts outside the box are dropped, an empty geometry is returned when nothing is left.
+struct clip_visitor
+{
+    using geometry_type = mapnik::geometry::geometry<double>;
+
+    explicit clip_visitor(mapnik::box2d<double> const& box)
+        : box_(box)
+    {
+        mapnik::geometry::linear_ring<double> ring;
+        ring.emplace_back(box.minx(), box.miny());
+        ring.emplace_back(box.maxx(), box.miny());
+        ring.emplace_back(box.maxx(), box.maxy());
+        ring.emplace_back(box.minx(), box.maxy());
+        ring.emplace_back(box.minx(), box.miny());
+        box_polygon_.push_back(std::move(ring));
+        mapnik::geometry::correct(box_polygon_);
+    }
+
+    geometry_type operator()(geometry_type const& geom) const
+    {
+        mapnik::box2d<double> extent = mapnik::geometry::envelope(geom);
+        if (!extent.valid() || !box_.intersects(extent)) return mapnik::geometry::geometry_empty();
+        if (box_.contains(extent)) return geom;
+        return mapnik::util::apply_visitor(*this, geom);
+    }
+
+    geometry_type operator()(mapnik::geometry::geometry_empty const&) const
+    {
+        return mapnik::geometry::geometry_empty();
+    }
+
+    geometry_type operator()(mapnik::geometry::point<double> const& pt) const
+    {
+        if (box_.contains(pt.x, pt.y)) return pt;
+        return mapnik::geometry::geometry_empty();
+    }
+
+    geometry_type operator()(mapnik::geometry::multi_point<double> const& points) const
+    {
+        mapnik::geometry::multi_point<double> result;
+        for (auto const& pt : points)
+        {
+            if (box_.contains(pt.x, pt.y)) result.push_back(pt);
+        }
+        if (result.empty()) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+    geometry_type operator()(mapnik::geometry::line_string<double> const& line) const
+    {
+        mapnik::geometry::multi_line_string<double> result;
+        boost::geometry::intersection(line, box_polygon_, result);
+        return single_or_multi(std::move(result));
+    }
+
+    geometry_type operator()(mapnik::geometry::multi_line_string<double> const& lines) const
+    {
+        mapnik::geometry::multi_line_string<double> result;
+        boost::geometry::intersection(lines, box_polygon_, result);
+        if (result.empty()) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+    geometry_type operator()(mapnik::geometry::polygon<double> const& poly) const
+    {
+        // intersection expects rings in the orientation the adapters declare
+        mapnik::geometry::polygon<double> input(poly);
+        mapnik::geometry::correct(input);
+        mapnik::geometry::multi_polygon<double> result;
+        boost::geometry::intersection(input, box_polygon_, result);
+        return single_or_multi(std::move(result));
+    }
+
+    geometry_type operator()(mapnik::geometry::multi_polygon<double> const& polys) const
+    {
+        mapnik::geometry::multi_polygon<double> input(polys);
+        mapnik::geometry::correct(input);
+        mapnik::geometry::multi_polygon<double> result;
+        boost::geometry::intersection(input, box_polygon_, result);
+        if (result.empty()) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+    geometry_type operator()(mapnik::geometry::geometry_collection<double> const& collection) const
+    {
+        mapnik::geometry::geometry_collection<double> result;
+        for (auto const& part : collection)
+        {
+            geometry_type clipped = (*this)(part);
+            if (!clipped.is<mapnik::geometry::geometry_empty>()) result.push_back(std::move(clipped));
+        }
+        if (result.empty()) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+  private:
+    template <typename Multi>
+    static geometry_type single_or_multi(Multi && parts)
+    {
+        if (parts.empty()) return mapnik::geometry::geometry_empty();
+        if (parts.size() == 1) return std::move(parts.front());
+        return std::move(parts);
+    }
+
+    mapnik::box2d<double> box_;
+    mapnik::geometry::polygon<double> box_polygon_;
+};
+
+// Simplifies lines and polygon rings with mapnik's simplify_converter, the same
+// code the renderers use for the simplify symbolizer property. Lines reduced to
+// less than two points and rings to less than three are dropped, as are
+// polygons losing their exterior ring. Points are returned unchanged.
+struct simplify_visitor
+{
+    using geometry_type = mapnik::geometry::geometry<double>;
+    using path_type = std::vector<mapnik::geometry::point<double>>;
+
+    simplify_visitor(mapnik::simplify_algorithm_e algorithm, double tolerance)
+        : algorithm_(algorithm),
+          tolerance_(tolerance)
+    {
+        if (!(tolerance >= 0)) throw std::runtime_error("simplify tolerance must not be negative");
+    }
+
+    geometry_type operator()(geometry_type const& geom) const
+    {
+        return mapnik::util::apply_visitor(*this, geom);
+    }
+
+    geometry_type operator()(mapnik::geometry::geometry_empty const&) const
+    {
+        return mapnik::geometry::geometry_empty();
+    }
+
+    geometry_type operator()(mapnik::geometry::point<double> const& pt) const
+    {
+        return pt;
+    }
+
+    geometry_type operator()(mapnik::geometry::multi_point<double> const& points) const
+    {
+        return points;
+    }
+
+    geometry_type operator()(mapnik::geometry::line_string<double> const& line) const
+    {
+        mapnik::geometry::line_string<double> result;
+        if (!simplify(line, result)) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+    geometry_type operator()(mapnik::geometry::multi_line_string<double> const& lines) const
+    {
+        mapnik::geometry::multi_line_string<double> result;
+        for (auto const& line : lines)
+        {
+            mapnik::geometry::line_string<double> simplified;
+            if (simplify(line, simplified)) result.push_back(std::move(simplified));
+        }
+        if (result.empty()) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+    geometry_type operator()(mapnik::geometry::polygon<double> const& poly) const
+    {
+        mapnik::geometry::polygon<double> result;
+        if (!simplify(poly, result)) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+    geometry_type operator()(mapnik::geometry::multi_polygon<double> const& polys) const
+    {
+        mapnik::geometry::multi_polygon<double> result;
+        for (auto const& poly : polys)
+        {
+            mapnik::geometry::polygon<double> simplified;
+            if (simplify(poly, simplified)) result.push_back(std::move(simplified));
+        }
+        if (result.empty()) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+    geometry_type operator()(mapnik::geometry::geometry_collection<double> const& collection) const
+    {
+        mapnik::geometry::geometry_collection<double> result;
+        for (auto const& part : collection)
+        {
+            geometry_type simplified = (*this)(part);
+            if (!simplified.is<mapnik::geometry::geometry_empty>()) result.push_back(std::move(simplified));
+        }
+        if (result.empty()) return mapnik::geometry::geometry_empty();
+        return result;
+    }
+
+  private:
+    // Runs the converter over a vertex source, one path per move_to,
+    // closed paths get their first point repeated at the end
+    template <typename VertexAdapter>
+    std::vector<path_type> paths(VertexAdapter adapter) const
+    {
+        mapnik::simplify_converter<VertexAdapter> converter(adapter);
+        converter.set_simplify_algorithm(algorithm_);
+        converter.set_simplify_tolerance(tolerance_);
+        converter.rewind(0);
+        std::vector<path_type> result;
+        double x, y;
+        unsigned cmd;
+        while ((cmd = converter.vertex(&x, &y)) != mapnik::SEG_END)
+        {
+            if (cmd == mapnik::SEG_MOVETO || result.empty()) result.emplace_back();
+            if (cmd == mapnik::SEG_CLOSE)
+            {
+                path_type & path = result.back();
+                if (!path.empty() && (path.front().x != path.back().x || path.front().y != path.back().y))
+                {
+                    path.push_back(path.front());
+                }
+            }
+            else
+            {
+                result.back().emplace_back(x, y);
+            }
+        }
+        return result;
+    }
+
+    bool simplify(mapnik::geometry::line_string<double> const& line,
+                  mapnik::geometry::line_string<double> & result) const
+    {
+        if (line.size() < 2) return false;
+        auto simplified = paths(mapnik::geometry::line_string_vertex_adapter<double>(line));
+        if (simplified.empty() || simplified.front().size() < 2) return false;
+        result.assign(simplified.front().begin(), simplified.front().end());
+        return true;
+    }
+
+    bool simplify(mapnik::geometry::polygon<double> const& poly,
+                  mapnik::geometry::polygon<double> & result) const
+    {
+        if (poly.empty()) return false;
+        auto rings = paths(mapnik::geometry::polygon_vertex_adapter<double>(poly));
+        for (std::size_t i = 0; i < rings.size(); ++i)
+        {
+            // three distinct points plus the closing one
+            if (rings[i].size() < 4)
+            {
+                if (i == 0) return false;
+                continue;
+            }
+            mapnik::geometry::linear_ring<double> ring;
+            ring.assign(rings[i].begin(), rings[i].end());
+            result.push_back(std::move(ring));
+        }
+        return !result.empty();
+    }
+
+    mapnik::simplify_algorithm_e algorithm_;
+    double tolerance_;
+};
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_GEOMETRY_GENERALIZE_HPP
@@ -0,0 +1,448 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_INDEX_SCAN_HPP
+#define MAPNIK_PYTHON_INDEX_SCAN_HPP
+
+// Streaming scanners finding the records of shapefiles, CSV and GeoJSON files
+// for spatial index building. They only locate records and read shapefile
+// bounding boxes, geometries are parsed by the caller.
+
+// stl
+#include <algorithm>
+#include <cctype>
+#include <cstdint>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <limits>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+namespace python_mapnik {
+
+struct index_box
+{
+    double minx = 0;
+    double miny = 0;
+    double maxx = 0;
+    double maxy = 0;
+    bool valid = false;
+
+    void expand_to_include(index_box const& other)
+    {
+        if (!other.valid) return;
+        if (!valid)
+        {
+            *this = other;
+            return;
+        }
+        minx = std::min(minx, other.minx);
+        miny = std::min(miny, other.miny);
+        maxx = std::max(maxx, other.maxx);
+        maxy = std::max(maxy, other.maxy);
+    }
+};
+
+// Calls fn(data, size, offset) for consecutive chunks of a file
+template <typename Fn>
+void read_chunks(std::string const& path, Fn && fn)
+{
+    std::ifstream in(path, std::ios::binary);
+    if (!in) throw std::runtime_error("could not open '" + path + "'");
+    std::vector<char> buffer(1 << 20);
+    std::uint64_t offset = 0;
+    while (in)
+    {
+        in.read(buffer.data(), static_cast<std::streamsize>(buffer.size()));
+        std::size_t size = static_cast<std::size_t>(in.gcount());
+        if (size == 0) break;
+        fn(buffer.data(), size, offset);
+        offset += size;
+    }
+}
+
+// Shapefiles
+
+namespace detail {
+
+inline std::int32_t read_int32_be(unsigned char const* p)
+{
+    return static_cast<std::int32_t>((std::uint32_t(p[0]) << 24) | (std::uint32_t(p[1]) << 16) |
+                                     (std::uint32_t(p[2]) << 8) | std::uint32_t(p[3]));
+}
+
+inline std::int32_t read_int32_le(unsigned char const* p)
+{
+    return static_cast<std::int32_t>((std::uint32_t(p[3]) << 24) | (std::uint32_t(p[2]) << 16) |
+                                     (std::uint32_t(p[1]) << 8) | std::uint32_t(p[0]));
+}
+
+inline double read_double_le(unsigned char const* p)
+{
+    std::uint64_t bits = 0;
+    for (int i = 7; i >= 0; --i) bits = (bits << 8) | p[i];
+    double value;
+    std::memcpy(&value, &bits, sizeof(value));
+    return value;
+}
+
+} // namespace detail
+
+// The extent stored in the .shp header
+inline index_box shape_extent(std::string const& base)
+{
+    std::ifstream shp(base + ".shp", std::ios::binary);
+    if (!shp) throw std::runtime_error("could not open '" + base + ".shp'");
+    unsigned char header[100];
+    shp.read(reinterpret_cast<char*>(header), sizeof(header));
+    if (shp.gcount() != sizeof(header)) throw std::runtime_error(base + ".shp: truncated header");
+    index_box box;
+    box.minx = detail::read_double_le(header + 36);
+    box.miny = detail::read_double_le(header + 44);
+    box.maxx = detail::read_double_le(header + 52);
+    box.maxy = detail::read_double_le(header + 60);
+    box.valid = true;
+    return box;
+}
+
+// Calls fn(record, offset, size, box) for every record listed in the .shx:
+// offset of the record header in the .shp, content size in bytes and the
+// bounding box, invalid for null shapes and records that don't match the .shx.
+// Returns the number of records.
+template <typename Fn>
+std::size_t scan_shape_records(std::string const& base, Fn && fn)
+{
+    std::ifstream shx(base + ".shx", std::ios::binary);
+    if (!shx) throw std::runtime_error("could not open '" + base + ".shx'");
+    std::ifstream shp(base + ".shp", std::ios::binary);
+    if (!shp) throw std::runtime_error("could not open '" + base + ".shp'");
+    shx.seekg(100);
+    unsigned char entry[8];
+    unsigned char header[44];
+    std::size_t record = 0;
+    while (shx.read(reinterpret_cast<char*>(entry), sizeof(entry)))
+    {
+        std::uint64_t offset = std::uint64_t(std::uint32_t(detail::read_int32_be(entry))) * 2;
+        std::int32_t length = detail::read_int32_be(entry + 4);
+        index_box box;
+        shp.clear();
+        shp.seekg(static_cast<std::streamoff>(offset));
+        shp.read(reinterpret_cast<char*>(header), sizeof(header));
+        std::size_t got = static_cast<std::size_t>(shp.gcount());
+        if (got >= 12 && detail::read_int32_be(header + 4) == length)
+        {
+            std::int32_t shape_type = detail::read_int32_le(header + 8);
+            if (shape_type == 1 || shape_type == 11 || shape_type == 21) // points
+            {
+                if (got >= 28)
+                {
+                    box.minx = box.maxx = detail::read_double_le(header + 12);
+                    box.miny = box.maxy = detail::read_double_le(header + 20);
+                    box.valid = true;
+                }
+            }
+            else if (shape_type != 0 && got >= 44)
+            {
+                box.minx = detail::read_double_le(header + 12);
+                box.miny = detail::read_double_le(header + 20);
+                box.maxx = detail::read_double_le(header + 28);
+                box.maxy = detail::read_double_le(header + 36);
+                box.valid = true;
+            }
+        }
+        fn(record++, offset, std::uint64_t(std::max(length, 0)) * 2, box);
+    }
+    return record;
+}
+
+// CSV
+
+// Calls fn(offset, record) for every record, split at line breaks outside
+// quotes with \r\n counting as one break
+template <typename Fn>
+void scan_csv_records(std::string const& path, char quote, Fn && fn)
+{
+    std::string record;
+    std::uint64_t start = 0;
+    bool in_quote = false;
+    bool after_cr = false;
+    read_chunks(path, [&](char const* data, std::size_t size, std::uint64_t offset) {
+        std::size_t begin = 0;
+        for (std::size_t i = 0; i < size; ++i)
+        {
+            char c = data[i];
+            if (after_cr)
+            {
+                after_cr = false;
+                if (c == '\n')
+                {
+                    begin = i + 1;
+                    start = offset + i + 1;
+                    continue;
+                }
+            }
+            if (c == quote)
+            {
+                in_quote = !in_quote;
+            }
+            else if (!in_quote && (c == '\n' || c == '\r'))
+            {
+                record.append(data + begin, i - begin);
+                fn(start, record);
+                record.clear();
+                begin = i + 1;
+                start = offset + i + 1;
+                after_cr = (c == '\r');
+            }
+        }
+        record.append(data + begin, size - begin);
+    });
+    if (!record.empty()) fn(start, record);
+}
+
+inline std::vector<std::string> split_csv_fields(std::string const& record, char separator, char quote)
+{
+    std::vector<std::string> fields(1);
+    bool in_quote = false;
+    for (std::size_t i = 0; i < record.size(); ++i)
+    {
+        char c = record[i];
+        if (in_quote)
+        {
+            if (c != quote) fields.back() += c;
+            else if (i + 1 < record.size() && record[i + 1] == quote) fields.back() += record[++i];
+            else in_quote = false;
+        }
+        else if (c == quote) in_quote = true;
+        else if (c == separator) fields.emplace_back();
+        else fields.back() += c;
+    }
+    return fields;
+}
+
+inline bool is_blank(std::string const& text)
+{
+    return std::all_of(text.begin(), text.end(), [](char c) { return std::isspace(static_cast<unsigned char>(c)); });
+}
+
+// The most frequent of the usual separators in the header line
+inline char detect_csv_separator(std::string const& header)
+{
+    char best = ',';
+    std::ptrdiff_t best_count = -1;
+    for (char candidate : {',', '\t', '|', ';'})
+    {
+        std::ptrdiff_t count = std::count(header.begin(), header.end(), candidate);
+        if (count > best_count)
+        {
+            best = candidate;
+            best_count = count;
+        }
+    }
+    return best;
+}
+
+struct csv_columns
+{
+    enum kind_type { xy, wkt, geojson };
+    kind_type kind;
+    std::size_t first;
+    std::size_t second;
+};
+
+inline csv_columns detect_csv_columns(std::vector<std::string> headers, std::string const& path)
+{
+    for (auto & header : headers)
+    {
+        auto first = std::find_if_not(header.begin(), header.end(), [](char c) { return std::isspace(static_cast<unsigned char>(c)); });
+        auto last = std::find_if_not(header.rbegin(), header.rend(), [](char c) { return std::isspace(static_cast<unsigned char>(c)); }).base();
+        header = first < last ? std::string(first, last) : std::string();
+        std::transform(header.begin(), header.end(), header.begin(), [](char c) { return static_cast<char>(std::tolower(static_cast<unsigned char>(c))); });
+    }
+    auto find = [&headers](std::initializer_list<char const*> names) {
+        for (char const* name : names)
+        {
+            auto itr = std::find(headers.begin(), headers.end(), name);
+            if (itr != headers.end()) return static_cast<std::size_t>(itr - headers.begin());
+        }
+        return std::numeric_limits<std::size_t>::max();
+    };
+    constexpr std::size_t npos = std::numeric_limits<std::size_t>::max();
+    std::size_t index = find({"wkt"});
+    if (index != npos) return csv_columns{csv_columns::wkt, index, 0};
+    index = find({"geojson"});
+    if (index != npos) return csv_columns{csv_columns::geojson, index, 0};
+    std::size_t x = find({"x", "lon", "lng", "long", "longitude"});
+    std::size_t y = find({"y", "lat", "latitude"});
+    if (x == npos || y == npos) throw std::runtime_error(path + ": could not detect geometry columns");
+    return csv_columns{csv_columns::xy, x, y};
+}
+
+// A number surrounded by optional whitespace
+inline bool parse_number(std::string const& text, double & value)
+{
+    char const* begin = text.c_str();
+    while (std::isspace(static_cast<unsigned char>(*begin))) ++begin;
+    char* end = nullptr;
+    value = std::strtod(begin, &end);
+    if (end == begin) return false;
+    while (std::isspace(static_cast<unsigned char>(*end))) ++end;
+    return *end == '\0';
+}
+
+// GeoJSON
+
+// Calls fn(offset, text) for every object of the top level "features" array.
+// Only strings and brackets are tokenized, the rest of the document is skipped.
+template <typename Fn>
+void scan_geojson_features(std::string const& path, Fn && fn)
+{
+    int depth = 0;
+    int features_depth = -1;
+    bool in_string = false;
+    bool escape = false;
+    bool capture_key = false;
+    bool expect_features = false;
+    bool in_feature = false;
+    bool done = false;
+    std::string key;
+    std::string feature;
+    std::uint64_t feature_start = 0;
+    read_chunks(path, [&](char const* data, std::size_t size, std::uint64_t offset) {
+        if (done) return;
+        std::size_t begin = 0;
+        for (std::size_t i = 0; i < size; ++i)
+        {
+            char c = data[i];
+            if (in_string)
+            {
+                if (escape) escape = false;
+                else if (c == '\\') escape = true;
+                else if (c == '"')
+                {
+                    in_string = false;
+                    if (capture_key && key == "features") expect_features = true;
+                    capture_key = false;
+                }
+                else if (capture_key)
+                {
+                    key += c;
+                    if (key.size() > 8) capture_key = false;
+                }
+                continue;
+            }
+            if (c == '"')
+            {
+                in_string = true;
+                capture_key = depth == 1 && features_depth < 0;
+                key.clear();
+            }
+            else if (c == '{' || c == '[')
+            {
+                if (expect_features && c == '[')
+                {
+                    features_depth = depth + 1;
+                }
+                else if (features_depth >= 0 && depth == features_depth && c == '{')
+                {
+                    in_feature = true;
+                    feature_start = offset + i;
+                    begin = i;
+                    feature.clear();
+                }
+                expect_features = false;
+                ++depth;
+            }
+            else if (c == '}' || c == ']')
+            {
+                --depth;
+                if (in_feature && depth == features_depth)
+                {
+                    feature.append(data + begin, i + 1 - begin);
+                    in_feature = false;
+                    fn(feature_start, feature);
+                }
+                else if (features_depth >= 0 && depth < features_depth)
+                {
+                    done = true;
+                    return;
+                }
+            }
+        }
+        if (in_feature) feature.append(data + begin, size - begin);
+    });
+}
+
+// Hilbert ordering
+
+// Distance of cell (x, y) along a Hilbert curve over a 2^order grid
+inline std::uint64_t hilbert_distance(std::uint32_t x, std::uint32_t y, int order = 16)
+{
+    std::uint64_t d = 0;
+    for (std::uint32_t s = 1u << (order - 1); s > 0; s >>= 1)
+    {
+        std::uint32_t rx = (x & s) ? 1 : 0;
+        std::uint32_t ry = (y & s) ? 1 : 0;
+        d += std::uint64_t(s) * s * ((3 * rx) ^ ry);
+        if (ry == 0)
+        {
+            if (rx == 1)
+            {
+                x = s - 1 - x;
+                y = s - 1 - y;
+            }
+            std::swap(x, y);
+        }
+    }
+    return d;
+}
+
+// Indices of boxes in Hilbert order of their centres, invalid boxes last
+inline std::vector<std::size_t> hilbert_order(std::vector<index_box> const& boxes)
+{
+    index_box extent;
+    for (auto const& box : boxes) extent.expand_to_include(box);
+    std::vector<std::size_t> order(boxes.size());
+    for (std::size_t i = 0; i < order.size(); ++i) order[i] = i;
+    if (!extent.valid) return order;
+    double const side = (1 << 16) - 1;
+    double sx = extent.maxx > extent.minx ? side / (extent.maxx - extent.minx) : 0;
+    double sy = extent.maxy > extent.miny ? side / (extent.maxy - extent.miny) : 0;
+    std::vector<std::uint64_t> keys(boxes.size(), std::numeric_limits<std::uint64_t>::max());
+    for (std::size_t i = 0; i < boxes.size(); ++i)
+    {
+        index_box const& b = boxes[i];
+        if (!b.valid) continue;
+        auto x = static_cast<std::uint32_t>(((b.minx + b.maxx) / 2 - extent.minx) * sx);
+        auto y = static_cast<std::uint32_t>(((b.miny + b.maxy) / 2 - extent.miny) * sy);
+        keys[i] = hilbert_distance(x, y);
+    }
+    std::stable_sort(order.begin(), order.end(), [&keys](std::size_t a, std::size_t b) { return keys[a] < keys[b]; });
+    return order;
+}
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_INDEX_SCAN_HPP
@@ -0,0 +1,167 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_INDEXED_DATASOURCE_HPP
+#define MAPNIK_PYTHON_INDEXED_DATASOURCE_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/datasource.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/feature_layer_desc.hpp>
+#include <mapnik/query.hpp>
+#include "feature_id_lookup.hpp"
+#include "vector_featureset.hpp"
+// boost
+#include <boost/geometry.hpp>
+#include <boost/geometry/index/rtree.hpp>
+// stl
+#include <algorithm>
+#include <memory>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+namespace python_mapnik {
+
+// In-memory datasource over a fixed set of features with an optional packed
+// R-tree, so bbox queries cost an index lookup instead of a scan. Features are
+// also indexed by id.
+class indexed_datasource : public mapnik::datasource, public feature_id_lookup
+{
+    using geometry_type_result = decltype(std::declval<mapnik::datasource const&>().get_geometry_type());
+    using point_type = boost::geometry::model::point<double, 2, boost::geometry::cs::cartesian>;
+    using box_type = boost::geometry::model::box<point_type>;
+    using value_type = std::pair<box_type, std::size_t>;
+    using tree_type = boost::geometry::index::rtree<value_type, boost::geometry::index::quadratic<16>>;
+  public:
+    indexed_datasource(mapnik::parameters const& params,
+                       mapnik::layer_descriptor const& desc,
+                       geometry_type_result geometry_type,
+                       std::shared_ptr<feature_vector const> features,
+                       bool index)
+        : mapnik::datasource(params),
+          desc_(desc),
+          geometry_type_(geometry_type),
+          features_(std::move(features))
+    {
+        std::vector<value_type> values;
+        values.reserve(features_->size());
+        ids_.reserve(features_->size());
+        for (std::size_t i = 0; i < features_->size(); ++i)
+        {
+            ids_.emplace((*features_)[i]->id(), i);
+            mapnik::box2d<double> box = (*features_)[i]->envelope();
+            if (!box.valid()) continue;
+            if (extent_.valid()) extent_.expand_to_include(box);
+            else extent_ = box;
+            if (index)
+            {
+                values.emplace_back(box_type(point_type(box.minx(), box.miny()),
+                                             point_type(box.maxx(), box.maxy())), i);
+            }
+        }
+        // range constructor bulk loads the tree with the packing algorithm
+        if (index) tree_ = std::make_unique<tree_type>(values);
+    }
+
+    mapnik::datasource::datasource_t type() const override
+    {
+        return mapnik::datasource::Vector;
+    }
+
+    mapnik::box2d<double> envelope() const override
+    {
+        return extent_;
+    }
+
+    geometry_type_result get_geometry_type() const override
+    {
+        return geometry_type_;
+    }
+
+    mapnik::layer_descriptor get_descriptor() const override
+    {
+        return desc_;
+    }
+
+    mapnik::featureset_ptr features(mapnik::query const& q) const override
+    {
+        return features_in_box(q.get_bbox());
+    }
+
+    mapnik::featureset_ptr features_at_point(mapnik::coord2d const& pt, double tol) const override
+    {
+        return features_in_box(mapnik::box2d<double>(pt.x - tol, pt.y - tol, pt.x + tol, pt.y + tol));
+    }
+
+    mapnik::featureset_ptr features_by_ids(std::vector<mapnik::value_integer> const& ids,
+                                           std::set<std::string> const&) const override
+    {
+        auto result = std::make_shared<feature_vector>();
+        result->reserve(ids.size());
+        for (auto id : ids)
+        {
+            auto itr = ids_.find(id);
+            if (itr != ids_.end()) result->push_back((*features_)[itr->second]);
+        }
+        return std::make_shared<vector_featureset>(result);
+    }
+
+    std::shared_ptr<feature_vector const> all_features() const
+    {
+        return features_;
+    }
+
+    std::size_t size() const
+    {
+        return features_->size();
+    }
+
+  private:
+    mapnik::featureset_ptr features_in_box(mapnik::box2d<double> const& box) const
+    {
+        if (!tree_) return std::make_shared<vector_featureset>(features_, box);
+        std::vector<value_type> hits;
+        tree_->query(boost::geometry::index::intersects(box_type(point_type(box.minx(), box.miny()),
+                                                                 point_type(box.maxx(), box.maxy()))),
+                     std::back_inserter(hits));
+        // keep the original feature order, renderers rely on it for painting order
+        std::sort(hits.begin(), hits.end(), [](value_type const& a, value_type const& b) { return a.second < b.second; });
+        auto result = std::make_shared<feature_vector>();
+        result->reserve(hits.size());
+        for (auto const& hit : hits) result->push_back((*features_)[hit.second]);
+        return std::make_shared<vector_featureset>(result);
+    }
+
+    mapnik::layer_descriptor desc_;
+    geometry_type_result geometry_type_;
+    std::shared_ptr<feature_vector const> features_;
+    mapnik::box2d<double> extent_;
+    std::unique_ptr<tree_type> tree_;
+    // first feature wins when ids are not unique
+    std::unordered_map<mapnik::value_integer, std::size_t> ids_;
+};
+
+} // namespace python_mapnik
+
+#endif //MAPNIK_PYTHON_INDEXED_DATASOURCE_HPP
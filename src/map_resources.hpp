@@ -0,0 +1,109 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_MAP_RESOURCES_HPP
+#define MAPNIK_PYTHON_MAP_RESOURCES_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/feature_type_style.hpp>
+#include <mapnik/font_set.hpp>
+#include <mapnik/layer.hpp>
+#include <mapnik/map.hpp>
+#include <mapnik/parse_path.hpp>
+#include <mapnik/rule.hpp>
+#include <mapnik/symbolizer.hpp>
+#include <mapnik/text/placements/base.hpp>
+// stl
+#include <set>
+#include <string>
+#include <vector>
+
+namespace python_mapnik {
+
+// Collects the font faces and static marker/pattern files referenced by symbolizers
+struct map_resources
+{
+    std::set<std::string> face_names;
+    std::set<std::string> files;
+
+    void add(mapnik::font_set const& fontset)
+    {
+        for (auto const& name : fontset.get_face_names()) face_names.insert(name);
+    }
+
+    void add(mapnik::symbolizer_base const& sym)
+    {
+        auto file = sym.properties.find(mapnik::keys::file);
+        if (file != sym.properties.end() && file->second.is<mapnik::path_expression_ptr>())
+        {
+            mapnik::path_expression_ptr const& path = file->second.get<mapnik::path_expression_ptr>();
+            std::set<std::string> attributes;
+            if (path) mapnik::path_processor_type::collect_attributes(*path, attributes);
+            // paths built from feature attributes are only known at render time
+            if (path && attributes.empty()) files.insert(mapnik::path_processor_type::to_string(*path));
+        }
+        auto placements = sym.properties.find(mapnik::keys::text_placements_);
+        if (placements != sym.properties.end() && placements->second.is<mapnik::text_placements_ptr>())
+        {
+            mapnik::text_placements_ptr const& ptr = placements->second.get<mapnik::text_placements_ptr>();
+            if (!ptr) return;
+            auto const& format = ptr->defaults.format_defaults;
+            if (!format.face_name.empty()) face_names.insert(format.face_name);
+            if (format.fontset) add(*format.fontset);
+        }
+    }
+
+    // Adds the resources of the active rules of the named styles. `active` is
+    // called with each rule and decides whether it is visible.
+    template <typename Active>
+    void add_styles(mapnik::Map const& m, std::set<std::string> const& style_names, Active && active)
+    {
+        for (auto const& name : style_names)
+        {
+            auto style = m.find_style(name);
+            if (!style) continue;
+            for (auto const& rule : style->get_rules())
+            {
+                if (!active(rule)) continue;
+                for (auto const& sym : rule.get_symbolizers())
+                {
+                    mapnik::util::apply_visitor([&](auto const& s) { add(s); }, sym);
+                }
+            }
+        }
+    }
+};
+
+// Flattens the layer tree, group layers first
+inline void collect_layers(std::vector<mapnik::layer> const& layers, std::vector<mapnik::layer const*> & result)
+{
+    for (mapnik::layer const& lyr : layers)
+    {
+        result.push_back(&lyr);
+        collect_layers(lyr.layers(), result);
+    }
+}
+
+} // namespace python_mapnik
+
+#endif // MAPNIK_PYTHON_MAP_RESOURCES_HPP
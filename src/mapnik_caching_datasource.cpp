@@ -0,0 +1,322 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/datasource.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/featureset.hpp>
+#include <mapnik/geometry.hpp>
+#include <mapnik/geometry/box2d.hpp>
+#include <mapnik/query.hpp>
+#include <mapnik/util/variant.hpp>
+#include "vector_featureset.hpp"
+// stl
+#include <cmath>
+#include <iomanip>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <sstream>
+#include <stdexcept>
+#include <string>
+#include <unordered_map>
+//pybind11
+#include <pybind11/pybind11.h>
+
+namespace py = pybind11;
+
+namespace {
+
+struct vertex_count
+{
+    std::size_t operator() (mapnik::geometry::geometry_empty const&) const
+    {
+        return 0;
+    }
+
+    template <typename T>
+    std::size_t operator() (mapnik::geometry::point<T> const&) const
+    {
+        return 1;
+    }
+
+    template <typename T>
+    std::size_t operator() (mapnik::geometry::line_string<T> const& line) const
+    {
+        return line.size();
+    }
+
+    template <typename T>
+    std::size_t operator() (mapnik::geometry::polygon<T> const& poly) const
+    {
+        std::size_t count = 0;
+        for (auto const& ring : poly) count += ring.size();
+        return count;
+    }
+
+    template <typename T>
+    std::size_t operator() (mapnik::geometry::multi_point<T> const& multi) const
+    {
+        return multi.size();
+    }
+
+    template <typename T>
+    std::size_t operator() (mapnik::geometry::multi_line_string<T> const& multi) const
+    {
+        std::size_t count = 0;
+        for (auto const& line : multi) count += (*this)(line);
+        return count;
+    }
+
+    template <typename T>
+    std::size_t operator() (mapnik::geometry::multi_polygon<T> const& multi) const
+    {
+        std::size_t count = 0;
+        for (auto const& poly : multi) count += (*this)(poly);
+        return count;
+    }
+
+    template <typename T>
+    std::size_t operator() (mapnik::geometry::geometry_collection<T> const& collection) const
+    {
+        std::size_t count = 0;
+        for (auto const& geom : collection) count += mapnik::util::apply_visitor(*this, geom);
+        return count;
+    }
+};
+
+// Rough heap footprint of a feature, good enough to enforce a memory budget.
+std::size_t feature_bytes(mapnik::feature_impl const& feature)
+{
+    std::size_t bytes = sizeof(mapnik::feature_impl);
+    bytes += mapnik::util::apply_visitor(vertex_count(), feature.get_geometry()) * sizeof(mapnik::geometry::point<double>);
+    for (auto const& val : feature.get_data())
+    {
+        bytes += sizeof(mapnik::value);
+        if (val.is<mapnik::value_unicode_string>())
+        {
+            bytes += val.get<mapnik::value_unicode_string>().length() * sizeof(char16_t);
+        }
+    }
+    return bytes;
+}
+
+// Snaps a bounding box outwards to a grid whose cell size is the next power of two
+// of the box size, so neighbouring and overlapping queries share one cache entry.
+mapnik::box2d<double> snap_to_grid(mapnik::box2d<double> const& box)
+{
+    double size = std::max(box.width(), box.height());
+    if (!(size > 0)) return box;
+    double cell = std::exp2(std::ceil(std::log2(size)));
+    return mapnik::box2d<double>(std::floor(box.minx() / cell) * cell,
+                                 std::floor(box.miny() / cell) * cell,
+                                 std::ceil(box.maxx() / cell) * cell,
+                                 std::ceil(box.maxy() / cell) * cell);
+}
+
+class caching_datasource : public mapnik::datasource
+{
+    using geometry_type_result = decltype(std::declval<mapnik::datasource const&>().get_geometry_type());
+    struct entry
+    {
+        std::string key;
+        std::shared_ptr<python_mapnik::feature_vector const> features;
+        std::size_t bytes;
+    };
+
+  public:
+    caching_datasource(mapnik::datasource_ptr inner, std::size_t max_bytes, bool snap)
+        : mapnik::datasource(inner->params()),
+          inner_(std::move(inner)),
+          max_bytes_(max_bytes),
+          snap_(snap) {}
+
+    mapnik::datasource::datasource_t type() const override
+    {
+        return inner_->type();
+    }
+
+    mapnik::box2d<double> envelope() const override
+    {
+        return inner_->envelope();
+    }
+
+    geometry_type_result get_geometry_type() const override
+    {
+        return inner_->get_geometry_type();
+    }
+
+    mapnik::layer_descriptor get_descriptor() const override
+    {
+        return inner_->get_descriptor();
+    }
+
+    mapnik::featureset_ptr features(mapnik::query const& q) const override
+    {
+        if (inner_->type() != mapnik::datasource::Vector) return inner_->features(q);
+        mapnik::box2d<double> bbox = snap_ ? snap_to_grid(q.get_bbox()) : q.get_bbox();
+        std::string key = make_key(bbox, q);
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            auto itr = index_.find(key);
+            if (itr != index_.end())
+            {
+                ++hits_;
+                entries_.splice(entries_.begin(), entries_, itr->second);
+                return std::make_shared<python_mapnik::vector_featureset>(itr->second->features, q.get_bbox());
+            }
+            ++misses_;
+        }
+
+        mapnik::query fetch(bbox, q.resolution(), q.scale_denominator(), bbox);
+        for (auto const& name : q.property_names()) fetch.add_property_name(name);
+        fetch.set_variables(q.variables());
+        fetch.set_filter_factor(q.get_filter_factor());
+        std::shared_ptr<python_mapnik::feature_vector const> features = python_mapnik::read_features(inner_->features(fetch));
+        std::size_t bytes = 0;
+        for (auto const& feature : *features) bytes += feature_bytes(*feature);
+        insert(key, features, bytes);
+        return std::make_shared<python_mapnik::vector_featureset>(features, q.get_bbox());
+    }
+
+    mapnik::featureset_ptr features_at_point(mapnik::coord2d const& pt, double tol) const override
+    {
+        return inner_->features_at_point(pt, tol);
+    }
+
+    mapnik::datasource_ptr inner() const
+    {
+        return inner_;
+    }
+
+    py::dict stats() const
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        py::dict d;
+        d["entries"] = entries_.size();
+        d["bytes"] = bytes_;
+        d["max_bytes"] = max_bytes_;
+        d["hits"] = hits_;
+        d["misses"] = misses_;
+        d["evictions"] = evictions_;
+        std::size_t total = hits_ + misses_;
+        d["hit_ratio"] = total > 0 ? static_cast<double>(hits_) / total : 0.0;
+        return d;
+    }
+
+    void clear()
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        entries_.clear();
+        index_.clear();
+        bytes_ = 0;
+    }
+
+  private:
+    std::string make_key(mapnik::box2d<double> const& bbox, mapnik::query const& q) const
+    {
+        std::ostringstream s;
+        s << std::setprecision(17) << bbox.minx() << ',' << bbox.miny() << ','
+          << bbox.maxx() << ',' << bbox.maxy() << '|';
+        double scale = q.scale_denominator();
+        // in tile mode renders within the same zoom level share entries
+        if (snap_ && scale > 0) s << std::lround(std::log2(scale));
+        else s << scale;
+        for (auto const& name : q.property_names()) s << '|' << name;
+        return s.str();
+    }
+
+    void insert(std::string const& key,
+                std::shared_ptr<python_mapnik::feature_vector const> const& features,
+                std::size_t bytes) const
+    {
+        if (bytes > max_bytes_) return;
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (index_.find(key) != index_.end()) return;
+        entries_.push_front(entry{key, features, bytes});
+        index_[key] = entries_.begin();
+        bytes_ += bytes;
+        while (bytes_ > max_bytes_)
+        {
+            bytes_ -= entries_.back().bytes;
+            index_.erase(entries_.back().key);
+            entries_.pop_back();
+            ++evictions_;
+        }
+    }
+
+    mapnik::datasource_ptr inner_;
+    std::size_t max_bytes_;
+    bool snap_;
+    mutable std::mutex mutex_;
+    mutable std::list<entry> entries_;
+    mutable std::unordered_map<std::string, std::list<entry>::iterator> index_;
+    mutable std::size_t bytes_ = 0;
+    mutable std::size_t hits_ = 0;
+    mutable std::size_t misses_ = 0;
+    mutable std::size_t evictions_ = 0;
+};
+
+std::shared_ptr<caching_datasource> create_caching_datasource(mapnik::datasource_ptr const& inner,
+                                                              std::size_t max_bytes,
+                                                              std::string const& key)
+{
+    if (!inner)
+    {
+        throw std::runtime_error("CachingDatasource: inner datasource is required");
+    }
+    if (key != "tile" && key != "exact")
+    {
+        throw std::runtime_error("CachingDatasource: key must be 'tile' or 'exact'");
+    }
+    return std::make_shared<caching_datasource>(inner, max_bytes, key == "tile");
+}
+
+} // namespace
+
+void export_caching_datasource(py::module const& m)
+{
+    py::class_<caching_datasource, mapnik::datasource, std::shared_ptr<caching_datasource>>
+        (m, "CachingDatasource",
+         "Keeps features returned by another datasource in memory across renders.\n"
+         "\n"
+         "Entries are keyed by query extent, scale and requested attributes and\n"
+         "evicted least recently used first once max_bytes is exceeded.\n"
+         "With key='tile' extents are snapped to a power of two grid and scales\n"
+         "to zoom levels, so adjacent tiles and retina renders share entries;\n"
+         "key='exact' only reuses identical queries.\n"
+         "\n"
+         "Usage:\n"
+         ">>> lyr.datasource = CachingDatasource(Shapefile(file='roads.shp'), 64 * 1024 * 1024)\n")
+        .def(py::init(&create_caching_datasource),
+             py::arg("inner"),
+             py::arg("max_bytes"),
+             py::arg("key") = "tile")
+        .def_property_readonly("inner", &caching_datasource::inner,
+                               "The wrapped datasource")
+        .def("stats", &caching_datasource::stats,
+             "Return a dict with entries, bytes, hits, misses, evictions and hit_ratio")
+        .def("clear", &caching_datasource::clear,
+             "Drop all cached features")
+        ;
+}
@@ -27,15 +27,34 @@
 #include <mapnik/datasource_cache.hpp>
 #include <mapnik/feature_layer_desc.hpp>
 #include <mapnik/memory_datasource.hpp>
+#include <mapnik/memory_featureset.hpp>
+#include <mapnik/feature_factory.hpp>
+#include <mapnik/projection.hpp>
+#include <mapnik/proj_transform.hpp>
+#include <mapnik/geometry/reprojection.hpp>
+#include <mapnik/well_known_srs.hpp>
 #include "mapnik_value_converter.hpp"
 #include "create_datasource.hpp"
+#include "indexed_datasource.hpp"
+#include "geojson_writer.hpp"
+#include "feature_stream.hpp"
+#include "geometry_array.hpp"
+#include "python_optional.hpp"
 // stl
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <memory>
+#include <mutex>
+#include <set>
+#include <unordered_map>
 #include <vector>
 //pybind11
 #include <pybind11/pybind11.h>
 #include <pybind11/operators.h>
 #include <pybind11/stl.h>
 #include <pybind11/native_enum.h>
+#include <pybind11/numpy.h>
 
 using mapnik::datasource;
 using mapnik::memory_datasource;
@@ -123,6 +142,517 @@ py::dict parameters_impl(std::shared_ptr<mapnik::datasource> const& ds)
     return d;
 }
 
+std::shared_ptr<mapnik::datasource> materialize(std::shared_ptr<mapnik::datasource> const& ds,
+                                                boost::optional<std::string> const& target_srs,
+                                                boost::optional<std::vector<std::string>> const& fields,
+                                                bool index,
+                                                std::string const& source_srs)
+{
+    if (ds->type() != datasource::Vector)
+    {
+        throw std::runtime_error("materialize: only vector datasources can be materialized");
+    }
+    layer_descriptor source_desc = ds->get_descriptor();
+    layer_descriptor desc(source_desc.get_name(), source_desc.get_encoding());
+    for (auto const& attr : source_desc.get_descriptors())
+    {
+        if (!fields || std::find(fields->begin(), fields->end(), attr.get_name()) != fields->end())
+        {
+            desc.add_descriptor(attr);
+        }
+    }
+    mapnik::query q(ds->envelope());
+    mapnik::context_ptr ctx = std::make_shared<mapnik::context_type>();
+    for (auto const& attr : desc.get_descriptors())
+    {
+        q.add_property_name(attr.get_name());
+        ctx->push(attr.get_name());
+    }
+
+    std::unique_ptr<mapnik::projection> source;
+    std::unique_ptr<mapnik::projection> target;
+    std::unique_ptr<mapnik::proj_transform> prj_trans;
+    if (target_srs && *target_srs != source_srs)
+    {
+        source = std::make_unique<mapnik::projection>(source_srs);
+        target = std::make_unique<mapnik::projection>(*target_srs);
+        prj_trans = std::make_unique<mapnik::proj_transform>(*source, *target);
+    }
+
+    auto features = std::make_shared<python_mapnik::feature_vector>();
+    {
+        py::gil_scoped_release release;
+        mapnik::featureset_ptr fs = ds->features(q);
+        for (mapnik::feature_ptr feature = fs ? fs->next() : mapnik::feature_ptr(); feature; feature = fs->next())
+        {
+            mapnik::feature_ptr copy(mapnik::feature_factory::create(ctx, feature->id()));
+            for (auto const& attr : desc.get_descriptors())
+            {
+                if (feature->has_key(attr.get_name())) copy->put(attr.get_name(), feature->get(attr.get_name()));
+            }
+            if (prj_trans)
+            {
+                unsigned int n_err = 0;
+                copy->set_geometry(mapnik::geometry::reproject_copy(feature->get_geometry(), *prj_trans, n_err));
+            }
+            else
+            {
+                copy->set_geometry_copy(feature->get_geometry());
+            }
+            features->push_back(std::move(copy));
+        }
+    }
+    mapnik::parameters params;
+    params["type"] = std::string("memory");
+    return std::make_shared<python_mapnik::indexed_datasource>(params, desc, ds->get_geometry_type(), features, index);
+}
+
+// Id index of a MemoryDatasource: its features in insertion order and the
+// position of each id. Features are shared with the datasource, not copied.
+struct memory_id_index
+{
+    std::weak_ptr<mapnik::datasource> ds;
+    std::size_t size = 0;
+    std::shared_ptr<python_mapnik::feature_vector> features;
+    // first feature wins when ids are not unique
+    std::unordered_map<mapnik::value_integer, std::size_t> positions;
+};
+
+std::mutex memory_id_indexes_mutex;
+std::unordered_map<mapnik::datasource const*, std::shared_ptr<memory_id_index const>> memory_id_indexes;
+
+// Called whenever features are pushed to a MemoryDatasource
+void invalidate_id_index(mapnik::datasource const& ds)
+{
+    std::lock_guard<std::mutex> lock(memory_id_indexes_mutex);
+    memory_id_indexes.erase(&ds);
+}
+
+std::shared_ptr<memory_id_index const> memory_index(std::shared_ptr<memory_datasource> const& ds)
+{
+    std::size_t size = ds->size();
+    {
+        std::lock_guard<std::mutex> lock(memory_id_indexes_mutex);
+        auto itr = memory_id_indexes.find(ds.get());
+        // a changed size catches pushes made from C++ without invalidating
+        if (itr != memory_id_indexes.end() && itr->second->ds.lock() == ds && itr->second->size == size)
+        {
+            return itr->second;
+        }
+    }
+    auto index = std::make_shared<memory_id_index>();
+    index->ds = ds;
+    index->size = size;
+    // every feature, including ones without a geometry that a bbox query never returns
+    index->features = python_mapnik::read_features(
+        std::make_shared<mapnik::memory_featureset>(ds->envelope(), *ds, false));
+    index->positions.reserve(index->features->size());
+    for (std::size_t i = 0; i < index->features->size(); ++i)
+    {
+        index->positions.emplace((*index->features)[i]->id(), i);
+    }
+    std::lock_guard<std::mutex> lock(memory_id_indexes_mutex);
+    for (auto itr = memory_id_indexes.begin(); itr != memory_id_indexes.end();)
+    {
+        if (itr->second->ds.expired()) itr = memory_id_indexes.erase(itr);
+        else ++itr;
+    }
+    memory_id_indexes[ds.get()] = index;
+    return index;
+}
+
+// Looks ids up in datasources without an id lookup of their own: MemoryDatasource
+// through its id index, anything else with a scan that only keeps the matches.
+mapnik::featureset_ptr scan_features_by_ids(std::shared_ptr<mapnik::datasource> const& ds,
+                                            std::vector<mapnik::value_integer> const& ids,
+                                            std::set<std::string> const& names)
+{
+    auto result = std::make_shared<python_mapnik::feature_vector>();
+    result->reserve(ids.size());
+    if (auto memory = std::dynamic_pointer_cast<memory_datasource>(ds))
+    {
+        auto index = memory_index(memory);
+        for (auto id : ids)
+        {
+            auto itr = index->positions.find(id);
+            if (itr != index->positions.end()) result->push_back((*index->features)[itr->second]);
+        }
+        return std::make_shared<python_mapnik::vector_featureset>(result);
+    }
+    std::unordered_map<mapnik::value_integer, mapnik::feature_ptr> found;
+    for (auto id : ids) found.emplace(id, mapnik::feature_ptr());
+    std::size_t remaining = found.size();
+    mapnik::query q(ds->envelope());
+    for (auto const& name : names) q.add_property_name(name);
+    mapnik::featureset_ptr fs = ds->features(q);
+    for (mapnik::feature_ptr feature = fs ? fs->next() : mapnik::feature_ptr(); feature && remaining > 0;
+         feature = fs->next())
+    {
+        auto itr = found.find(feature->id());
+        if (itr == found.end() || itr->second) continue;
+        itr->second = feature;
+        --remaining;
+    }
+    for (auto id : ids)
+    {
+        auto const& feature = found[id];
+        if (feature) result->push_back(feature);
+    }
+    return std::make_shared<python_mapnik::vector_featureset>(result);
+}
+
+mapnik::featureset_ptr features_by_ids(std::shared_ptr<mapnik::datasource> const& ds,
+                                       std::vector<mapnik::value_integer> const& ids,
+                                       boost::optional<std::vector<std::string>> const& fields)
+{
+    std::set<std::string> names;
+    layer_descriptor desc = ds->get_descriptor();
+    for (auto const& attr : desc.get_descriptors())
+    {
+        if (!fields || std::find(fields->begin(), fields->end(), attr.get_name()) != fields->end())
+        {
+            names.insert(attr.get_name());
+        }
+    }
+    mapnik::featureset_ptr fs;
+    {
+        py::gil_scoped_release release;
+        if (auto lookup = dynamic_cast<python_mapnik::feature_id_lookup const*>(ds.get()))
+        {
+            fs = lookup->features_by_ids(ids, names);
+        }
+        if (!fs) fs = scan_features_by_ids(ds, ids, names);
+        if (!fields) return fs;
+
+        // only keep the requested attributes
+        mapnik::context_ptr ctx = std::make_shared<mapnik::context_type>();
+        for (auto const& name : names) ctx->push(name);
+        auto result = std::make_shared<python_mapnik::feature_vector>();
+        for (mapnik::feature_ptr feature = fs->next(); feature; feature = fs->next())
+        {
+            mapnik::feature_ptr copy(mapnik::feature_factory::create(ctx, feature->id()));
+            for (auto const& name : names)
+            {
+                if (feature->has_key(name)) copy->put(name, feature->get(name));
+            }
+            copy->set_geometry_copy(feature->get_geometry());
+            result->push_back(std::move(copy));
+        }
+        return std::make_shared<python_mapnik::vector_featureset>(result);
+    }
+}
+
+mapnik::query make_query(std::shared_ptr<mapnik::datasource> const& ds, py::object const& query)
+{
+    if (query.is_none()) return mapnik::query(ds->envelope());
+    mapnik::query const& q = query.cast<mapnik::query const&>();
+    // fresh query without attributes, callers add only what they need
+    mapnik::query result(q.get_bbox(), q.resolution(), q.scale_denominator(), q.get_unbuffered_bbox());
+    result.set_variables(q.variables());
+    return result;
+}
+
+std::size_t count(std::shared_ptr<mapnik::datasource> const& ds, py::object const& query)
+{
+    mapnik::query q = make_query(ds, query);
+    py::gil_scoped_release release;
+    std::size_t n = 0;
+    mapnik::featureset_ptr fs = ds->features(q);
+    if (!fs) return n;
+    while (fs->next()) ++n;
+    return n;
+}
+
+std::size_t write_geojson(std::shared_ptr<mapnik::datasource> const& ds,
+                          py::object const& query,
+                          py::object const& fileobj,
+                          bool ndjson,
+                          boost::optional<int> const& precision,
+                          boost::optional<std::vector<std::string>> const& fields)
+{
+    mapnik::query q = make_query(ds, query);
+    layer_descriptor desc = ds->get_descriptor();
+    for (auto const& attr : desc.get_descriptors())
+    {
+        if (!fields || std::find(fields->begin(), fields->end(), attr.get_name()) != fields->end())
+        {
+            q.add_property_name(attr.get_name());
+        }
+    }
+    python_mapnik::geojson_writer writer(fileobj, ndjson, precision, fields);
+    mapnik::featureset_ptr fs;
+    {
+        py::gil_scoped_release release;
+        fs = ds->features(q);
+    }
+    return writer.write(fs);
+}
+
+mapnik::query all_attributes_query(datasource const& ds)
+{
+    mapnik::query q(ds.envelope());
+    layer_descriptor desc = ds.get_descriptor();
+    for (auto const& attr : desc.get_descriptors())
+    {
+        q.add_property_name(attr.get_name());
+    }
+    return q;
+}
+
+std::shared_ptr<python_mapnik::feature_stream> features_async(std::shared_ptr<mapnik::datasource> const& ds,
+                                                              py::object const& query,
+                                                              std::size_t batch_size,
+                                                              std::size_t max_batches)
+{
+    if (batch_size == 0 || max_batches == 0)
+    {
+        throw std::runtime_error("features_async: batch_size and max_batches must be positive");
+    }
+    mapnik::query q = query.is_none() ? all_attributes_query(*ds) : query.cast<mapnik::query>();
+    return std::make_shared<python_mapnik::feature_stream>(ds, q, batch_size, max_batches);
+}
+
+// Cheap existence probe: stops at the first feature intersecting bbox. Plugins
+// with a spatial index (shapefile .index, sqlite rtree, postgis) only visit
+// index candidates.
+bool has_features(std::shared_ptr<mapnik::datasource> const& ds, box2d<double> const& bbox)
+{
+    mapnik::query q(bbox);
+    py::gil_scoped_release release;
+    mapnik::featureset_ptr fs = ds->features(q);
+    if (!fs) return false;
+    bool raster = ds->type() == datasource::Raster;
+    for (mapnik::feature_ptr feature = fs->next(); feature; feature = fs->next())
+    {
+        // raster features carry no vector geometry
+        if (raster || feature->envelope().intersects(bbox)) return true;
+    }
+    return false;
+}
+
+struct field_stats
+{
+    std::size_t count = 0;
+    double min = std::numeric_limits<double>::max();
+    double max = std::numeric_limits<double>::lowest();
+    double sum = 0;
+    std::vector<double> values;
+    std::vector<std::size_t> histogram;
+    double lo = 0;
+    double hi = 0;
+    bool fixed_range = false;
+};
+
+void add_to_histogram(field_stats & st, double val)
+{
+    std::size_t bins = st.histogram.size();
+    if (val < st.lo || val > st.hi || bins == 0) return;
+    std::size_t bin = st.hi > st.lo ? static_cast<std::size_t>((val - st.lo) / (st.hi - st.lo) * bins) : 0;
+    // the upper edge belongs to the last bin
+    st.histogram[std::min(bin, bins - 1)] += 1;
+}
+
+py::dict aggregate(std::shared_ptr<mapnik::datasource> const& ds,
+                   py::object const& query,
+                   std::vector<std::string> const& fields,
+                   std::vector<std::string> const& stats,
+                   std::size_t bins,
+                   py::object const& range)
+{
+    static const std::vector<std::string> known = {"count", "extent", "min", "max", "sum", "mean", "histogram"};
+    auto wants = [&stats](char const* name) { return std::find(stats.begin(), stats.end(), name) != stats.end(); };
+    for (auto const& stat : stats)
+    {
+        if (std::find(known.begin(), known.end(), stat) == known.end())
+        {
+            throw std::runtime_error("aggregate: unknown statistic '" + stat + "'");
+        }
+    }
+    bool histogram = wants("histogram");
+    bool extent = wants("extent");
+    if (histogram && bins == 0)
+    {
+        throw std::runtime_error("aggregate: bins must be at least 1");
+    }
+    mapnik::query q = make_query(ds, query);
+    std::vector<field_stats> results(fields.size());
+    for (std::size_t i = 0; i < fields.size(); ++i)
+    {
+        q.add_property_name(fields[i]);
+        if (!histogram) continue;
+        results[i].histogram.assign(bins, 0);
+        py::object field_range = range;
+        if (py::isinstance<py::dict>(range))
+        {
+            py::dict ranges = py::reinterpret_borrow<py::dict>(range);
+            if (ranges.contains(fields[i])) field_range = ranges[py::str(fields[i])];
+            else field_range = py::none();
+        }
+        if (!field_range.is_none())
+        {
+            auto lo_hi = field_range.cast<std::pair<double, double>>();
+            results[i].lo = lo_hi.first;
+            results[i].hi = lo_hi.second;
+            results[i].fixed_range = true;
+        }
+    }
+
+    std::size_t n = 0;
+    box2d<double> bbox;
+    {
+        py::gil_scoped_release release;
+        mapnik::featureset_ptr fs = ds->features(q);
+        for (mapnik::feature_ptr feature = fs ? fs->next() : mapnik::feature_ptr(); feature; feature = fs->next())
+        {
+            ++n;
+            if (extent)
+            {
+                box2d<double> env = feature->envelope();
+                if (bbox.valid()) bbox.expand_to_include(env);
+                else if (env.valid()) bbox = env;
+            }
+            for (std::size_t i = 0; i < fields.size(); ++i)
+            {
+                if (!feature->has_key(fields[i])) continue;
+                mapnik::value const& val = feature->get(fields[i]);
+                if (!(val.is<mapnik::value_integer>() || val.is<mapnik::value_double>() || val.is<mapnik::value_bool>())) continue;
+                double d = val.to_double();
+                if (std::isnan(d)) continue;
+                field_stats & st = results[i];
+                ++st.count;
+                st.min = std::min(st.min, d);
+                st.max = std::max(st.max, d);
+                st.sum += d;
+                if (!histogram) continue;
+                // without a fixed range the edges are only known at the end
+                if (st.fixed_range) add_to_histogram(st, d);
+                else st.values.push_back(d);
+            }
+        }
+        for (auto & st : results)
+        {
+            if (!histogram || st.fixed_range || st.count == 0) continue;
+            st.lo = st.min;
+            st.hi = st.max;
+            for (double d : st.values) add_to_histogram(st, d);
+            std::vector<double>().swap(st.values);
+        }
+    }
+
+    py::dict result;
+    if (wants("count")) result["count"] = n;
+    if (extent) result["extent"] = bbox.valid() ? py::cast(bbox) : py::none();
+    py::dict field_results;
+    for (std::size_t i = 0; i < fields.size(); ++i)
+    {
+        field_stats const& st = results[i];
+        py::dict d;
+        if (wants("count")) d["count"] = st.count;
+        if (wants("min")) d["min"] = st.count > 0 ? py::object(py::float_(st.min)) : py::none();
+        if (wants("max")) d["max"] = st.count > 0 ? py::object(py::float_(st.max)) : py::none();
+        if (wants("sum")) d["sum"] = st.sum;
+        if (wants("mean")) d["mean"] = st.count > 0 ? py::object(py::float_(st.sum / st.count)) : py::none();
+        if (histogram)
+        {
+            py::list edges;
+            for (std::size_t b = 0; b <= bins; ++b) edges.append(st.lo + (st.hi - st.lo) * b / bins);
+            py::dict hist;
+            hist["edges"] = edges;
+            hist["counts"] = st.histogram;
+            d["histogram"] = hist;
+        }
+        field_results[py::str(fields[i])] = d;
+    }
+    result["fields"] = field_results;
+    return result;
+}
+
+void add_feature(memory_datasource & ds, mapnik::feature_ptr const& feature)
+{
+    ds.push(feature);
+    invalidate_id_index(ds);
+}
+
+// Features are built without the GIL once the property columns are converted,
+// then pushed with it held
+template <typename T>
+void read_column(py::array const& column, std::vector<mapnik::value> & values)
+{
+    auto converted = column.cast<py::array_t<T, py::array::c_style | py::array::forcecast>>();
+    auto view = converted.template unchecked<1>();
+    for (py::ssize_t i = 0; i < view.shape(0); ++i) values.emplace_back(view(i));
+}
+
+// NumPy bool, integer and float columns are read through the buffer protocol
+// as bool, int64 and float64, anything else is converted one value at a time
+std::vector<mapnik::value> column_values(py::handle column, std::string const& name)
+{
+    std::vector<mapnik::value> values;
+    if (py::isinstance<py::array>(column))
+    {
+        auto array = py::reinterpret_borrow<py::array>(column);
+        char kind = array.dtype().kind();
+        if (kind == 'b' || kind == 'i' || kind == 'u' || kind == 'f')
+        {
+            if (array.ndim() != 1)
+            {
+                throw std::runtime_error("add_geometries: property '" + name + "' must be one-dimensional");
+            }
+            values.reserve(static_cast<std::size_t>(array.size()));
+            if (kind == 'b') read_column<mapnik::value_bool>(array, values);
+            else if (kind == 'f') read_column<mapnik::value_double>(array, values);
+            else read_column<mapnik::value_integer>(array, values);
+            return values;
+        }
+    }
+    for (auto val : py::reinterpret_borrow<py::iterable>(column))
+    {
+        values.push_back(val.cast<mapnik::value>());
+    }
+    return values;
+}
+
+std::size_t add_geometries(memory_datasource & ds,
+                           python_mapnik::geometry_array const& geometries,
+                           boost::optional<py::dict> const& properties,
+                           mapnik::value_integer start_id)
+{
+    std::size_t count = geometries.geometries.size();
+    mapnik::context_ptr ctx = std::make_shared<mapnik::context_type>();
+    std::vector<std::pair<std::string, std::vector<mapnik::value>>> columns;
+    if (properties)
+    {
+        for (auto item : *properties)
+        {
+            std::string name = py::str(item.first);
+            std::vector<mapnik::value> values = column_values(item.second, name);
+            if (values.size() != count)
+            {
+                throw std::runtime_error("add_geometries: property '" + name + "' has " + std::to_string(values.size()) +
+                                         " values for " + std::to_string(count) + " geometries");
+            }
+            ctx->push(name);
+            columns.emplace_back(name, std::move(values));
+        }
+    }
+    std::vector<mapnik::feature_ptr> features;
+    features.reserve(count);
+    {
+        py::gil_scoped_release release;
+        for (std::size_t i = 0; i < count; ++i)
+        {
+            mapnik::feature_ptr feature(mapnik::feature_factory::create(ctx, start_id + static_cast<mapnik::value_integer>(i)));
+            feature->set_geometry_copy(geometries.geometries[i]);
+            for (auto const& column : columns) feature->put(column.first, column.second[i]);
+            features.push_back(std::move(feature));
+        }
+    }
+    // memory_datasource has no lock of its own, push with the GIL held like add_feature
+    for (auto & feature : features) ds.push(std::move(feature));
+    invalidate_id_index(ds);
+    return count;
+}
+
 } // namespace
 
 
@@ -155,21 +685,99 @@ void export_datasource(py::module& m)
         .def("parameters", &parameters_impl,
              "The configuration parameters of the data source. "
              "These vary depending on the type of data source.")
+        .def("materialize", &materialize,
+             "Read every feature once into an in-memory datasource, optionally\n"
+             "reprojecting geometries from source_srs to target_srs and keeping\n"
+             "only the given fields. With index=True bbox queries use an R-tree.\n"
+             "Assign target_srs to the Layer.srs when reprojecting.\n"
+             "\n"
+             "Usage:\n"
+             ">>> lyr.datasource = lyr.datasource.materialize(target_srs=m.srs, source_srs=lyr.srs)\n"
+             ">>> lyr.srs = m.srs\n",
+             py::arg("target_srs") = py::none(),
+             py::arg("fields") = py::none(),
+             py::arg("index") = true,
+             py::arg("source_srs") = std::string(mapnik::MAPNIK_GEOGRAPHIC_PROJ))
+        .def("features_by_ids", &features_by_ids,
+             "Return the features with the given ids, in the order requested.\n"
+             "Unknown ids are skipped. Materialized datasources and MemoryDatasource\n"
+             "answer from an id index and PythonDatasource providers may implement\n"
+             "the lookup, other datasources are scanned once per call.\n"
+             "\n"
+             "Usage:\n"
+             ">>> for feature in ds.features_by_ids([12, 42], fields=['name']):\n"
+             "...     print(feature['name'])\n",
+             py::arg("ids"),
+             py::arg("fields") = py::none())
+        .def("has_features", &has_features,
+             "Return True if any feature intersects bbox. Stops at the first hit.\n"
+             "\n"
+             "Usage:\n"
+             ">>> ds.has_features(Box2d(0, 0, 10, 10))\n",
+             py::arg("bbox"))
+        .def("count", &count,
+             "Count the features matching query, or all features when query is None,\n"
+             "without creating Python objects.\n"
+             "\n"
+             "Usage:\n"
+             ">>> ds.count(Query(Box2d(0, 0, 10, 10)))\n",
+             py::arg("query") = py::none())
+        .def("aggregate", &aggregate,
+             "Compute statistics over numeric fields in one native pass.\n"
+             "stats may contain 'count', 'extent', 'min', 'max', 'sum', 'mean'\n"
+             "and 'histogram'. Histograms have `bins` equal bins over `range`,\n"
+             "a (min, max) tuple or a dict of them per field, defaulting to the\n"
+             "data range. Non-numeric values are ignored.\n"
+             "\n"
+             "Usage:\n"
+             ">>> ds.aggregate(None, ['population'], bins=5)['fields']['population']['max']\n",
+             py::arg("query"),
+             py::arg("fields"),
+             py::arg("stats") = std::vector<std::string>{"count", "min", "max", "sum", "histogram"},
+             py::arg("bins") = 10,
+             py::arg("range") = py::none())
+        .def("write_geojson", &write_geojson,
+             "Write the features matching query, or all features when query is None,\n"
+             "to a binary file object as a GeoJSON FeatureCollection, or one feature\n"
+             "per line with ndjson=True. See Featureset.write_geojson.\n"
+             "\n"
+             "Usage:\n"
+             ">>> with open('out.ndjson', 'wb') as f:\n"
+             "...     ds.write_geojson(None, f, ndjson=True, fields=['name'])\n",
+             py::arg("query"),
+             py::arg("fileobj"),
+             py::arg("ndjson") = false,
+             py::arg("precision") = py::none(),
+             py::arg("fields") = py::none())
         .def(py::self == py::self)
+        .def("features_async", &features_async,
+             "Return an async iterator over the features matching query, or all\n"
+             "features when query is None. Features are read in batches of\n"
+             "batch_size on a background thread pool without the GIL, at most\n"
+             "max_batches batches ahead of the consumer.\n"
+             "\n"
+             "Usage:\n"
+             ">>> async for feature in ds.features_async(query, batch_size=500):\n"
+             "...     await send(feature.to_geojson())\n",
+             py::arg("query") = py::none(),
+             py::arg("batch_size") = 256,
+             py::arg("max_batches") = 2)
         .def("__iter__",
              [](datasource const& ds) {
-                 mapnik::query q(ds.envelope());
-                 layer_descriptor ld = ds.get_descriptor();
-                 std::vector<attribute_descriptor> const& desc_ar = ld.get_descriptors();
-                 for (auto const& desc : desc_ar)
-                 {
-                     q.add_property_name(desc.get_name());
-                 }
-                 return ds.features(q);
+                 return ds.features(all_attributes_query(ds));
              },
              py::keep_alive<0, 1>())
         ;
 
+    py::class_<python_mapnik::feature_stream, std::shared_ptr<python_mapnik::feature_stream>>(m, "FeatureStream")
+        .def("__aiter__", [](py::object self) { return self; })
+        .def("__anext__", &python_mapnik::feature_stream::anext)
+        .def("aclose", &python_mapnik::feature_stream::aclose,
+             "Stop reading features and release buffered ones.\n")
+        .def("close", &python_mapnik::feature_stream::close,
+             "Stop reading features and release buffered ones.\n")
+        ;
+
     m.def("CreateDatasource",&create_datasource);
 
     py::class_<memory_datasource, datasource, std::shared_ptr<memory_datasource>>
@@ -178,11 +786,25 @@ void export_datasource(py::module& m)
             mapnik::parameters p;
             p.insert(std::make_pair("type","memory"));
             return std::make_shared<memory_datasource>(p);}))
-        .def("add_feature", &memory_datasource::push,
+        .def("add_feature", &add_feature,
              "Adds a Feature:\n"
              ">>> ms = MemoryDatasource()\n"
              ">>> feature = Feature(Context(),1)\n"
              ">>> ms.add_feature(f)\n")
+        .def("add_geometries", &add_geometries,
+             "Adds one feature per geometry of a GeometryArray, with ids counting\n"
+             "up from start_id. properties maps field names to sequences of values,\n"
+             "one per geometry. NumPy bool, integer and float columns are read\n"
+             "directly as bool, int64 and float64 values. Returns the number of\n"
+             "features added.\n"
+             "\n"
+             "Usage:\n"
+             ">>> ms = MemoryDatasource()\n"
+             ">>> geoms = GeometryArray.from_wkb(wkbs)\n"
+             ">>> ms.add_geometries(geoms, {'name': names})\n",
+             py::arg("geometries"),
+             py::arg("properties") = py::none(),
+             py::arg("start_id") = 1)
         .def("num_features", &memory_datasource::size)
         ;
 
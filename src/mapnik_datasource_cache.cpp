@@ -30,6 +30,8 @@
 //pybind11
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+// stl
+#include <algorithm>
 
 namespace py = pybind11;
 
@@ -47,7 +49,56 @@ std::vector<std::string> plugin_directories()
 
 std::vector<std::string> plugin_names()
 {
-    return  mapnik::datasource_cache::instance().plugin_names();
+    std::vector<std::string> names = mapnik::datasource_cache::instance().plugin_names();
+    // plugins indexed with register_datasource_lazy are available too
+    for (auto const& name : lazy_plugins::instance().names())
+    {
+        if (std::find(names.begin(), names.end(), name) == names.end()) names.push_back(name);
+    }
+    return names;
+}
+
+std::vector<std::string> register_datasource_lazy(std::string const& path)
+{
+    return lazy_plugins::instance().add(path);
+}
+
+std::vector<std::string> pending_plugins()
+{
+    return lazy_plugins::instance().names();
+}
+
+void load_pending_plugins()
+{
+    py::gil_scoped_release release;
+    lazy_plugins::instance().ensure_all();
+}
+
+void enable_sharing(std::size_t max_entries)
+{
+    shared_datasource_cache::instance().enable(max_entries);
+}
+
+void disable_sharing()
+{
+    shared_datasource_cache::instance().disable();
+}
+
+bool invalidate(py::kwargs const& kwargs)
+{
+    mapnik::parameters params = kwargs_to_params(kwargs);
+    params.erase("share_instance");
+    return shared_datasource_cache::instance().invalidate(params);
+}
+
+void clear_shared()
+{
+    shared_datasource_cache::instance().clear();
+}
+
+py::dict shared_stats()
+{
+    return shared_datasource_cache::instance().stats();
 }
 
 } // namespace
@@ -60,5 +111,27 @@ void export_datasource_cache(py::module const& m)
         .def_static("register_datasources",&register_datasources)
         .def_static("plugin_names",&plugin_names)
         .def_static("plugin_directories",&plugin_directories)
+        .def_static("register_datasource_lazy", &register_datasource_lazy,
+                    "Index an input plugin file without loading it. The plugin is loaded\n"
+                    "by the first datasource of one of its types. Returns the type names\n"
+                    "taken from the file name, 'gdal+ogr.input' provides 'gdal' and 'ogr'.\n",
+                    py::arg("path"))
+        .def_static("pending_plugins", &pending_plugins,
+                    "Return the names of indexed plugins that are not loaded yet.\n")
+        .def_static("load_pending_plugins", &load_pending_plugins,
+                    "Load all indexed plugins that are not loaded yet.\n")
+        .def_static("enable_sharing", &enable_sharing,
+                    "Share one datasource instance between identical parameter sets.\n"
+                    "At most max_entries instances are kept, least recently used first out.\n",
+                    py::arg("max_entries") = 64)
+        .def_static("disable_sharing", &disable_sharing,
+                    "Stop sharing datasources and release all cached instances.\n")
+        .def_static("invalidate", &invalidate,
+                    "Drop the shared datasource matching the given parameters.\n"
+                    "Returns True if an entry was removed.\n")
+        .def_static("clear_shared", &clear_shared,
+                    "Release all shared datasource instances.\n")
+        .def_static("shared_stats", &shared_stats,
+                    "Return a dict with entries, hits, misses and evictions of the shared datasource cache.\n")
         ;
 }
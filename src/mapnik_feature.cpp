@@ -33,8 +33,12 @@
 #include <mapnik/util/feature_to_geojson.hpp>
 
 #include "mapnik_value_converter.hpp"
+#include "geo_interface.hpp"
+#include "feature_codec.hpp"
 // stl
 #include <stdexcept>
+#include <string>
+#include <vector>
 //pybind11
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
@@ -94,13 +98,60 @@ py::dict attributes(mapnik::feature_impl const& feature)
     return attributes;
 }
 
+py::bytes dumps_features(py::iterable const& features)
+{
+    std::vector<mapnik::feature_ptr> batch;
+    for (auto const& item : features)
+    {
+        batch.push_back(item.cast<mapnik::feature_ptr>());
+    }
+    // contexts and attributes can be changed from other threads, so the
+    // features are encoded with the GIL held
+    return py::bytes(python_mapnik::feature_codec::encode(batch));
+}
+
+py::list loads_features(py::buffer const& data, context_ptr const& ctx)
+{
+    py::buffer_info info = data.request();
+    std::vector<mapnik::feature_ptr> batch;
+    {
+        py::gil_scoped_release release;
+        batch = python_mapnik::feature_codec::decode(static_cast<char const*>(info.ptr),
+                                                     static_cast<std::size_t>(info.size * info.itemsize));
+    }
+    // ctx may be used by other threads, it is only changed with the GIL held
+    if (ctx) python_mapnik::feature_codec::rebind(batch, ctx);
+    py::list result(batch.size());
+    for (std::size_t i = 0; i < batch.size(); ++i)
+    {
+        result[i] = py::cast(std::move(batch[i]));
+    }
+    return result;
+}
+
 } // end anonymous namespace
 
-void export_feature(py::module const& m)
+void export_feature(py::module& m) // non-const because of m.def(..)
 {
     py::class_<context_type, context_ptr>(m, "Context")
         .def(py::init<>(), "Default constructor")
         .def("push", &context_type::push)
+        .def(py::pickle(
+                 [](context_type const& ctx) {
+                     std::vector<std::string> names(ctx.size());
+                     for (auto const& kv : ctx)
+                     {
+                         if (kv.second < names.size()) names[kv.second] = kv.first;
+                     }
+                     return py::make_tuple(names);
+                 },
+                 [](py::tuple t) {
+                     if (t.size() != 1)
+                         throw std::runtime_error("Invalid state");
+                     context_ptr ctx = std::make_shared<context_type>();
+                     for (auto const& name : t[0].cast<std::vector<std::string>>()) ctx->push(name);
+                     return ctx;
+                 }))
         ;
 
     py::class_<mapnik::feature_impl, std::shared_ptr<mapnik::feature_impl>>(m, "Feature")
@@ -122,11 +173,47 @@ void export_feature(py::module const& m)
         .def("context", &mapnik::feature_impl::context)
         .def("to_json", &feature_to_geojson)
         .def("to_geojson", &feature_to_geojson)
-        .def_property_readonly("__geo_interface__",
-                               [] (mapnik::feature_impl const& f) {
-                                   py::object json = py::module_::import("json");
-                                   py::object loads = json.attr("loads");
-                                   return loads(feature_to_geojson(f));})
+        .def_property_readonly("__geo_interface__", &python_mapnik::feature_to_geo_interface)
         .def_static("from_geojson", from_geojson_impl)
+        .def_static("from_geo_interface", &python_mapnik::feature_from_geo_interface,
+                    "Constructs a Feature from a GeoJSON-like mapping, or an object with a\n"
+                    "__geo_interface__, without going through JSON text. Its id is used\n"
+                    "when it is an integer, 1 otherwise.\n"
+                    "\n"
+                    "Usage:\n"
+                    ">>> f = Feature.from_geo_interface({'type': 'Feature', 'id': 3,\n"
+                    "...     'geometry': {'type': 'Point', 'coordinates': (1, 2)},\n"
+                    "...     'properties': {'name': 'a'}})\n",
+                    py::arg("obj"), py::arg("ctx") = py::none())
+        .def(py::pickle(
+                 [](mapnik::feature_ptr const& feature) {
+                     return py::make_tuple(py::bytes(python_mapnik::feature_codec::encode({feature})));
+                 },
+                 [](py::tuple t) {
+                     if (t.size() != 1)
+                         throw std::runtime_error("Invalid state");
+                     std::string data = t[0].cast<std::string>();
+                     auto features = python_mapnik::feature_codec::decode(data.data(), data.size());
+                     if (features.size() != 1)
+                         throw std::runtime_error("Invalid state");
+                     return features.front();
+                 }))
         ;
+
+    m.def("dumps_features", &dumps_features,
+          "Encodes an iterable of features (a list, a Featureset, ...) into compact\n"
+          "bytes: geometries as WKB and attributes with their native types. Features\n"
+          "sharing a Context keep sharing one after loads_features.\n"
+          "\n"
+          "Usage:\n"
+          ">>> data = mapnik.dumps_features(ds.features(query))\n",
+          py::arg("features"));
+
+    m.def("loads_features", &loads_features,
+          "Decodes bytes from dumps_features into a list of features. When ctx is\n"
+          "given every feature is created on it instead of on the decoded contexts.\n"
+          "\n"
+          "Usage:\n"
+          ">>> features = mapnik.loads_features(data)\n",
+          py::arg("data"), py::arg("ctx") = py::none());
 }
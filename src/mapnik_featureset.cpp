@@ -24,6 +24,8 @@
 #include <mapnik/config.hpp>
 #include <mapnik/feature.hpp>
 #include <mapnik/datasource.hpp>
+#include "geojson_writer.hpp"
+#include "python_optional.hpp"
 
 //pybind11
 #include <pybind11/pybind11.h>
@@ -41,6 +43,15 @@ inline mapnik::feature_ptr next(mapnik::featureset_ptr const& itr)
     return f;
 }
 
+std::size_t write_geojson(mapnik::featureset_ptr const& fs,
+                          py::object const& fileobj,
+                          bool ndjson,
+                          boost::optional<int> const& precision,
+                          boost::optional<std::vector<std::string>> const& fields)
+{
+    return python_mapnik::geojson_writer(fileobj, ndjson, precision, fields).write(fs);
+}
+
 }
 
 void export_featureset(py::module const& m)
@@ -50,5 +61,19 @@ void export_featureset(py::module const& m)
         (m, "Featureset")
         .def("__iter__", [](mapnik::Featureset& itr) -> mapnik::Featureset& { return itr; })
         .def("__next__", next)
+        .def("write_geojson", &write_geojson,
+             "Write the remaining features to a binary file object as a GeoJSON\n"
+             "FeatureCollection, or one feature per line with ndjson=True.\n"
+             "Features are serialized natively and written in large chunks.\n"
+             "precision limits the number of coordinate decimals, fields the\n"
+             "properties written. Returns the number of features written.\n"
+             "\n"
+             "Usage:\n"
+             ">>> with open('out.geojson', 'wb') as f:\n"
+             "...     ds.features(query).write_geojson(f, precision=6)\n",
+             py::arg("fileobj"),
+             py::arg("ndjson") = false,
+             py::arg("precision") = py::none(),
+             py::arg("fields") = py::none())
         ;
 }
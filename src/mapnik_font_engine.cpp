@@ -23,19 +23,93 @@
 //mapnik
 #include <mapnik/config.hpp>
 #include <mapnik/font_engine_freetype.hpp>
+// stl
+#include <mutex>
+#include <string>
+#include <utility>
+#include <vector>
 //pybind11
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 
 namespace py = pybind11;
 
-void export_font_engine(py::module const& m)
+namespace {
+
+using mapnik::freetype_engine;
+using font_file_mapping = freetype_engine::font_file_mapping_type;
+
+#ifdef MAPNIK_THREADSAFE
+// freetype_engine guards its mapping with the mutex of its singleton base,
+// which is only reachable from a derived class
+struct font_engine_lock : mapnik::singleton<freetype_engine, mapnik::CreateUsingNew>
+{
+    static std::mutex & mutex() { return mutex_; }
+};
+#endif
+
+// Opens file with a private FreeType library and returns its (face name, face index)
+// pairs without registering anything.
+std::vector<std::pair<std::string, int>> scan_font(std::string const& file_name)
 {
-    using mapnik::freetype_engine;
+    std::vector<std::pair<std::string, int>> faces;
+    py::gil_scoped_release release;
+    mapnik::font_library library;
+    font_file_mapping mapping;
+    freetype_engine::register_font_impl(file_name, library, mapping);
+    for (auto const& kv : mapping)
+    {
+        faces.emplace_back(kv.first, kv.second.first);
+    }
+    return faces;
+}
 
+// Registers a face whose name and index are already known, so FreeType only
+// opens the file once the face is first used for rendering.
+bool register_face(std::string const& face_name, std::string const& file_name, int index)
+{
+    // freetype_engine exposes its mapping read-only, register_font would reopen
+    // the file to learn what we already know. The mapping is fetched before
+    // locking since creating the engine takes the same mutex. Like
+    // register_font, the first registration of a face name wins.
+    auto & mapping = const_cast<font_file_mapping &>(freetype_engine::get_mapping());
+#ifdef MAPNIK_THREADSAFE
+    std::lock_guard<std::mutex> lock(font_engine_lock::mutex());
+#endif
+    return mapping.emplace(face_name, std::make_pair(index, file_name)).second;
+}
+
+bool unregister_face(std::string const& face_name)
+{
+    auto & mapping = const_cast<font_file_mapping &>(freetype_engine::get_mapping());
+#ifdef MAPNIK_THREADSAFE
+    std::lock_guard<std::mutex> lock(font_engine_lock::mutex());
+#endif
+    return mapping.erase(face_name) > 0;
+}
+
+} // namespace
+
+void export_font_engine(py::module const& m)
+{
     py::class_<freetype_engine>(m, "FontEngine")
         .def_static("register_font", &freetype_engine::register_font)
         .def_static("register_fonts", &freetype_engine::register_fonts)
         .def_static("face_names", &freetype_engine::face_names)
+        .def_static("scan_font", &scan_font,
+                    "Return the (face name, face index) pairs of a font file\n"
+                    "without registering them.\n",
+                    py::arg("file_name"))
+        .def_static("register_face", &register_face,
+                    "Register face_name as face `index` of file_name without opening\n"
+                    "the file. Returns False if the face name is already registered.\n"
+                    "Like register_font, call it before rendering starts.\n",
+                    py::arg("face_name"),
+                    py::arg("file_name"),
+                    py::arg("index") = 0)
+        .def_static("unregister_face", &unregister_face,
+                    "Forget a registered face name. Returns False if it was not registered.\n"
+                    "Call it while nothing is rendering.\n",
+                    py::arg("face_name"))
         ;
 }
@@ -39,14 +39,23 @@
 #include <mapnik/util/geometry_to_wkt.hpp> // to_wkt
 #include <mapnik/wkb.hpp>
 #include "python_variant.hpp"
+#include "geometry_array.hpp"
+#include "geo_interface.hpp"
+#include "geometry_generalize.hpp"
 
 // stl
+#include <cstdint>
+#include <cstring>
 #include <stdexcept>
+#include <type_traits>
+#include <unordered_map>
+#include <vector>
 
 //pybind11
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/native_enum.h>
+#include <pybind11/numpy.h>
 
 namespace py = pybind11;
 
@@ -59,6 +68,10 @@ std::shared_ptr<mapnik::geometry::geometry<double> > from_wkb_impl(std::string c
     {
         *geom = mapnik::geometry_utils::from_wkb(wkb.c_str(), wkb.size());
     }
+    catch (std::exception const& ex)
+    {
+        throw std::runtime_error(std::string("Failed to parse WKB: ") + ex.what());
+    }
     catch (...)
     {
         throw std::runtime_error("Failed to parse WKB");
@@ -148,18 +161,232 @@ void geometry_correct_impl(mapnik::geometry::geometry<double> & geom)
     mapnik::geometry::correct(geom);
 }
 
+std::shared_ptr<mapnik::geometry::geometry<double>> geometry_clip_impl(mapnik::geometry::geometry<double> const& geom,
+                                                                       mapnik::box2d<double> const& box)
+{
+    py::gil_scoped_release release;
+    return std::make_shared<mapnik::geometry::geometry<double>>(python_mapnik::clip_visitor(box)(geom));
+}
+
+std::shared_ptr<mapnik::geometry::geometry<double>> geometry_simplify_impl(mapnik::geometry::geometry<double> const& geom,
+                                                                           double tolerance,
+                                                                           std::string const& algorithm)
+{
+    python_mapnik::simplify_visitor simplify(python_mapnik::simplify_algorithm(algorithm), tolerance);
+    py::gil_scoped_release release;
+    return std::make_shared<mapnik::geometry::geometry<double>>(simplify(geom));
+}
+
+// Number of live coords views of every geometry that has any, only touched with
+// the GIL held. Views point into the point storage, so it must not be resized
+// while they exist.
+std::unordered_map<void const*, std::size_t> & coords_exports()
+{
+    static std::unordered_map<void const*, std::size_t> exports;
+    return exports;
+}
+
+void check_resizable(void const* geom)
+{
+    auto const& exports = coords_exports();
+    if (!exports.empty() && exports.count(geom))
+    {
+        throw py::buffer_error("Existing coords views: the geometry cannot be resized");
+    }
+}
+
 template <typename T>
 void add_coord(T & geom, double x, double y)
 {
+    check_resizable(&geom);
     geom.emplace_back(x, y);
 }
 
 template <typename Dst, typename Src>
 void add_impl(Dst & geom, Src const& src)
 {
+    check_resizable(&geom);
     geom.push_back(src); // copy
 }
 
+template <typename T>
+T from_array_impl(python_mapnik::coord_array const& coords)
+{
+    std::size_t count = python_mapnik::num_coords(coords);
+    T geom;
+    py::gil_scoped_release release;
+    python_mapnik::fill_points(geom, coords.data(), count);
+    return geom;
+}
+
+template <typename T>
+T from_arrays_impl(python_mapnik::coord_array const& coords, python_mapnik::offset_array const& offsets)
+{
+    std::size_t count = python_mapnik::check_offsets(offsets, python_mapnik::num_coords(coords), "offsets");
+    T geom;
+    py::gil_scoped_release release;
+    python_mapnik::fill_parts(geom, coords.data(), offsets.data(), 0, count);
+    return geom;
+}
+
+mapnik::geometry::multi_polygon<double> multi_polygon_from_arrays_impl(python_mapnik::coord_array const& coords,
+                                                                       python_mapnik::offset_array const& ring_offsets,
+                                                                       python_mapnik::offset_array const& polygon_offsets)
+{
+    std::size_t rings = python_mapnik::check_offsets(ring_offsets, python_mapnik::num_coords(coords), "ring_offsets");
+    std::size_t count = python_mapnik::check_offsets(polygon_offsets, rings, "polygon_offsets");
+    mapnik::geometry::multi_polygon<double> geom;
+    py::gil_scoped_release release;
+    std::int64_t const* polygons = polygon_offsets.data();
+    geom.reserve(count);
+    for (std::size_t i = 0; i < count; ++i)
+    {
+        geom.emplace_back();
+        python_mapnik::fill_parts(geom.back(), coords.data(), ring_offsets.data(),
+                   static_cast<std::size_t>(polygons[i]), static_cast<std::size_t>(polygons[i + 1]));
+    }
+    return geom;
+}
+
+// Keeps the geometry of a coords view alive and counted until the view is gone
+struct coords_export
+{
+    PyObject* owner;
+    void const* geom;
+};
+
+void release_coords_export(void* ptr)
+{
+    auto* e = static_cast<coords_export*>(ptr);
+    auto & exports = coords_exports();
+    auto itr = exports.find(e->geom);
+    if (itr != exports.end() && --itr->second == 0) exports.erase(itr);
+    Py_DECREF(e->owner);
+    delete e;
+}
+
+// Read-only (n, 2) view of the points of `self`, which it keeps alive. Adding
+// points raises BufferError while views exist.
+template <typename T>
+py::array coords_view(py::object const& self)
+{
+    T const& geom = self.cast<T const&>();
+    using point_type = typename T::value_type;
+    static_assert(sizeof(point_type) == 2 * sizeof(double), "points are expected to be two packed doubles");
+    py::capsule base(new coords_export{self.inc_ref().ptr(), &geom}, &release_coords_export);
+    ++coords_exports()[&geom];
+    py::array_t<double> view({static_cast<py::ssize_t>(geom.size()), py::ssize_t(2)},
+                             {static_cast<py::ssize_t>(sizeof(point_type)), static_cast<py::ssize_t>(sizeof(double))},
+                             reinterpret_cast<double const*>(geom.data()), base);
+    view.attr("setflags")(py::arg("write") = false);
+    return view;
+}
+
+// numpy.asarray support, a counted view unless a copy or another dtype is asked for
+template <typename T>
+py::object coords_array(py::object const& self, py::object const& dtype, py::object const& copy)
+{
+    py::object view = coords_view<T>(self);
+    if (!dtype.is_none()) return view.attr("astype")(dtype);
+    if (!copy.is_none() && copy.cast<bool>()) return view.attr("copy")();
+    return view;
+}
+
+// Flattens a geometry into coordinates, ring offsets (vertex ranges of every ring,
+// line or point) and part offsets (ring ranges of every point, line or polygon),
+// the layout MultiPolygon.from_arrays reads back
+struct ragged_arrays
+{
+    std::vector<double> coords;
+    std::vector<std::int64_t> ring_offsets{0};
+    std::vector<std::int64_t> part_offsets{0};
+
+    template <typename Points>
+    void add_ring(Points const& points)
+    {
+        coords.reserve(coords.size() + 2 * points.size());
+        for (auto const& pt : points)
+        {
+            coords.push_back(pt.x);
+            coords.push_back(pt.y);
+        }
+        ring_offsets.push_back(static_cast<std::int64_t>(coords.size() / 2));
+    }
+
+    void end_part()
+    {
+        part_offsets.push_back(static_cast<std::int64_t>(ring_offsets.size() - 1));
+    }
+
+    void operator()(mapnik::geometry::geometry_empty const&) {}
+
+    void operator()(mapnik::geometry::point<double> const& pt)
+    {
+        coords.push_back(pt.x);
+        coords.push_back(pt.y);
+        ring_offsets.push_back(static_cast<std::int64_t>(coords.size() / 2));
+        end_part();
+    }
+
+    void operator()(mapnik::geometry::line_string<double> const& line)
+    {
+        add_ring(line);
+        end_part();
+    }
+
+    void operator()(mapnik::geometry::polygon<double> const& poly)
+    {
+        for (auto const& ring : poly) add_ring(ring);
+        end_part();
+    }
+
+    void operator()(mapnik::geometry::multi_point<double> const& points)
+    {
+        for (auto const& pt : points) (*this)(pt);
+    }
+
+    void operator()(mapnik::geometry::multi_line_string<double> const& lines)
+    {
+        for (auto const& line : lines) (*this)(line);
+    }
+
+    void operator()(mapnik::geometry::multi_polygon<double> const& polys)
+    {
+        for (auto const& poly : polys) (*this)(poly);
+    }
+
+    void operator()(mapnik::geometry::geometry_collection<double> const& collection)
+    {
+        for (auto const& geom : collection) (*this)(geom);
+    }
+
+    void operator()(mapnik::geometry::geometry<double> const& geom)
+    {
+        mapnik::util::apply_visitor(*this, geom);
+    }
+};
+
+template <typename T>
+py::array_t<T> to_array(std::vector<T> const& values, std::vector<py::ssize_t> const& shape)
+{
+    py::array_t<T> result(shape);
+    if (!values.empty()) std::memcpy(result.mutable_data(), values.data(), values.size() * sizeof(T));
+    return result;
+}
+
+template <typename GeometryType>
+py::tuple to_ragged_arrays_impl(GeometryType const& geom)
+{
+    ragged_arrays arrays;
+    {
+        py::gil_scoped_release release;
+        arrays(geom);
+    }
+    return py::make_tuple(to_array(arrays.coords, {static_cast<py::ssize_t>(arrays.coords.size() / 2), 2}),
+                          to_array(arrays.part_offsets, {static_cast<py::ssize_t>(arrays.part_offsets.size())}),
+                          to_array(arrays.ring_offsets, {static_cast<py::ssize_t>(arrays.ring_offsets.size())}));
+}
+
 mapnik::geometry::point<double> geometry_centroid_impl(mapnik::geometry::geometry<double> const& geom)
 {
     mapnik::geometry::point<double> pt;
@@ -211,6 +438,7 @@ void export_geometry(py::module const& m)
         .def("to_geojson",&to_geojson_impl<point<double>>)
         .def("to_wkb",&to_wkb_impl<point<double>>)
         .def("to_wkt",&to_wkt_impl<point<double>>)
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<point<double>>)
         .def("envelope",&geometry_envelope_impl<point<double>>)
         ;
 
@@ -219,13 +447,24 @@ void export_geometry(py::module const& m)
              "Constructs a new MultiPoint object\n")
         .def("add_point", &add_coord<multi_point<double>>, "Adds coord x,y")
         .def("add_point", &add_impl<multi_point<double>, point<double>>, "Adds mapnik.Point")
+        .def_static("from_array", &from_array_impl<multi_point<double>>,
+                    "Constructs a MultiPoint from an (N, 2) float64 array or a flat\n"
+                    "array of x,y pairs, copying all coordinates at once",
+                    py::arg("coords"))
         .def("is_valid", &geometry_is_valid_impl<multi_point<double>>)
         .def("is_simple", &geometry_is_simple_impl<multi_point<double>>)
         .def("to_geojson",&to_geojson_impl<multi_point<double>>)
         .def("to_wkb",&to_wkb_impl<multi_point<double>>)
         .def("to_wkt",&to_wkt_impl<multi_point<double>>)
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<multi_point<double>>)
         .def("envelope",&geometry_envelope_impl<multi_point<double>>)
         .def("num_points",[](multi_point<double> const& mp) { return mp.size(); },"Number of points in MultiPoint")
+        .def_property_readonly("coords", &coords_view<multi_point<double>>,
+                               "Read-only (N, 2) float64 view of the coordinates, without copying.\n"
+                               "It keeps the geometry alive; adding points raises BufferError\n"
+                               "while views exist.\n")
+        .def("__array__", &coords_array<multi_point<double>>,
+             py::arg("dtype") = py::none(), py::arg("copy") = py::none())
         .def("__len__", [](multi_point<double>const &mp) { return mp.size(); })
         .def("__iter__", [](multi_point<double> const& mp) {
             return py::make_iterator(mp.begin(), mp.end());
@@ -236,13 +475,30 @@ void export_geometry(py::module const& m)
         .def(py::init<>(), "Constructs a new LineString object\n")
         .def("add_point", &add_coord<line_string<double>>, "Adds coord x,y")
         .def("add_point", &add_impl<line_string<double>, point<double>>, "Adds mapnik.Point")
+        .def_static("from_array", &from_array_impl<line_string<double>>,
+                    "Constructs a LineString from an (N, 2) float64 array or a flat\n"
+                    "array of x,y pairs, copying all coordinates at once\n"
+                    "\n"
+                    "Usage:\n"
+                    ">>> import numpy as np\n"
+                    ">>> line = LineString.from_array(np.array([[0, 0], [1, 1], [2, 0]], dtype='f8'))\n"
+                    ">>> line.num_points()\n"
+                    "3\n",
+                    py::arg("coords"))
         .def("is_valid", &geometry_is_valid_impl<line_string<double>>)
         .def("is_simple", &geometry_is_simple_impl<line_string<double>>)
         .def("to_geojson",&to_geojson_impl<line_string<double>>)
         .def("to_wkb",&to_wkb_impl<line_string<double>>)
         .def("to_wkt",&to_wkt_impl<line_string<double>>)
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<line_string<double>>)
         .def("envelope",&geometry_envelope_impl<line_string<double>>)
         .def("num_points",[](line_string<double> const& l) { return l.size(); },"Number of points in LineString")
+        .def_property_readonly("coords", &coords_view<line_string<double>>,
+                               "Read-only (N, 2) float64 view of the coordinates, without copying.\n"
+                               "It keeps the geometry alive; adding points raises BufferError\n"
+                               "while views exist.\n")
+        .def("__array__", &coords_array<line_string<double>>,
+             py::arg("dtype") = py::none(), py::arg("copy") = py::none())
         .def("__len__", [](line_string<double>const &l) { return l.size(); })
         .def("__iter__", [](line_string<double> const& l) {
             return py::make_iterator(l.begin(), l.end());
@@ -253,7 +509,17 @@ void export_geometry(py::module const& m)
         .def(py::init<>(),  "Constructs a new LinearRtring object\n")
         .def("add_point", &add_coord<linear_ring<double>>, "Adds coord x,y")
         .def("add_point", &add_impl<linear_ring<double>, point<double>>, "Adds mapnik.Point")
+        .def_static("from_array", &from_array_impl<linear_ring<double>>,
+                    "Constructs a LinearRing from an (N, 2) float64 array or a flat\n"
+                    "array of x,y pairs, copying all coordinates at once",
+                    py::arg("coords"))
         .def("envelope",&geometry_envelope_impl<linear_ring<double>>)
+        .def_property_readonly("coords", &coords_view<linear_ring<double>>,
+                               "Read-only (N, 2) float64 view of the coordinates, without copying.\n"
+                               "It keeps the geometry alive; adding points raises BufferError\n"
+                               "while views exist.\n")
+        .def("__array__", &coords_array<linear_ring<double>>,
+             py::arg("dtype") = py::none(), py::arg("copy") = py::none())
         .def("__len__", [](linear_ring<double>const &r) { return r.size(); })
         .def("__iter__", [](linear_ring<double> const& r) {
             return py::make_iterator(r.begin(), r.end());
@@ -263,11 +529,23 @@ void export_geometry(py::module const& m)
     py::class_<polygon<double> >(m, "Polygon")
         .def(py::init<>(), "Constructs a new Polygon object\n")
         .def("add_ring", &add_impl<polygon<double>, linear_ring<double>>, "Add ring")
+        .def_static("from_arrays", &from_arrays_impl<polygon<double>>,
+                    "Constructs a Polygon from the coordinates of all its rings, an\n"
+                    "(N, 2) float64 array, and ring_offsets: ring i holds the points\n"
+                    "ring_offsets[i] to ring_offsets[i + 1], the first ring is the exterior\n"
+                    "\n"
+                    "Usage:\n"
+                    ">>> import numpy as np\n"
+                    ">>> coords = np.array([[0, 0], [4, 0], [4, 4], [0, 0], [1, 1], [2, 1], [1, 2], [1, 1]], dtype='f8')\n"
+                    ">>> Polygon.from_arrays(coords, [0, 4, 8]).num_rings()\n"
+                    "2\n",
+                    py::arg("coords"), py::arg("ring_offsets"))
         .def("is_valid", &geometry_is_valid_impl<polygon<double>>)
         .def("is_simple", &geometry_is_simple_impl<polygon<double>>)
         .def("to_geojson",&to_geojson_impl<polygon<double>>)
         .def("to_wkb",&to_wkb_impl<polygon<double>>)
         .def("to_wkt",&to_wkt_impl<polygon<double>>)
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<polygon<double>>)
         .def("envelope",&geometry_envelope_impl<polygon<double>>)
         .def("num_rings", [](polygon<double>const &p) { return p.size(); }, "Number of rings")
         .def("__len__", [](polygon<double>const &p) { return p.size(); })
@@ -279,11 +557,17 @@ void export_geometry(py::module const& m)
     py::class_<multi_line_string<double> >(m, "MultiLineString")
         .def(py::init<>(), "Constructs a new MultiLineString object\n")
         .def("add_string", &add_impl<multi_line_string<double>, line_string<double>>, "Add LineString")
+        .def_static("from_arrays", &from_arrays_impl<multi_line_string<double>>,
+                    "Constructs a MultiLineString from the coordinates of all its lines,\n"
+                    "an (N, 2) float64 array, and offsets: line i holds the points\n"
+                    "offsets[i] to offsets[i + 1]",
+                    py::arg("coords"), py::arg("offsets"))
         .def("is_valid", &geometry_is_valid_impl<multi_line_string<double>>)
         .def("is_simple", &geometry_is_simple_impl<multi_line_string<double>>)
         .def("to_geojson",&to_geojson_impl<multi_line_string<double>>)
         .def("to_wkb",&to_wkb_impl<multi_line_string<double>>)
         .def("to_wkt",&to_wkt_impl<multi_line_string<double>>)
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<multi_line_string<double>>)
         .def("envelope",&geometry_envelope_impl<multi_line_string<double>>)
         .def("__len__", [](multi_line_string<double>const& mls) { return mls.size(); })
         .def("__iter__", [](multi_line_string<double> const& mls) {
@@ -294,11 +578,18 @@ void export_geometry(py::module const& m)
     py::class_<multi_polygon<double> >(m, "MultiPolygon")
         .def(py::init<>(), "Constructs a new MultiPolygon object\n")
         .def("add_polygon", &add_impl<multi_polygon<double>, polygon<double>>, "Add Polygon")
+        .def_static("from_arrays", &multi_polygon_from_arrays_impl,
+                    "Constructs a MultiPolygon from the coordinates of all its rings, an\n"
+                    "(N, 2) float64 array, ring_offsets into the points and polygon_offsets\n"
+                    "into the rings: polygon i holds the rings polygon_offsets[i] to\n"
+                    "polygon_offsets[i + 1]",
+                    py::arg("coords"), py::arg("ring_offsets"), py::arg("polygon_offsets"))
         .def("is_valid", &geometry_is_valid_impl<multi_polygon<double>>)
         .def("is_simple", &geometry_is_simple_impl<multi_polygon<double>>)
         .def("to_geojson",&to_geojson_impl<multi_polygon<double>>)
         .def("to_wkb",&to_wkb_impl<multi_polygon<double>>)
         .def("to_wkt",&to_wkt_impl<multi_polygon<double>>)
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<multi_polygon<double>>)
         .def("envelope",&geometry_envelope_impl<multi_polygon<double>>)
         .def("__len__", [](multi_polygon<double>const& mp) { return mp.size(); })
         .def("__iter__", [](multi_polygon<double> const& mp) {
@@ -314,6 +605,7 @@ void export_geometry(py::module const& m)
         .def("to_geojson",&to_geojson_impl<geometry_collection<double>>)
         .def("to_wkb",&to_wkb_impl<geometry_collection<double>>)
         .def("to_wkt",&to_wkt_impl<geometry_collection<double>>)
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<geometry_collection<double>>)
         .def("envelope",&geometry_envelope_impl<geometry_collection<double>>)
         .def("__len__", [](geometry_collection<double>const& gc) { return gc.size(); })
         .def("__iter__", [](geometry_collection<double> const& gc) {
@@ -339,15 +631,57 @@ void export_geometry(py::module const& m)
         .def("is_simple", &geometry_is_simple_impl<geometry<double>>)
         .def("is_empty", &geometry_is_empty_impl<geometry<double>>)
         .def("correct", &geometry_correct_impl)
+        .def("clip", &geometry_clip_impl,
+             "Returns the part of the geometry inside box. Lines are cut at the box\n"
+             "edges and polygons intersected with it, an empty geometry is returned\n"
+             "when nothing is left.\n"
+             "\n"
+             "Usage:\n"
+             ">>> geom.clip(Box2d(0, 0, 10, 10))\n",
+             py::arg("box"))
+        .def("simplify", &geometry_simplify_impl,
+             "Returns a simplified copy of the geometry, using the same code as the\n"
+             "simplify symbolizer property. algorithm is one of 'radial-distance',\n"
+             "'douglas-peucker', 'visvalingam-whyatt' or 'zhao-saalfeld'. Lines and\n"
+             "rings simplified away are dropped.\n"
+             "\n"
+             "Usage:\n"
+             ">>> geom.simplify(0.5, algorithm='visvalingam-whyatt')\n",
+             py::arg("tolerance"), py::arg("algorithm") = "douglas-peucker")
         .def("centroid",&geometry_centroid_impl)
         .def("to_wkb",&to_wkb_impl<geometry<double>>)
         .def("to_wkt",&to_wkt_impl<geometry<double>>)
+        .def(py::pickle(
+                 [](geometry<double> const& geom) {
+                     // an empty geometry has no WKB and is stored as empty bytes
+                     mapnik::util::wkb_buffer_ptr wkb = mapnik::util::to_wkb(geom, mapnik::wkbNDR);
+                     return py::make_tuple(wkb ? py::bytes(wkb->buffer(), wkb->size()) : py::bytes());
+                 },
+                 [](py::tuple t) {
+                     if (t.size() != 1)
+                         throw std::runtime_error("Invalid state");
+                     std::string wkb = t[0].cast<std::string>();
+                     if (wkb.empty()) return std::make_shared<geometry<double>>();
+                     return from_wkb_impl(wkb);
+                 }))
+        .def("to_ragged_arrays", &to_ragged_arrays_impl<geometry<double>>,
+             "Returns (coords, part_offsets, ring_offsets) NumPy arrays: the (N, 2)\n"
+             "float64 coordinates, the range of rings of every part (point, line or\n"
+             "polygon) and the range of coordinates of every ring (or line or point).\n"
+             "MultiPolygon.from_arrays(coords, ring_offsets, part_offsets) reads them back\n")
         .def("to_json",&to_geojson_impl<geometry<double>>)
         .def("to_geojson",&to_geojson_impl<geometry<double>>)
-        .def_property_readonly("__geo_interface__", [](geometry<double> const& g) {
-            py::object json = py::module_::import("json");
-            py::object loads = json.attr("loads");
-            return loads(to_geojson_impl<geometry<double>>(g));})
+        .def_property_readonly("__geo_interface__", &python_mapnik::to_geo_interface<geometry<double>>)
+        .def_static("from_geo_interface", [](py::object const& obj) {
+                return std::make_shared<geometry<double>>(python_mapnik::geometry_from_geo_interface(obj));
+            },
+            "Constructs a Geometry from a GeoJSON-like mapping, or an object with a\n"
+            "__geo_interface__, reading the coordinate sequences directly\n"
+            "\n"
+            "Usage:\n"
+            ">>> Geometry.from_geo_interface({'type': 'Point', 'coordinates': (1, 2)}).to_wkt()\n"
+            "'POINT(1 2)'\n",
+            py::arg("obj"))
         ;
 
     py::implicitly_convertible<mapnik::geometry::point<double>, mapnik::geometry::geometry<double>>();
@@ -0,0 +1,643 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/geometry.hpp>
+#include <mapnik/geometry/centroid.hpp>
+#include <mapnik/geometry/envelope.hpp>
+#include <mapnik/geometry/geometry_type.hpp>
+#include <mapnik/geometry/is_empty.hpp>
+#include <mapnik/geometry/is_valid.hpp>
+#include <mapnik/json/geometry_parser.hpp>
+#include <mapnik/util/geometry_to_geojson.hpp>
+#include <mapnik/util/geometry_to_wkb.hpp>
+#include <mapnik/util/geometry_to_wkt.hpp>
+#include <mapnik/wkb.hpp>
+#include <mapnik/wkt/wkt_factory.hpp>
+#include "geometry_array.hpp"
+#include "geometry_generalize.hpp"
+#include "thread_pool.hpp"
+
+// stl
+#include <cmath>
+#include <limits>
+#include <memory>
+#include <sstream>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+//pybind11
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
+using mapnik::geometry::geometry;
+using python_mapnik::geometry_array;
+
+namespace {
+
+std::shared_ptr<geometry_array> from_geometries(py::iterable const& geometries)
+{
+    auto array = std::make_shared<geometry_array>();
+    for (auto item : geometries)
+    {
+        array->geometries.push_back(item.cast<geometry<double> const&>());
+    }
+    return array;
+}
+
+// The items of a sequence viewed in place: UTF-8 of str objects, the memory of
+// bytes-like objects. Items are referenced until the views are destroyed, which
+// has to happen with the GIL held.
+struct item_views
+{
+    std::vector<py::object> items;
+    std::vector<py::buffer_info> buffers;
+    std::vector<char const*> data; // nullptr for None
+    std::vector<std::size_t> sizes;
+
+    explicit item_views(py::iterable const& sequence)
+    {
+        for (auto item : sequence)
+        {
+            items.push_back(py::reinterpret_borrow<py::object>(item));
+            if (item.is_none())
+            {
+                data.push_back(nullptr);
+                sizes.push_back(0);
+            }
+            else if (PyUnicode_Check(item.ptr()))
+            {
+                Py_ssize_t size = 0;
+                char const* utf8 = PyUnicode_AsUTF8AndSize(item.ptr(), &size);
+                if (!utf8) throw py::error_already_set();
+                data.push_back(utf8);
+                sizes.push_back(static_cast<std::size_t>(size));
+            }
+            else if (PyObject_CheckBuffer(item.ptr()))
+            {
+                py::buffer_info info = py::reinterpret_borrow<py::buffer>(item).request();
+                if (info.ndim > 1 || (info.ndim == 1 && info.strides[0] != info.itemsize))
+                {
+                    throw std::runtime_error("item " + std::to_string(data.size()) + " is not a contiguous buffer");
+                }
+                data.push_back(static_cast<char const*>(info.ptr));
+                sizes.push_back(static_cast<std::size_t>(info.size * info.itemsize));
+                buffers.push_back(std::move(info));
+            }
+            else
+            {
+                throw py::type_error("item " + std::to_string(data.size()) + " is not str, bytes-like or None");
+            }
+        }
+    }
+};
+
+enum class error_mode { raise, ignore, mask };
+
+error_mode parse_errors(std::string const& errors)
+{
+    if (errors == "raise") return error_mode::raise;
+    if (errors == "ignore") return error_mode::ignore;
+    if (errors == "mask") return error_mode::mask;
+    throw std::runtime_error("errors must be 'raise', 'ignore' or 'mask'");
+}
+
+// Reports how many items failed and the index and message of the first ten
+void throw_failures(std::vector<std::string> const& failures, char const* action)
+{
+    std::size_t count = 0;
+    std::ostringstream s;
+    for (std::size_t i = 0; i < failures.size(); ++i)
+    {
+        if (failures[i].empty()) continue;
+        if (count < 10) s << (count ? "; " : ": ") << "index " << i << " (" << failures[i] << ")";
+        ++count;
+    }
+    if (count == 0) return;
+    if (count > 10) s << "; ...";
+    throw std::runtime_error(std::string("Failed to ") + action + " " + std::to_string(count) + " of " +
+                             std::to_string(failures.size()) + " geometries" + s.str());
+}
+
+// Parses every item on up to `threads` threads without the GIL. None gives an
+// empty geometry, failed items too unless errors are raised. With
+// errors='mask' a bool array flagging the failed items is returned as well.
+template <typename Parse>
+py::object parse_many(py::iterable const& items, std::string const& errors,
+                      std::size_t threads, char const* action, Parse parse)
+{
+    error_mode mode = parse_errors(errors);
+    item_views views(items);
+    std::size_t count = views.data.size();
+    auto array = std::make_shared<geometry_array>();
+    std::vector<std::string> failures(count);
+    {
+        py::gil_scoped_release release;
+        array->geometries.resize(count);
+        python_mapnik::parallel_for(count, threads, [&](std::size_t i) {
+            if (!views.data[i]) return;
+            try
+            {
+                if (!parse(views.data[i], views.sizes[i], array->geometries[i])) failures[i] = "invalid input";
+            }
+            catch (std::exception const& ex)
+            {
+                failures[i] = ex.what();
+            }
+            catch (...)
+            {
+                failures[i] = "invalid input";
+            }
+            if (!failures[i].empty()) array->geometries[i] = mapnik::geometry::geometry_empty();
+        });
+    }
+    if (mode == error_mode::raise) throw_failures(failures, action);
+    if (mode == error_mode::ignore) return py::cast(array);
+    py::array_t<bool> failed(static_cast<py::ssize_t>(count));
+    bool * out = failed.mutable_data();
+    for (auto const& failure : failures) *out++ = !failure.empty();
+    return py::make_tuple(array, failed);
+}
+
+// Walks the structure of a WKB geometry. mapnik's reader returns an empty
+// geometry for malformed input and for valid empty collections alike, this
+// tells them apart.
+class wkb_walker
+{
+  public:
+    wkb_walker(char const* data, std::size_t size)
+        : data_(reinterpret_cast<unsigned char const*>(data)), size_(size) {}
+
+    // Well formed, spanning all bytes and without a single coordinate
+    bool empty_geometry()
+    {
+        return geometry(0) && pos_ == size_ && points_ == 0;
+    }
+
+  private:
+    bool skip(std::size_t bytes)
+    {
+        if (size_ - pos_ < bytes) return false;
+        pos_ += bytes;
+        return true;
+    }
+
+    bool read_count(bool little_endian, std::uint32_t & value)
+    {
+        if (size_ - pos_ < 4) return false;
+        unsigned char const* p = data_ + pos_;
+        value = little_endian
+            ? std::uint32_t(p[0]) | (std::uint32_t(p[1]) << 8) | (std::uint32_t(p[2]) << 16) | (std::uint32_t(p[3]) << 24)
+            : std::uint32_t(p[3]) | (std::uint32_t(p[2]) << 8) | (std::uint32_t(p[1]) << 16) | (std::uint32_t(p[0]) << 24);
+        pos_ += 4;
+        return true;
+    }
+
+    bool skip_points(std::uint32_t count, std::size_t dims)
+    {
+        if (count > (size_ - pos_) / (dims * 8)) return false;
+        points_ += count;
+        return skip(count * dims * 8);
+    }
+
+    bool geometry(int depth)
+    {
+        if (depth > 32 || pos_ >= size_) return false;
+        unsigned char byte_order = data_[pos_++];
+        if (byte_order > 1) return false;
+        bool little_endian = byte_order == 1;
+        std::uint32_t type;
+        if (!read_count(little_endian, type)) return false;
+        // EWKB flags, then ISO Z/M/ZM type ranges
+        std::size_t dims = 2;
+        if (type & 0x80000000u) ++dims;
+        if (type & 0x40000000u) ++dims;
+        if ((type & 0x20000000u) && !skip(4)) return false;
+        type &= 0x0fffffffu;
+        switch (type / 1000)
+        {
+        case 0: break;
+        case 1: case 2: ++dims; break;
+        case 3: dims += 2; break;
+        default: return false;
+        }
+        std::uint32_t count;
+        switch (type % 1000)
+        {
+        case 1: // point
+            return skip_points(1, dims);
+        case 2: // line string
+            return read_count(little_endian, count) && skip_points(count, dims);
+        case 3: // polygon
+            if (!read_count(little_endian, count)) return false;
+            for (std::uint32_t i = 0; i < count; ++i)
+            {
+                std::uint32_t points;
+                if (!read_count(little_endian, points) || !skip_points(points, dims)) return false;
+            }
+            return true;
+        case 4: case 5: case 6: case 7: // multi geometries and collections
+            if (!read_count(little_endian, count)) return false;
+            for (std::uint32_t i = 0; i < count; ++i)
+            {
+                if (!geometry(depth + 1)) return false;
+            }
+            return true;
+        default:
+            return false;
+        }
+    }
+
+    unsigned char const* data_;
+    std::size_t size_;
+    std::size_t pos_ = 0;
+    std::size_t points_ = 0;
+};
+
+py::object from_wkb_many(py::iterable const& wkbs, std::string const& errors, std::size_t threads)
+{
+    return parse_many(wkbs, errors, threads, "parse WKB of",
+                      [](char const* data, std::size_t size, geometry<double> & geom) {
+                          geom = mapnik::geometry_utils::from_wkb(data, size);
+                          return !geom.is<mapnik::geometry::geometry_empty>() ||
+                                 wkb_walker(data, size).empty_geometry();
+                      });
+}
+
+py::object from_wkt_many(py::iterable const& wkts, std::string const& errors, std::size_t threads)
+{
+    // the WKT and GeoJSON grammars read std::string, so each item is copied on its worker
+    return parse_many(wkts, errors, threads, "parse WKT of",
+                      [](char const* data, std::size_t size, geometry<double> & geom) {
+                          return mapnik::from_wkt(std::string(data, size), geom);
+                      });
+}
+
+py::object from_geojson_many(py::iterable const& jsons, std::string const& errors, std::size_t threads)
+{
+    return parse_many(jsons, errors, threads, "parse GeoJSON of",
+                      [](char const* data, std::size_t size, geometry<double> & geom) {
+                          return mapnik::json::from_geojson(std::string(data, size), geom);
+                      });
+}
+
+// Rings of a part as a single point, line or polygon
+void check_rings(std::size_t first, std::size_t last, std::size_t expected, std::size_t index)
+{
+    if (last - first != expected)
+    {
+        throw std::runtime_error("GeometryArray: unexpected number of rings for geometry " + std::to_string(index));
+    }
+}
+
+std::shared_ptr<geometry_array> from_ragged_arrays(mapnik::geometry::geometry_types type,
+                                                   python_mapnik::coord_array const& coords,
+                                                   python_mapnik::offset_array const& ring_offsets,
+                                                   python_mapnik::offset_array const& part_offsets,
+                                                   python_mapnik::offset_array const& geometry_offsets)
+{
+    using namespace mapnik::geometry;
+    if (type == geometry_types::Unknown || type == geometry_types::GeometryCollection)
+    {
+        throw std::runtime_error("GeometryArray.from_ragged_arrays: unsupported geometry type");
+    }
+    std::size_t rings = python_mapnik::check_offsets(ring_offsets, python_mapnik::num_coords(coords), "ring_offsets");
+    std::size_t parts = python_mapnik::check_offsets(part_offsets, rings, "part_offsets");
+    std::size_t count = python_mapnik::check_offsets(geometry_offsets, parts, "geometry_offsets");
+    auto array = std::make_shared<geometry_array>();
+    py::gil_scoped_release release;
+    double const* xy = coords.data();
+    std::int64_t const* r = ring_offsets.data();
+    std::int64_t const* p = part_offsets.data();
+    std::int64_t const* g = geometry_offsets.data();
+    auto make_point = [&](std::size_t part, std::size_t index) {
+        check_rings(p[part], p[part + 1], 1, index);
+        std::int64_t ring = p[part];
+        if (r[ring + 1] - r[ring] != 1)
+        {
+            throw std::runtime_error("GeometryArray: a point needs exactly one coordinate, geometry " + std::to_string(index));
+        }
+        return point<double>(xy[2 * r[ring]], xy[2 * r[ring] + 1]);
+    };
+    auto make_line = [&](std::size_t part, std::size_t index) {
+        check_rings(p[part], p[part + 1], 1, index);
+        line_string<double> line;
+        python_mapnik::fill_points(line, xy + 2 * r[p[part]], static_cast<std::size_t>(r[p[part] + 1] - r[p[part]]));
+        return line;
+    };
+    auto make_polygon = [&](std::size_t part) {
+        polygon<double> poly;
+        python_mapnik::fill_parts(poly, xy, r, p[part], p[part + 1]);
+        return poly;
+    };
+    array->geometries.reserve(count);
+    for (std::size_t i = 0; i < count; ++i)
+    {
+        std::size_t first = g[i], last = g[i + 1];
+        if (first == last)
+        {
+            array->geometries.emplace_back(geometry_empty());
+            continue;
+        }
+        bool single = type == geometry_types::Point || type == geometry_types::LineString || type == geometry_types::Polygon;
+        if (single && last - first != 1)
+        {
+            throw std::runtime_error("GeometryArray: single part geometry " + std::to_string(i) + " has several parts");
+        }
+        switch (type)
+        {
+        case geometry_types::Point:
+            array->geometries.emplace_back(make_point(first, i));
+            break;
+        case geometry_types::LineString:
+            array->geometries.emplace_back(make_line(first, i));
+            break;
+        case geometry_types::Polygon:
+            array->geometries.emplace_back(make_polygon(first));
+            break;
+        case geometry_types::MultiPoint:
+        {
+            multi_point<double> points;
+            for (std::size_t part = first; part < last; ++part) points.push_back(make_point(part, i));
+            array->geometries.emplace_back(std::move(points));
+            break;
+        }
+        case geometry_types::MultiLineString:
+        {
+            multi_line_string<double> lines;
+            for (std::size_t part = first; part < last; ++part) lines.push_back(make_line(part, i));
+            array->geometries.emplace_back(std::move(lines));
+            break;
+        }
+        default:
+        {
+            multi_polygon<double> polygons;
+            for (std::size_t part = first; part < last; ++part) polygons.push_back(make_polygon(part));
+            array->geometries.emplace_back(std::move(polygons));
+            break;
+        }
+        }
+    }
+    return array;
+}
+
+std::shared_ptr<geometry<double>> getitem(geometry_array const& array, py::ssize_t index)
+{
+    py::ssize_t size = static_cast<py::ssize_t>(array.geometries.size());
+    if (index < 0) index += size;
+    if (index < 0 || index >= size) throw py::index_error("GeometryArray index out of range");
+    return std::make_shared<geometry<double>>(array.geometries[index]);
+}
+
+py::array_t<double> envelopes(geometry_array const& array)
+{
+    py::array_t<double> result({static_cast<py::ssize_t>(array.geometries.size()), py::ssize_t(4)});
+    double * out = result.mutable_data();
+    py::gil_scoped_release release;
+    double nan = std::numeric_limits<double>::quiet_NaN();
+    for (auto const& geom : array.geometries)
+    {
+        mapnik::box2d<double> box = mapnik::geometry::envelope(geom);
+        bool valid = box.valid();
+        *out++ = valid ? box.minx() : nan;
+        *out++ = valid ? box.miny() : nan;
+        *out++ = valid ? box.maxx() : nan;
+        *out++ = valid ? box.maxy() : nan;
+    }
+    return result;
+}
+
+template <typename Visitor>
+std::shared_ptr<geometry_array> transform_each(geometry_array const& array, Visitor const& visitor, std::size_t threads)
+{
+    auto result = std::make_shared<geometry_array>();
+    result->geometries.resize(array.geometries.size());
+    py::gil_scoped_release release;
+    python_mapnik::parallel_for(array.geometries.size(), threads, [&](std::size_t i) {
+        result->geometries[i] = visitor(array.geometries[i]);
+    });
+    return result;
+}
+
+py::array_t<double> centroids(geometry_array const& array)
+{
+    py::array_t<double> result({static_cast<py::ssize_t>(array.geometries.size()), py::ssize_t(2)});
+    double * out = result.mutable_data();
+    py::gil_scoped_release release;
+    double nan = std::numeric_limits<double>::quiet_NaN();
+    for (auto const& geom : array.geometries)
+    {
+        mapnik::geometry::point<double> pt;
+        bool ok = !mapnik::geometry::is_empty(geom) && mapnik::geometry::centroid(geom, pt);
+        *out++ = ok ? pt.x : nan;
+        *out++ = ok ? pt.y : nan;
+    }
+    return result;
+}
+
+template <typename Predicate>
+py::array_t<bool> test_each(geometry_array const& array, Predicate && predicate)
+{
+    py::array_t<bool> result(static_cast<py::ssize_t>(array.geometries.size()));
+    bool * out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (auto const& geom : array.geometries) *out++ = predicate(geom);
+    return result;
+}
+
+// GeometryArray as is, anything else is copied into one
+std::shared_ptr<geometry_array> as_geometry_array(py::object const& geometries)
+{
+    if (py::isinstance<geometry_array>(geometries)) return geometries.cast<std::shared_ptr<geometry_array>>();
+    return from_geometries(py::iterable(geometries));
+}
+
+py::list to_wkb_many(py::object const& geometries, mapnik::wkbByteOrder byte_order, std::size_t threads)
+{
+    std::shared_ptr<geometry_array> array = as_geometry_array(geometries);
+    std::vector<mapnik::util::wkb_buffer_ptr> buffers(array->geometries.size());
+    {
+        py::gil_scoped_release release;
+        python_mapnik::parallel_for(buffers.size(), threads, [&](std::size_t i) {
+            buffers[i] = mapnik::util::to_wkb(array->geometries[i], byte_order);
+        });
+    }
+    py::list result;
+    for (auto const& wkb : buffers)
+    {
+        if (wkb) result.append(py::bytes(wkb->buffer(), wkb->size()));
+        else result.append(py::none());
+    }
+    return result;
+}
+
+template <typename Serialize>
+py::list to_text_many(py::object const& geometries, std::size_t threads, char const* action, Serialize serialize)
+{
+    std::shared_ptr<geometry_array> array = as_geometry_array(geometries);
+    std::vector<std::string> texts(array->geometries.size());
+    std::vector<std::string> failures(texts.size());
+    {
+        py::gil_scoped_release release;
+        python_mapnik::parallel_for(texts.size(), threads, [&](std::size_t i) {
+            if (!serialize(texts[i], array->geometries[i])) failures[i] = "unsupported geometry";
+        });
+    }
+    throw_failures(failures, action);
+    py::list result;
+    for (auto const& text : texts) result.append(py::str(text));
+    return result;
+}
+
+py::list to_wkt_many(py::object const& geometries, std::size_t threads)
+{
+    return to_text_many(geometries, threads, "generate WKT for",
+                        [](std::string & out, geometry<double> const& geom) { return mapnik::util::to_wkt(out, geom); });
+}
+
+py::list to_geojson_many(py::object const& geometries, std::size_t threads)
+{
+    return to_text_many(geometries, threads, "generate GeoJSON for",
+                        [](std::string & out, geometry<double> const& geom) { return mapnik::util::to_geojson(out, geom); });
+}
+
+} // namespace
+
+void export_geometry_array(py::module const& m)
+{
+    py::class_<geometry_array, std::shared_ptr<geometry_array>>(m, "GeometryArray",
+        "A columnar array of geometries. Bulk operations run natively without\n"
+        "the GIL and return NumPy arrays or lists, one entry per geometry.\n")
+        .def(py::init(&from_geometries),
+             "Constructs a GeometryArray from an iterable of geometries\n",
+             py::arg("geometries"))
+        .def_static("from_wkb", &from_wkb_many,
+                    "Constructs a GeometryArray from an iterable of WKB bytes-like\n"
+                    "objects, None gives an empty geometry. See Geometry.from_wkb_many\n"
+                    "for errors and threads.\n"
+                    "\n"
+                    "Usage:\n"
+                    ">>> geoms = GeometryArray.from_wkb(df['wkb'])\n",
+                    py::arg("wkbs"), py::arg("errors") = "raise", py::arg("threads") = 0)
+        .def_static("from_ragged_arrays", &from_ragged_arrays,
+                    "Constructs a GeometryArray of geometry_type geometries from the (N, 2)\n"
+                    "float64 coordinates of all of them and three offset arrays:\n"
+                    "ring_offsets into the coordinates, part_offsets into the rings and\n"
+                    "geometry_offsets into the parts. Each point, line and polygon is one\n"
+                    "part, a geometry without parts is empty.\n"
+                    "\n"
+                    "Usage:\n"
+                    ">>> coords = np.array([[0, 0], [1, 1], [2, 2], [3, 3]], dtype='f8')\n"
+                    ">>> geoms = GeometryArray.from_ragged_arrays(GeometryType.LineString, coords,\n"
+                    "...                                         [0, 2, 4], [0, 1, 2], [0, 1, 2])\n"
+                    ">>> len(geoms)\n"
+                    "2\n",
+                    py::arg("geometry_type"), py::arg("coords"), py::arg("ring_offsets"),
+                    py::arg("part_offsets"), py::arg("geometry_offsets"))
+        .def("__len__", [](geometry_array const& array) { return array.geometries.size(); })
+        .def("__getitem__", &getitem, "Returns a copy of the geometry at index\n")
+        .def("envelopes", &envelopes,
+             "Returns an (n, 4) array of minx, miny, maxx, maxy, NaN for empty geometries\n")
+        .def("centroids", &centroids,
+             "Returns an (n, 2) array of centroids, NaN for empty geometries\n")
+        .def("is_valid", [](geometry_array const& array) {
+                 return test_each(array, [](geometry<double> const& g) { return mapnik::geometry::is_valid(g); });
+             },
+             "Returns a boolean array, True for valid geometries\n")
+        .def("is_empty", [](geometry_array const& array) {
+                 return test_each(array, [](geometry<double> const& g) { return mapnik::geometry::is_empty(g); });
+             },
+             "Returns a boolean array, True for empty geometries\n")
+        .def("clip", [](geometry_array const& array, mapnik::box2d<double> const& box, std::size_t threads) {
+                 return transform_each(array, python_mapnik::clip_visitor(box), threads);
+             },
+             "Returns a new GeometryArray with every geometry clipped to box,\n"
+             "see Geometry.clip\n",
+             py::arg("box"), py::arg("threads") = 0)
+        .def("simplify", [](geometry_array const& array, double tolerance, std::string const& algorithm,
+                            std::size_t threads) {
+                 python_mapnik::simplify_visitor simplify(python_mapnik::simplify_algorithm(algorithm), tolerance);
+                 return transform_each(array, simplify, threads);
+             },
+             "Returns a new GeometryArray with every geometry simplified,\n"
+             "see Geometry.simplify\n"
+             "\n"
+             "Usage:\n"
+             ">>> generalized = geoms.clip(tile_box).simplify(resolution)\n",
+             py::arg("tolerance"), py::arg("algorithm") = "douglas-peucker", py::arg("threads") = 0)
+        .def("to_wkb", [](py::object self, mapnik::wkbByteOrder byte_order, std::size_t threads) {
+                 return to_wkb_many(self, byte_order, threads);
+             },
+             "Returns a list of WKB bytes, None where a geometry can't be encoded\n",
+             py::arg("byte_order") = mapnik::wkbNDR, py::arg("threads") = 0)
+        .def("to_wkt", [](py::object self, std::size_t threads) { return to_wkt_many(self, threads); },
+             "Returns a list of WKT strings\n",
+             py::arg("threads") = 0)
+        .def("to_geojson", [](py::object self, std::size_t threads) { return to_geojson_many(self, threads); },
+             "Returns a list of GeoJSON geometry strings\n",
+             py::arg("threads") = 0)
+        ;
+
+    // bulk conversions, on the Geometry class next to from_wkb and friends
+    auto geometry_class = py::reinterpret_borrow<py::class_<geometry<double>, std::shared_ptr<geometry<double>>>>(
+        m.attr("Geometry"));
+    geometry_class
+        .def_static("from_wkb_many", &from_wkb_many,
+                    "Parses an iterable of WKB items (bytes-like objects, read in place,\n"
+                    "or None for an empty geometry) on up to threads threads without\n"
+                    "the GIL and returns a GeometryArray. With errors='raise' a RuntimeError\n"
+                    "gives the number of failed items and the index and reason of the first\n"
+                    "ten, with errors='ignore' they become empty geometries. errors='mask'\n"
+                    "returns a (GeometryArray, failed) tuple, failed being a bool array that\n"
+                    "tells failed items apart from None inputs.\n"
+                    "\n"
+                    "Usage:\n"
+                    ">>> geoms = Geometry.from_wkb_many(wkbs)\n"
+                    ">>> geoms, failed = Geometry.from_wkb_many(wkbs, errors='mask')\n",
+                    py::arg("wkbs"), py::arg("errors") = "raise", py::arg("threads") = 0)
+        .def_static("from_wkt_many", &from_wkt_many,
+                    "Parses an iterable of WKT strings (str or UTF-8 bytes-like objects)\n"
+                    "into a GeometryArray, see from_wkb_many\n",
+                    py::arg("wkts"), py::arg("errors") = "raise", py::arg("threads") = 0)
+        .def_static("from_geojson_many", &from_geojson_many,
+                    "Parses an iterable of GeoJSON geometry strings (str or UTF-8\n"
+                    "bytes-like objects) into a GeometryArray, see from_wkb_many\n",
+                    py::arg("jsons"), py::arg("errors") = "raise", py::arg("threads") = 0)
+        .def_static("to_wkb_many", &to_wkb_many,
+                    "Encodes a GeometryArray or an iterable of geometries as a list of WKB\n"
+                    "bytes on up to threads threads without the GIL\n",
+                    py::arg("geometries"), py::arg("byte_order") = mapnik::wkbNDR, py::arg("threads") = 0)
+        .def_static("to_wkt_many", &to_wkt_many,
+                    "Encodes a GeometryArray or an iterable of geometries as a list of WKT\n"
+                    "strings on up to threads threads without the GIL\n",
+                    py::arg("geometries"), py::arg("threads") = 0)
+        .def_static("to_geojson_many", &to_geojson_many,
+                    "Encodes a GeometryArray or an iterable of geometries as a list of\n"
+                    "GeoJSON strings on up to threads threads without the GIL\n",
+                    py::arg("geometries"), py::arg("threads") = 0)
+        ;
+}
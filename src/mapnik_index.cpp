@@ -0,0 +1,304 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/feature_factory.hpp>
+#include <mapnik/geometry.hpp>
+#include <mapnik/geometry/box2d.hpp>
+#include <mapnik/geometry/envelope.hpp>
+#include <mapnik/json/feature_parser.hpp>
+#include <mapnik/json/geometry_parser.hpp>
+#include <mapnik/quad_tree.hpp>
+#include <mapnik/wkt/wkt_factory.hpp>
+#include "index_scan.hpp"
+#include "thread_pool.hpp"
+
+// stl
+#include <algorithm>
+#include <cctype>
+#include <cstdint>
+#include <cstdio>
+#include <fstream>
+#include <stdexcept>
+#include <string>
+#include <tuple>
+#include <utility>
+#include <vector>
+
+//pybind11
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
+using python_mapnik::index_box;
+
+namespace {
+
+// Same layout as the items written by shapeindex: record offset followed by
+// the part range, -1 indexes the whole shape
+struct shape_item
+{
+    std::int64_t offset;
+    std::int32_t start;
+    std::int32_t end;
+};
+
+// CSV and GeoJSON items are (offset, size) like mapnik-index writes them
+using text_item = std::pair<std::uint64_t, std::uint64_t>;
+
+struct record
+{
+    std::size_t index;
+    std::uint64_t offset;
+    std::uint64_t size;
+    index_box box;
+};
+
+mapnik::box2d<float> to_float_box(index_box const& box)
+{
+    return mapnik::box2d<float>(static_cast<float>(box.minx), static_cast<float>(box.miny),
+                                static_cast<float>(box.maxx), static_cast<float>(box.maxy));
+}
+
+index_box to_index_box(mapnik::box2d<double> const& box)
+{
+    index_box result;
+    if (box.valid())
+    {
+        result.minx = box.minx();
+        result.miny = box.miny();
+        result.maxx = box.maxx();
+        result.maxy = box.maxy();
+        result.valid = true;
+    }
+    return result;
+}
+
+// Index files are written next to the final path and renamed over it, readers
+// never see a partially written index
+template <typename Tree>
+void write_tree(Tree & tree, std::string const& path)
+{
+    std::string tmp = path + ".tmp";
+    {
+        std::ofstream out(tmp, std::ios::binary | std::ios::trunc);
+        if (!out) throw std::runtime_error("could not write '" + tmp + "'");
+        tree.trim();
+        tree.write(out);
+        out.flush();
+        if (!out) throw std::runtime_error("could not write '" + tmp + "'");
+    }
+    if (std::rename(tmp.c_str(), path.c_str()) != 0)
+    {
+        // rename doesn't replace existing files everywhere
+        std::remove(path.c_str());
+        if (std::rename(tmp.c_str(), path.c_str()) != 0)
+        {
+            std::remove(tmp.c_str());
+            throw std::runtime_error("could not replace '" + path + "'");
+        }
+    }
+}
+
+std::string shape_base(std::string const& path)
+{
+    std::string::size_type dot = path.find_last_of('.');
+    std::string::size_type sep = path.find_last_of("/\\");
+    if (dot != std::string::npos && (sep == std::string::npos || dot > sep))
+    {
+        std::string ext = path.substr(dot);
+        for (auto & c : ext) c = static_cast<char>(std::tolower(static_cast<unsigned char>(c)));
+        if (ext == ".shp") return path.substr(0, dot);
+    }
+    return path;
+}
+
+std::vector<record> shape_records(std::string const& base)
+{
+    std::vector<record> records;
+    python_mapnik::scan_shape_records(base, [&](std::size_t index, std::uint64_t offset,
+                                                std::uint64_t size, index_box const& box) {
+        records.push_back(record{index, offset, size, box});
+    });
+    return records;
+}
+
+std::vector<record> csv_records(std::string const& path, std::string separator, char quote)
+{
+    std::vector<record> records;
+    bool header = true;
+    python_mapnik::csv_columns columns{};
+    std::size_t index = 0;
+    python_mapnik::scan_csv_records(path, quote, [&](std::uint64_t offset, std::string const& text) {
+        if (python_mapnik::is_blank(text)) return;
+        if (header)
+        {
+            if (separator.empty()) separator.assign(1, python_mapnik::detect_csv_separator(text));
+            columns = python_mapnik::detect_csv_columns(python_mapnik::split_csv_fields(text, separator[0], quote), path);
+            header = false;
+            return;
+        }
+        auto fields = python_mapnik::split_csv_fields(text, separator[0], quote);
+        index_box box;
+        if (columns.kind == python_mapnik::csv_columns::xy)
+        {
+            double x, y;
+            if (std::max(columns.first, columns.second) < fields.size() &&
+                python_mapnik::parse_number(fields[columns.first], x) &&
+                python_mapnik::parse_number(fields[columns.second], y))
+            {
+                box.minx = box.maxx = x;
+                box.miny = box.maxy = y;
+                box.valid = true;
+            }
+        }
+        else if (columns.first < fields.size())
+        {
+            mapnik::geometry::geometry<double> geom;
+            bool parsed = columns.kind == python_mapnik::csv_columns::wkt
+                ? mapnik::from_wkt(fields[columns.first], geom)
+                : mapnik::json::from_geojson(fields[columns.first], geom);
+            if (parsed) box = to_index_box(mapnik::geometry::envelope(geom));
+        }
+        records.push_back(record{index++, offset, text.size(), box});
+    });
+    return records;
+}
+
+std::vector<record> geojson_records(std::string const& path)
+{
+    std::vector<record> records;
+    mapnik::context_ptr ctx = std::make_shared<mapnik::context_type>();
+    std::size_t index = 0;
+    python_mapnik::scan_geojson_features(path, [&](std::uint64_t offset, std::string const& text) {
+        mapnik::feature_ptr feature(mapnik::feature_factory::create(ctx, 1));
+        if (!mapnik::json::from_geojson(text, *feature))
+        {
+            throw std::runtime_error(path + ": invalid GeoJSON feature at offset " + std::to_string(offset));
+        }
+        records.push_back(record{index++, offset, text.size(), to_index_box(feature->envelope())});
+    });
+    return records;
+}
+
+std::vector<record> scan_records(std::string const& path, std::string const& kind,
+                                 std::string const& separator, char quote)
+{
+    if (kind == "shape") return shape_records(shape_base(path));
+    if (kind == "csv") return csv_records(path, separator, quote);
+    if (kind == "geojson") return geojson_records(path);
+    throw std::runtime_error("Unknown index kind '" + kind + "'");
+}
+
+std::size_t build_one(std::string const& path, std::string const& kind, unsigned depth, double ratio,
+                      std::string const& separator, char quote)
+{
+    std::vector<record> records = scan_records(path, kind, separator, quote);
+    std::size_t count = 0;
+    if (kind == "shape")
+    {
+        std::string base = shape_base(path);
+        mapnik::quad_tree<shape_item, mapnik::box2d<float>> tree(
+            to_float_box(python_mapnik::shape_extent(base)), depth, ratio);
+        for (auto const& r : records)
+        {
+            if (!r.box.valid) continue;
+            tree.insert(shape_item{static_cast<std::int64_t>(r.offset), -1, 0}, to_float_box(r.box));
+            ++count;
+        }
+        write_tree(tree, base + ".index");
+        return count;
+    }
+    index_box extent;
+    for (auto const& r : records) extent.expand_to_include(r.box);
+    if (!extent.valid) return 0;
+    mapnik::quad_tree<text_item, mapnik::box2d<float>> tree(to_float_box(extent), depth, ratio);
+    for (auto const& r : records)
+    {
+        if (!r.box.valid) continue;
+        tree.insert(text_item(r.offset, r.size), to_float_box(r.box));
+        ++count;
+    }
+    write_tree(tree, path + ".index");
+    return count;
+}
+
+char quote_char(std::string const& quote)
+{
+    if (quote.size() != 1) throw std::runtime_error("quote must be a single character");
+    return quote[0];
+}
+
+std::vector<std::size_t> build_index(std::vector<std::string> const& paths, std::vector<std::string> const& kinds,
+                                     unsigned depth, double ratio, std::string const& separator,
+                                     std::string const& quote, std::size_t threads)
+{
+    if (paths.size() != kinds.size()) throw std::runtime_error("paths and kinds differ in length");
+    if (separator.size() > 1) throw std::runtime_error("separator must be a single character");
+    char q = quote_char(quote);
+    std::vector<std::size_t> counts(paths.size(), 0);
+    {
+        py::gil_scoped_release release;
+        python_mapnik::parallel_for(paths.size(), threads, [&](std::size_t i) {
+            counts[i] = build_one(paths[i], kinds[i], depth, ratio, separator, q);
+        });
+    }
+    return counts;
+}
+
+std::vector<std::tuple<std::size_t, std::uint64_t, std::uint64_t>> hilbert_records(std::string const& path,
+                                                                                 std::string const& kind)
+{
+    std::vector<std::tuple<std::size_t, std::uint64_t, std::uint64_t>> result;
+    {
+        py::gil_scoped_release release;
+        std::vector<record> records = scan_records(path, kind, "", '"');
+        std::vector<index_box> boxes;
+        boxes.reserve(records.size());
+        for (auto const& r : records) boxes.push_back(r.box);
+        result.reserve(records.size());
+        for (std::size_t i : python_mapnik::hilbert_order(boxes))
+        {
+            result.emplace_back(records[i].index, records[i].offset, records[i].size);
+        }
+    }
+    return result;
+}
+
+} // namespace
+
+void export_index(py::module& m) // non-const because of m.def(..)
+{
+    m.def("_build_index", &build_index,
+          py::arg("paths"), py::arg("kinds"), py::arg("depth"), py::arg("ratio"),
+          py::arg("separator"), py::arg("quote"), py::arg("threads"),
+          "Write the spatial index of every path, returns the number of indexed\n"
+          "features per path. Used by mapnik.index.build\n");
+
+    m.def("_hilbert_records", &hilbert_records,
+          py::arg("path"), py::arg("kind"),
+          "Records of a shapefile or GeoJSON file in Hilbert curve order, as\n"
+          "(record number, offset, size) tuples. Used by mapnik.index.hilbert_sort\n");
+}
@@ -27,16 +27,34 @@
 #include <mapnik/map.hpp>
 #include <mapnik/featureset.hpp>
 #include <mapnik/projection.hpp>
+#include <mapnik/proj_transform.hpp>
+#include <mapnik/query.hpp>
 #include <mapnik/view_transform.hpp>
 #include <mapnik/feature_type_style.hpp>
+#include <mapnik/font_engine_freetype.hpp>
+#include <mapnik/proj_transform_cache.hpp>
 #include "mapnik_value_converter.hpp"
 #include "python_optional.hpp"
+#include "map_resources.hpp"
+#include "cache_tracker.hpp"
+#include "prefetch_datasource.hpp"
+#include "thread_pool.hpp"
+//boost
+#include <boost/geometry.hpp>
+#include <boost/geometry/index/rtree.hpp>
+//stl
+#include <algorithm>
+#include <chrono>
+#include <set>
+#include <utility>
+#include <vector>
 //pybind11
 #include <pybind11/pybind11.h>
 #include <pybind11/operators.h>
 #include <pybind11/stl.h>
 #include <pybind11/stl_bind.h>
 #include <pybind11/native_enum.h>
+#include <pybind11/numpy.h>
 
 namespace py = pybind11;
 
@@ -118,6 +136,414 @@ void set_maximum_extent(mapnik::Map & m, boost::optional<mapnik::box2d<double> >
     }
 }
 
+void clear_prefetch(mapnik::Map & m)
+{
+    for (auto & lyr : m.layers())
+    {
+        auto prefetched = std::dynamic_pointer_cast<python_mapnik::prefetched_datasource>(lyr.datasource());
+        if (prefetched) lyr.set_datasource(prefetched->inner());
+    }
+}
+
+py::dict prefetch(mapnik::Map & m,
+                  boost::optional<mapnik::box2d<double>> const& extent,
+                  boost::optional<double> const& scale_denominator,
+                  std::size_t threads)
+{
+    constexpr int envelope_points = 20;
+    struct prefetch_job
+    {
+        std::size_t index;
+        mapnik::datasource_ptr ds;
+        mapnik::query q;
+        std::shared_ptr<python_mapnik::feature_vector> features;
+    };
+
+    clear_prefetch(m);
+    box2d<double> map_extent = extent ? *extent : m.get_buffered_extent();
+    if (!map_extent.valid() || map_extent.width() <= 0 || map_extent.height() <= 0)
+    {
+        throw std::runtime_error("Map.prefetch: invalid extent");
+    }
+    // layer buffer_size pads the unbuffered extent, as in the renderer
+    box2d<double> current_extent = extent ? *extent : m.get_current_extent();
+    double map_scale = current_extent.width() / m.width();
+    double scale_denom = scale_denominator ? *scale_denominator : m.scale_denominator();
+    mapnik::query::resolution_type res(m.width() / map_extent.width(), m.height() / map_extent.height());
+    mapnik::projection map_proj(m.srs());
+
+    std::vector<prefetch_job> jobs;
+    auto & layers = m.layers();
+    for (std::size_t i = 0; i < layers.size(); ++i)
+    {
+        layer const& lyr = layers[i];
+        mapnik::datasource_ptr ds = lyr.datasource();
+        // raster layers are read lazily per tile by the renderer, leave them alone
+        if (!ds || !lyr.active() || !lyr.visible(scale_denom) || ds->type() != mapnik::datasource::Vector) continue;
+        box2d<double> query_extent = map_extent;
+        if (auto buffer_size = lyr.buffer_size())
+        {
+            query_extent = current_extent;
+            query_extent.pad(map_scale * *buffer_size);
+        }
+        mapnik::projection layer_proj(lyr.srs());
+        mapnik::proj_transform prj_trans(map_proj, layer_proj);
+        if (!prj_trans.equal() && !prj_trans.forward(query_extent, envelope_points)) continue;
+        mapnik::query q(query_extent, res, scale_denom, query_extent);
+        mapnik::layer_descriptor desc = ds->get_descriptor();
+        for (auto const& attr : desc.get_descriptors())
+        {
+            q.add_property_name(attr.get_name());
+        }
+        jobs.push_back(prefetch_job{i, ds, q, nullptr});
+    }
+
+    {
+        py::gil_scoped_release release;
+        python_mapnik::parallel_for(jobs.size(), threads, [&jobs](std::size_t i) {
+            jobs[i].features = python_mapnik::read_features(jobs[i].ds->features(jobs[i].q));
+        });
+    }
+
+    py::dict counts;
+    for (auto & job : jobs)
+    {
+        layer & lyr = layers[job.index];
+        counts[py::str(lyr.name())] = job.features->size();
+        lyr.set_datasource(std::make_shared<python_mapnik::prefetched_datasource>(job.ds, job.q.get_bbox(), job.features));
+    }
+    return counts;
+}
+
+// True if any active layer visible at the current scale has a feature in the
+// buffered extent, using the layer buffer_size over the map one like the
+// renderer. Only layer envelopes and datasource indexes are consulted.
+bool map_has_features(mapnik::Map const& m)
+{
+    constexpr int envelope_points = 20;
+    box2d<double> map_extent = m.get_buffered_extent();
+    box2d<double> current_extent = m.get_current_extent();
+    double map_scale = m.scale();
+    double scale_denom = m.scale_denominator();
+    py::gil_scoped_release release;
+    mapnik::projection map_proj(m.srs());
+    for (layer const& lyr : m.layers())
+    {
+        mapnik::datasource_ptr ds = lyr.datasource();
+        if (!ds || !lyr.active() || !lyr.visible(scale_denom) || lyr.styles().empty()) continue;
+        box2d<double> query_extent = map_extent;
+        if (auto buffer_size = lyr.buffer_size())
+        {
+            query_extent = current_extent;
+            query_extent.pad(map_scale * *buffer_size);
+        }
+        mapnik::projection layer_proj(lyr.srs());
+        mapnik::proj_transform prj_trans(map_proj, layer_proj);
+        // when the extent can't be projected let the renderer decide
+        if (!prj_trans.equal() && !prj_trans.forward(query_extent, envelope_points)) return true;
+        if (!query_extent.intersects(ds->envelope())) continue;
+        mapnik::featureset_ptr fs = ds->features(mapnik::query(query_extent));
+        if (!fs) continue;
+        for (mapnik::feature_ptr feature = fs->next(); feature; feature = fs->next())
+        {
+            if (ds->type() == mapnik::datasource::Raster || feature->envelope().intersects(query_extent)) return true;
+        }
+    }
+    return false;
+}
+
+std::vector<mapnik::coord2d> read_points(py::object const& points)
+{
+    std::vector<mapnik::coord2d> result;
+    if (py::isinstance<py::array>(points))
+    {
+        auto arr = py::array_t<double, py::array::c_style | py::array::forcecast>::ensure(points);
+        if (!arr || arr.ndim() != 2 || arr.shape(1) != 2)
+        {
+            throw std::runtime_error("Map.query_points: expected an array of shape (N, 2)");
+        }
+        auto r = arr.unchecked<2>();
+        result.reserve(r.shape(0));
+        for (py::ssize_t i = 0; i < r.shape(0); ++i) result.emplace_back(r(i, 0), r(i, 1));
+        return result;
+    }
+    for (auto item : points)
+    {
+        auto pt = item.cast<std::pair<double, double>>();
+        result.emplace_back(pt.first, pt.second);
+    }
+    return result;
+}
+
+// Layer indices for a selection of names and/or indices, each layer once in
+// the order first requested
+std::vector<std::size_t> select_layers(std::vector<layer> const& layers, py::object const& selection)
+{
+    std::vector<std::size_t> indices;
+    if (selection.is_none())
+    {
+        for (std::size_t i = 0; i < layers.size(); ++i) indices.push_back(i);
+        return indices;
+    }
+    auto add = [&indices](std::size_t index) {
+        if (std::find(indices.begin(), indices.end(), index) == indices.end()) indices.push_back(index);
+    };
+    for (auto item : selection)
+    {
+        if (py::isinstance<py::str>(item))
+        {
+            std::string name = item.cast<std::string>();
+            auto itr = std::find_if(layers.begin(), layers.end(), [&name](layer const& lyr) { return lyr.name() == name; });
+            if (itr == layers.end()) throw pybind11::index_error("Unknown layer name: " + name);
+            add(static_cast<std::size_t>(itr - layers.begin()));
+        }
+        else
+        {
+            long index = item.cast<long>();
+            if (index < 0 || static_cast<std::size_t>(index) >= layers.size())
+            {
+                throw pybind11::index_error("Layer index out of range");
+            }
+            add(static_cast<std::size_t>(index));
+        }
+    }
+    return indices;
+}
+
+// Runs point queries for many points over many layers with a single bbox query
+// per layer. Hits use the same test as Map.query_point: the feature envelope
+// intersects the tolerance box around the point.
+py::list query_points(mapnik::Map const& m,
+                      py::object const& points,
+                      py::object const& layer_selection,
+                      double tolerance,
+                      boost::optional<std::vector<std::string>> const& fields)
+{
+    namespace bg = boost::geometry;
+    namespace bgi = boost::geometry::index;
+    using point_type = bg::model::point<double, 2, bg::cs::cartesian>;
+    using box_type = bg::model::box<point_type>;
+    using tree_value = std::pair<point_type, std::size_t>;
+    constexpr int envelope_points = 20;
+
+    std::vector<mapnik::coord2d> coords = read_points(points);
+    auto const& layers = m.layers();
+    std::vector<std::size_t> indices = select_layers(layers, layer_selection);
+    // hits[point] -> (layer index, feature, query attribute names)
+    std::vector<std::vector<std::pair<std::size_t, mapnik::feature_ptr>>> hits(coords.size());
+    std::vector<std::vector<std::string>> layer_names(layers.size());
+    {
+        py::gil_scoped_release release;
+        double scale_denom = m.scale_denominator();
+        mapnik::projection map_proj(m.srs());
+        for (std::size_t index : indices)
+        {
+            layer const& lyr = layers[index];
+            mapnik::datasource_ptr ds = lyr.datasource();
+            if (!ds || coords.empty() || !lyr.active() || !lyr.visible(scale_denom)) continue;
+            mapnik::projection layer_proj(lyr.srs());
+            mapnik::proj_transform prj_trans(map_proj, layer_proj);
+
+            box2d<double> map_ext = m.get_current_extent();
+            if (!prj_trans.equal() && !prj_trans.forward(map_ext, envelope_points)) continue;
+            double tol = map_ext.width() / m.width() * tolerance;
+
+            std::vector<tree_value> values;
+            values.reserve(coords.size());
+            box2d<double> query_ext;
+            for (std::size_t i = 0; i < coords.size(); ++i)
+            {
+                double x = coords[i].x, y = coords[i].y, z = 0;
+                if (!prj_trans.equal() && !prj_trans.forward(x, y, z)) continue;
+                values.emplace_back(point_type(x, y), i);
+                if (query_ext.valid()) query_ext.expand_to_include(x, y);
+                else query_ext.init(x, y, x, y);
+            }
+            if (values.empty()) continue;
+            query_ext.pad(tol);
+            bgi::rtree<tree_value, bgi::quadratic<16>> tree(values);
+
+            mapnik::query q(query_ext);
+            mapnik::layer_descriptor desc = ds->get_descriptor();
+            for (auto const& attr : desc.get_descriptors())
+            {
+                if (!fields || std::find(fields->begin(), fields->end(), attr.get_name()) != fields->end())
+                {
+                    q.add_property_name(attr.get_name());
+                    layer_names[index].push_back(attr.get_name());
+                }
+            }
+            mapnik::featureset_ptr fs = ds->features(q);
+            if (!fs) continue;
+            std::vector<tree_value> matches;
+            for (mapnik::feature_ptr feature = fs->next(); feature; feature = fs->next())
+            {
+                box2d<double> env = feature->envelope();
+                if (!env.valid()) continue;
+                env.pad(tol);
+                matches.clear();
+                tree.query(bgi::intersects(box_type(point_type(env.minx(), env.miny()),
+                                                    point_type(env.maxx(), env.maxy()))),
+                           std::back_inserter(matches));
+                for (auto const& match : matches) hits[match.second].emplace_back(index, feature);
+            }
+        }
+    }
+
+    py::list result;
+    for (auto const& point_hits : hits)
+    {
+        py::list items;
+        for (auto const& hit : point_hits)
+        {
+            py::dict properties;
+            for (auto const& name : layer_names[hit.first])
+            {
+                if (hit.second->has_key(name)) properties[py::str(name)] = hit.second->get(name);
+            }
+            py::dict item;
+            item["layer"] = layers[hit.first].name();
+            item["id"] = hit.second->id();
+            item["properties"] = properties;
+            items.append(item);
+        }
+        result.append(items);
+    }
+    return result;
+}
+
+// Loads everything the first render would otherwise load lazily: font faces into
+// the font memory cache, markers and patterns into the marker cache, datasource
+// connections and PROJ transforms. Returns counts, failures and timings per step.
+py::dict warmup(mapnik::Map const& m, boost::optional<std::vector<double>> const& scales)
+{
+    using clock = std::chrono::steady_clock;
+    auto seconds_since = [](clock::time_point start) {
+        return std::chrono::duration<double>(clock::now() - start).count();
+    };
+    auto visible = [&](auto const& obj) {
+        if (!scales) return true;
+        return std::any_of(scales->begin(), scales->end(), [&](double scale) { return obj.active(scale); });
+    };
+    auto layer_visible = [&](layer const& lyr) {
+        if (!lyr.active()) return false;
+        if (!scales) return true;
+        return std::any_of(scales->begin(), scales->end(), [&](double scale) { return lyr.visible(scale); });
+    };
+
+    clock::time_point total_start = clock::now();
+    std::vector<layer const*> layers;
+    python_mapnik::collect_layers(m.layers(), layers);
+    std::set<std::string> style_names;
+    for (layer const* lyr : layers)
+    {
+        if (!layer_visible(*lyr)) continue;
+        for (auto const& name : lyr->styles()) style_names.insert(name);
+    }
+    python_mapnik::map_resources resources;
+    for (auto const& kv : m.fontsets()) resources.add(kv.second);
+    resources.add_styles(m, style_names, visible);
+    if (m.background_image()) resources.files.insert(*m.background_image());
+
+    std::vector<std::string> missing_faces;
+    std::vector<std::string> missing_files;
+    std::vector<std::string> failed_layers;
+    std::vector<std::string> failed_srs;
+    std::size_t datasources = 0;
+    std::size_t transforms = 0;
+    double fonts_time = 0, markers_time = 0, datasources_time = 0, projections_time = 0;
+    {
+        py::gil_scoped_release release;
+
+        clock::time_point start = clock::now();
+        mapnik::font_library library;
+        mapnik::face_manager faces(library, m.get_font_file_mapping(), m.get_font_memory_cache());
+        for (auto const& name : resources.face_names)
+        {
+            if (!faces.get_face(name)) missing_faces.push_back(name);
+        }
+        fonts_time = seconds_since(start);
+
+        start = clock::now();
+        for (auto const& file : resources.files)
+        {
+            std::shared_ptr<mapnik::marker const> marker = mapnik::marker_cache::instance().find(file, true);
+            if (!marker || marker->is<mapnik::marker_null>()) missing_files.push_back(file);
+            else python_mapnik::cache_tracker::instance().add_marker(file, *marker);
+        }
+        markers_time = seconds_since(start);
+
+        start = clock::now();
+        for (layer const* lyr : layers)
+        {
+            if (!layer_visible(*lyr)) continue;
+            mapnik::datasource_ptr ds = lyr->datasource();
+            if (!ds) continue;
+            try
+            {
+                // a query on a tiny box opens connections and loads spatial indexes
+                box2d<double> extent = ds->envelope();
+                ds->get_descriptor();
+                if (ds->type() == mapnik::datasource::Vector && extent.valid())
+                {
+                    mapnik::coord2d center = extent.center();
+                    double eps = std::max(extent.width(), extent.height()) * 1e-9;
+                    mapnik::featureset_ptr fs = ds->features(mapnik::query(
+                        box2d<double>(center.x - eps, center.y - eps, center.x + eps, center.y + eps)));
+                    if (fs) fs->next();
+                }
+                ++datasources;
+            }
+            catch (std::exception const&)
+            {
+                failed_layers.push_back(lyr->name());
+            }
+        }
+        datasources_time = seconds_since(start);
+
+        start = clock::now();
+        std::set<std::string> srs;
+        for (layer const* lyr : layers)
+        {
+            if (layer_visible(*lyr) && lyr->srs() != m.srs()) srs.insert(lyr->srs());
+        }
+        for (auto const& layer_srs : srs)
+        {
+            try
+            {
+                mapnik::proj_transform_cache::init(m.srs(), layer_srs);
+                ++transforms;
+            }
+            catch (std::exception const&)
+            {
+                failed_srs.push_back(layer_srs);
+            }
+        }
+        projections_time = seconds_since(start);
+    }
+
+    auto step = [](std::size_t count, double time) {
+        py::dict d;
+        d["count"] = count;
+        d["seconds"] = time;
+        return d;
+    };
+    py::dict report;
+    py::dict fonts = step(resources.face_names.size() - missing_faces.size(), fonts_time);
+    fonts["missing"] = missing_faces;
+    py::dict markers = step(resources.files.size() - missing_files.size(), markers_time);
+    markers["missing"] = missing_files;
+    py::dict sources = step(datasources, datasources_time);
+    sources["failed"] = failed_layers;
+    report["fonts"] = fonts;
+    report["markers"] = markers;
+    report["datasources"] = sources;
+    py::dict projections = step(transforms, projections_time);
+    projections["failed"] = failed_srs;
+    report["projections"] = projections;
+    report["seconds"] = seconds_since(total_start);
+    return report;
+}
 
 } //namespace
 
@@ -281,6 +707,24 @@ void export_map(py::module const& m)
              py::arg("layer_idx"), py::arg("pixel_x"), py::arg("pixel_y")
             )
 
+        .def("query_points", query_points,
+             "Query many points, in the coordinates of the map projection,\n"
+             "against several layers at once. Each layer is queried once for\n"
+             "the extent covering all points; inactive layers are skipped and a\n"
+             "layer listed twice is queried once. Tolerance is given in pixels.\n"
+             "Returns, per point, a list of dicts with 'layer', 'id' and\n"
+             "'properties' of every feature hit.\n"
+             "\n"
+             "Usage:\n"
+             ">>> hits = m.query_points([(-122, 48), (-121, 47)], layers=['roads'])\n"
+             ">>> hits[0]\n"
+             "[{'layer': 'roads', 'id': 12, 'properties': {'name': 'Main St'}}]\n",
+             py::arg("points"),
+             py::arg("layers") = py::none(),
+             py::arg("tolerance") = 3.0,
+             py::arg("fields") = py::none()
+            )
+
         .def("query_point", query_point,
              "Query a Map Layer (by layer index) for features \n"
              "intersecting the given x,y location in the coordinates\n"
@@ -321,6 +765,59 @@ void export_map(py::module const& m)
              py::arg("width"), py::arg("height")
             )
 
+        .def("prefetch", &prefetch,
+             "Query all vector layer datasources concurrently and keep the\n"
+             "features in memory, so a following render does not wait on\n"
+             "each layer in turn. Defaults to the current buffered extent and\n"
+             "scale denominator. Renders outside the prefetched extent fall back\n"
+             "to the original datasources. Returns feature counts per layer.\n"
+             "\n"
+             "Usage:\n"
+             "\n"
+             ">>> m.prefetch(threads=8)\n"
+             ">>> render(m, im)\n"
+             ">>> m.clear_prefetch()\n",
+             py::arg("extent") = py::none(),
+             py::arg("scale_denominator") = py::none(),
+             py::arg("threads") = 0
+            )
+
+        .def("has_features", &map_has_features,
+             "Return True if any active, visible layer has features in the\n"
+             "current extent, buffered by the layer buffer_size or else the map\n"
+             "one. Checks layer envelopes and datasource indexes only, so it is\n"
+             "much cheaper than rendering.\n"
+             "\n"
+             "Usage:\n"
+             "\n"
+             ">>> m.has_features()\n"
+             "True\n"
+            )
+
+        .def("warmup", &warmup,
+             "Load the font faces, marker and pattern files, datasource connections\n"
+             "and projections the map references, so the first render is as fast\n"
+             "as the following ones. With scales, a list of scale denominators,\n"
+             "only layers and rules visible at one of them are considered.\n"
+             "Returns a report with counts and timings per step, plus the faces\n"
+             "and files that could not be loaded and layers that failed.\n"
+             "\n"
+             "Usage:\n"
+             "\n"
+             ">>> report = m.warmup()\n"
+             ">>> report['fonts']['missing']\n"
+             "[]\n",
+             py::arg("scales") = py::none()
+            )
+
+        .def("clear_prefetch", &clear_prefetch,
+             "Release prefetched features and restore the layer datasources.\n"
+             "\n"
+             "Usage:\n"
+             "\n"
+             ">>> m.clear_prefetch()\n"
+            )
+
         .def("scale", &Map::scale,
              "Return the Map Scale.\n"
              "Usage:\n"
@@ -35,6 +35,9 @@
 #include <mapnik/label_collision_detector.hpp>
 #include "mapnik_value_converter.hpp"
 #include "python_to_value.hpp"
+#include "create_datasource.hpp"
+#include "cache_tracker.hpp"
+#include "python_optional.hpp"
 
 #if defined(GRID_RENDERER)
 #include "python_grid_utils.hpp"
@@ -54,6 +57,7 @@
 //stl
 #include <stdexcept>
 #include <fstream>
+#include <iterator>
 
 //pybind11
 #include <pybind11/pybind11.h>
@@ -67,6 +71,51 @@ void clear_cache()
 #if defined(SHAPE_MEMORY_MAPPED_FILE)
     mapnik::mapped_memory_cache::instance().clear();
 #endif
+    python_mapnik::cache_tracker::instance().clear();
+}
+
+py::dict cache_stats()
+{
+    auto to_dict = [](python_mapnik::cache_tracker::cache_kind kind) {
+        python_mapnik::cache_tracker::stats stats = python_mapnik::cache_tracker::instance().get_stats(kind);
+        py::dict d;
+        d["entries"] = stats.entries;
+        d["bytes"] = stats.bytes;
+        d["evictions"] = stats.evictions;
+        d["budget"] = stats.budget;
+        return d;
+    };
+    py::dict result;
+    result["markers"] = to_dict(python_mapnik::cache_tracker::markers);
+    result["mapped_memory"] = to_dict(python_mapnik::cache_tracker::mapped_memory);
+    return result;
+}
+
+void set_cache_budget(boost::optional<std::size_t> const& markers, boost::optional<std::size_t> const& mapped_memory)
+{
+    py::gil_scoped_release release;
+    python_mapnik::cache_tracker & tracker = python_mapnik::cache_tracker::instance();
+    if (markers) tracker.set_budget(python_mapnik::cache_tracker::markers, *markers);
+    if (mapped_memory) tracker.set_budget(python_mapnik::cache_tracker::mapped_memory, *mapped_memory);
+}
+
+void track_cache_usage(bool enabled)
+{
+    py::gil_scoped_release release;
+    python_mapnik::cache_tracker::instance().set_enabled(enabled);
+}
+
+bool evict_cache(std::string const& path)
+{
+    py::gil_scoped_release release;
+    return python_mapnik::cache_tracker::instance().evict(path);
+}
+
+// Accounts the cache entries used by a render when tracking is on, called with
+// the GIL released
+void track_cache_use(mapnik::Map const& map, double scale_factor, mapnik::layer const* layer = nullptr)
+{
+    python_mapnik::cache_tracker::instance().track(map, map.scale_denominator() * scale_factor, layer);
 }
 
 struct agg_renderer_visitor_1
@@ -188,6 +237,7 @@ void render(mapnik::Map const& map,
 {
     py::gil_scoped_release release;
     mapnik::util::apply_visitor(agg_renderer_visitor_1(map, scale_factor, offset_x, offset_y), image);
+    track_cache_use(map, scale_factor);
 }
 
 void render_with_vars(mapnik::Map const& map,
@@ -202,6 +252,7 @@ void render_with_vars(mapnik::Map const& map,
     req.set_buffer_size(map.buffer_size());
     py::gil_scoped_release release;
     mapnik::util::apply_visitor(agg_renderer_visitor_3(map, req, vars, scale_factor, offset_x, offset_y), image);
+    track_cache_use(map, scale_factor);
 }
 
 void render_with_detector(
@@ -214,6 +265,7 @@ void render_with_detector(
 {
     py::gil_scoped_release release;
     mapnik::util::apply_visitor(agg_renderer_visitor_2(map, detector, scale_factor, offset_x, offset_y), image);
+    track_cache_use(map, scale_factor);
 }
 
 void render_layer2(mapnik::Map const& map,
@@ -236,6 +288,7 @@ void render_layer2(mapnik::Map const& map,
     mapnik::layer const& layer = layers[layer_idx];
     std::set<std::string> names;
     mapnik::util::apply_visitor(agg_renderer_visitor_4(map, scale_factor, offset_x, offset_y, layer, names), image);
+    track_cache_use(map, scale_factor, &layer);
 }
 
 #if defined(HAVE_CAIRO) && defined(HAVE_PYCAIRO)
@@ -250,6 +303,7 @@ void render3(mapnik::Map const& map,
     mapnik::cairo_surface_ptr surface(cairo_surface_reference(py_surface->surface), mapnik::cairo_surface_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map,mapnik::create_context(surface),scale_factor,offset_x,offset_y);
     ren.apply();
+    track_cache_use(map, scale_factor);
 }
 
 void render4(mapnik::Map const& map, PycairoSurface* py_surface)
@@ -258,6 +312,7 @@ void render4(mapnik::Map const& map, PycairoSurface* py_surface)
     mapnik::cairo_surface_ptr surface(cairo_surface_reference(py_surface->surface), mapnik::cairo_surface_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map,mapnik::create_context(surface));
     ren.apply();
+    track_cache_use(map, 1.0);
 }
 
 void render5(mapnik::Map const& map,
@@ -270,6 +325,7 @@ void render5(mapnik::Map const& map,
     mapnik::cairo_ptr context(cairo_reference(py_context->ctx), mapnik::cairo_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map,context,scale_factor,offset_x, offset_y);
     ren.apply();
+    track_cache_use(map, scale_factor);
 }
 
 void render6(mapnik::Map const& map, PycairoContext* py_context)
@@ -278,6 +334,7 @@ void render6(mapnik::Map const& map, PycairoContext* py_context)
     mapnik::cairo_ptr context(cairo_reference(py_context->ctx), mapnik::cairo_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map,context);
     ren.apply();
+    track_cache_use(map, 1.0);
 }
 void render_with_detector2(
     mapnik::Map const& map,
@@ -288,6 +345,7 @@ void render_with_detector2(
     mapnik::cairo_ptr context(cairo_reference(py_context->ctx), mapnik::cairo_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map,context,detector);
     ren.apply();
+    track_cache_use(map, 1.0);
 }
 
 void render_with_detector3(
@@ -302,6 +360,7 @@ void render_with_detector3(
     mapnik::cairo_ptr context(cairo_reference(py_context->ctx), mapnik::cairo_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map,context,detector,scale_factor,offset_x,offset_y);
     ren.apply();
+    track_cache_use(map, scale_factor);
 }
 
 void render_with_detector4(
@@ -313,6 +372,7 @@ void render_with_detector4(
     mapnik::cairo_surface_ptr surface(cairo_surface_reference(py_surface->surface), mapnik::cairo_surface_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map, mapnik::create_context(surface), detector);
     ren.apply();
+    track_cache_use(map, 1.0);
 }
 
 void render_with_detector5(
@@ -327,6 +387,7 @@ void render_with_detector5(
     mapnik::cairo_surface_ptr surface(cairo_surface_reference(py_surface->surface), mapnik::cairo_surface_closer());
     mapnik::cairo_renderer<mapnik::cairo_ptr> ren(map, mapnik::create_context(surface), detector, scale_factor, offset_x, offset_y);
     ren.apply();
+    track_cache_use(map, scale_factor);
 }
 
 #endif
@@ -347,6 +408,7 @@ void render_to_file1(mapnik::Map const& map,
         iter_type output_stream_iterator(file);
         mapnik::svg_renderer<iter_type> ren(map,output_stream_iterator);
         ren.apply();
+        track_cache_use(map, 1.0);
 #else
         throw mapnik::image_writer_exception("SVG backend not available, cannot write to format: " + format);
 #endif
@@ -355,6 +417,7 @@ void render_to_file1(mapnik::Map const& map,
     {
 #if defined(HAVE_CAIRO)
         mapnik::save_to_cairo_file(map,filename,format,1.0);
+        track_cache_use(map, 1.0);
 #else
         throw mapnik::image_writer_exception("Cairo backend not available, cannot write to format: " + format);
 #endif
@@ -374,6 +437,7 @@ void render_to_file2(mapnik::Map const& map,std::string const& filename)
     {
 #if defined(HAVE_CAIRO)
         mapnik::save_to_cairo_file(map,filename,format,1.0);
+        track_cache_use(map, 1.0);
 #else
         throw mapnik::image_writer_exception("Cairo backend not available, cannot write to format: " + format);
 #endif
@@ -403,6 +467,7 @@ void render_to_file3(mapnik::Map const& map,
         iter_type output_stream_iterator(file);
         mapnik::svg_renderer<iter_type> ren(map,output_stream_iterator,scale_factor);
         ren.apply();
+        track_cache_use(map, scale_factor);
 #else
         throw mapnik::image_writer_exception("SVG backend not available, cannot write to format: " + format);
 #endif
@@ -411,6 +476,7 @@ void render_to_file3(mapnik::Map const& map,
     {
 #if defined(HAVE_CAIRO)
         mapnik::save_to_cairo_file(map,filename,format,scale_factor);
+        track_cache_use(map, scale_factor);
 #else
         throw mapnik::image_writer_exception("Cairo backend not available, cannot write to format: " + format);
 #endif
@@ -540,13 +606,17 @@ void export_coord(py::module const&);
 void export_envelope(py::module const&);
 void export_gamma_method(py::module const&);
 void export_geometry(py::module const&);
-void export_feature(py::module const&);
+void export_geometry_array(py::module const&);
+void export_feature(py::module&); // non-const because of m.def(..)
 void export_featureset(py::module const&);
 void export_font_engine(py::module const&);
 void export_fontset(py::module const&);
 void export_expression(py::module const&);
 void export_datasource(py::module&); // non-const because of m.def(..)
 void export_datasource_cache(py::module const&);
+void export_index(py::module&); // non-const because of m.def(..)
+void export_python_datasource(py::module const&);
+void export_caching_datasource(py::module const&);
 #if defined(GRID_RENDERER)
 void export_grid(py::module const&);
 void export_grid_view(py::module const&);
@@ -582,8 +652,41 @@ void export_shield_symbolizer(py::module const&);
 void export_group_symbolizer(py::module const&);
 void export_building_symbolizer(py::module const&);
 
-using mapnik::load_map;
-using mapnik::load_map_string;
+// With datasource sharing enabled, layers loaded from XML that describe the
+// same datasource end up pointing at a single shared instance.
+void share_layer_datasources(mapnik::Map & map)
+{
+    shared_datasource_cache & cache = shared_datasource_cache::instance();
+    if (!cache.enabled()) return;
+    for (auto & lyr : map.layers())
+    {
+        auto ds = lyr.datasource();
+        if (!ds) continue;
+        auto shared = cache.share(ds);
+        if (shared != ds) lyr.set_datasource(shared);
+    }
+}
+
+void load_map(mapnik::Map & map, std::string const& filename, bool strict, std::string const& base_path)
+{
+    lazy_plugins & plugins = lazy_plugins::instance();
+    if (!plugins.empty())
+    {
+        std::ifstream file(filename, std::ios::binary);
+        std::string xml((std::istreambuf_iterator<char>(file)), std::istreambuf_iterator<char>());
+        plugins.ensure_xml(xml);
+    }
+    mapnik::load_map(map, filename, strict, base_path);
+    share_layer_datasources(map);
+}
+
+void load_map_string(mapnik::Map & map, std::string const& str, bool strict, std::string const& base_path)
+{
+    lazy_plugins::instance().ensure_xml(str);
+    mapnik::load_map_string(map, str, strict, base_path);
+    share_layer_datasources(map);
+}
+
 using mapnik::save_map;
 using mapnik::save_map_to_string;
 
@@ -594,6 +697,7 @@ PYBIND11_MODULE(_mapnik, m) {
     export_coord(m);
     export_envelope(m);
     export_geometry(m);
+    export_geometry_array(m);
     export_gamma_method(m);
     export_feature(m);
     export_featureset(m);
@@ -602,6 +706,9 @@ PYBIND11_MODULE(_mapnik, m) {
     export_expression(m);
     export_datasource(m);
     export_datasource_cache(m);
+    export_index(m);
+    export_python_datasource(m);
+    export_caching_datasource(m);
 #if defined(GRID_RENDERER)
     export_grid(m);
     export_grid_view(m);
@@ -840,6 +947,60 @@ PYBIND11_MODULE(_mapnik, m) {
           ">>> from mapnik import clear_cache\n"
           ">>> clear_cache()\n");
 
+    m.def("cache_stats", &cache_stats,
+          "\n"
+          "Return entry counts, sizes in bytes, eviction counters and budgets of\n"
+          "the marker and mapped memory caches.\n"
+          "Accounting only happens while track_cache_usage(True) is in effect or a\n"
+          "budget is set. Markers and patterns with a static file path are then\n"
+          "accounted for when a map using them is rendered or warmed up, files of\n"
+          "file based datasources once mapnik has memory mapped them. Raster markers\n"
+          "count their decoded size, SVG markers the size of their source.\n"
+          "\n"
+          "Usage:\n"
+          ">>> from mapnik import cache_stats, track_cache_usage\n"
+          ">>> track_cache_usage(True)\n"
+          ">>> cache_stats()['markers']['bytes']\n"
+          "0\n");
+
+    m.def("track_cache_usage", &track_cache_usage,
+          "\n"
+          "Turn accounting of the marker and mapped memory caches on or off.\n"
+          "Accounting stays on while a budget is set. Entries already accounted\n"
+          "for are kept when it is turned off.\n"
+          "\n"
+          "Usage:\n"
+          ">>> from mapnik import track_cache_usage\n"
+          ">>> track_cache_usage(True)\n",
+          py::arg("enabled") = true);
+
+    m.def("set_cache_budget", &set_cache_budget,
+          "\n"
+          "Cap the bytes held by the marker and/or mapped memory caches. The least\n"
+          "recently used entries are evicted once a budget is exceeded, 0 removes\n"
+          "the budget and None leaves it unchanged. A budget turns accounting on.\n"
+          "Mapped memory regions are evicted one by one. The marker cache can only\n"
+          "be cleared as a whole, so evicting markers puts back the accounted\n"
+          "markers that are kept and markers from paths built with feature\n"
+          "attributes are reloaded on their next use.\n"
+          "\n"
+          "Usage:\n"
+          ">>> from mapnik import set_cache_budget\n"
+          ">>> set_cache_budget(markers=64 * 1024 * 1024)\n",
+          py::arg("markers") = py::none(),
+          py::arg("mapped_memory") = py::none());
+
+    m.def("evict_cache", &evict_cache,
+          "\n"
+          "Evict the marker or mapped memory region cached for path.\n"
+          "Returns True if path was an accounted cache entry.\n"
+          "\n"
+          "Usage:\n"
+          ">>> from mapnik import evict_cache\n"
+          ">>> evict_cache('/data/icons/marker.svg')\n"
+          "False\n",
+          py::arg("path"));
+
 
     m.def("render_to_file",&render_to_file1,
           "\n"
@@ -0,0 +1,509 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/datasource.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/feature_factory.hpp>
+#include <mapnik/feature_layer_desc.hpp>
+#include <mapnik/featureset.hpp>
+#include <mapnik/geometry/box2d.hpp>
+#include <mapnik/query.hpp>
+#include <mapnik/wkb.hpp>
+#include "mapnik_value_converter.hpp"
+#include "feature_id_lookup.hpp"
+// stl
+#include <memory>
+#include <set>
+#include <stdexcept>
+#include <string>
+#include <vector>
+//pybind11
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
+namespace {
+
+// A batch of features copied out of Python objects while holding the GIL.
+// Everything in here is plain C++ so features can be built with the GIL released.
+struct feature_batch
+{
+    std::vector<std::string> wkb;
+    std::vector<bool> has_geometry;
+    std::vector<mapnik::value_integer> ids;
+    std::vector<std::string> names;
+    std::vector<std::vector<mapnik::value>> columns;
+};
+
+py::object as_sequence(py::handle obj)
+{
+    if (py::hasattr(obj, "to_pylist")) // pyarrow.Array / ChunkedArray
+    {
+        return obj.attr("to_pylist")();
+    }
+    return py::reinterpret_borrow<py::object>(obj);
+}
+
+void read_wkb_column(py::handle seq, feature_batch & batch)
+{
+    py::object items = as_sequence(seq);
+    std::size_t size = py::len(items);
+    batch.wkb.reserve(size);
+    batch.has_geometry.reserve(size);
+    for (auto item : items)
+    {
+        if (item.is_none())
+        {
+            batch.wkb.emplace_back();
+            batch.has_geometry.push_back(false);
+            continue;
+        }
+        py::buffer_info info = py::reinterpret_borrow<py::buffer>(item).request();
+        batch.wkb.emplace_back(static_cast<char const*>(info.ptr), static_cast<std::size_t>(info.size * info.itemsize));
+        batch.has_geometry.push_back(true);
+    }
+}
+
+void read_ids(py::handle seq, feature_batch & batch)
+{
+    py::object items = as_sequence(seq);
+    batch.ids.reserve(py::len(items));
+    for (auto item : items)
+    {
+        batch.ids.push_back(item.cast<mapnik::value_integer>());
+    }
+}
+
+void read_column(std::string const& name, py::handle seq, feature_batch & batch,
+                 std::set<std::string> const& names)
+{
+    if (names.find(name) == names.end()) return;
+    py::object items = as_sequence(seq);
+    std::vector<mapnik::value> values;
+    values.reserve(py::len(items));
+    for (auto item : items)
+    {
+        if (item.is_none() || py::isinstance<py::str>(item) || py::isinstance<py::bool_>(item) ||
+            py::isinstance<py::int_>(item) || py::isinstance<py::float_>(item))
+        {
+            values.push_back(item.cast<mapnik::value>());
+        }
+        else
+        {
+            values.push_back(py::str(item).cast<mapnik::value>());
+        }
+    }
+    batch.names.push_back(name);
+    batch.columns.push_back(std::move(values));
+}
+
+// Batches are either pyarrow RecordBatches (a binary WKB geometry column plus
+// attribute columns) or mappings of the form
+//   {'wkb': [bytes, ...], 'columns': {'name': [values, ...]}, 'ids': [int, ...]}
+void read_batch(py::handle obj, std::string const& geometry_field,
+                std::set<std::string> const& names, feature_batch & batch)
+{
+    if (py::hasattr(obj, "column_names") && py::hasattr(obj, "num_rows"))
+    {
+        for (auto name : obj.attr("column_names"))
+        {
+            std::string column_name = name.cast<std::string>();
+            py::object column = obj.attr("column")(name);
+            if (column_name == geometry_field) read_wkb_column(column, batch);
+            else if (column_name == "__id__") read_ids(column, batch);
+            else read_column(column_name, column, batch, names);
+        }
+    }
+    else if (py::isinstance<py::dict>(obj))
+    {
+        py::dict d = py::reinterpret_borrow<py::dict>(obj);
+        if (!d.contains("wkb"))
+        {
+            throw std::runtime_error("PythonDatasource: feature batch is missing the 'wkb' sequence");
+        }
+        read_wkb_column(d["wkb"], batch);
+        if (d.contains("ids")) read_ids(d["ids"], batch);
+        if (d.contains("columns"))
+        {
+            for (auto item : py::reinterpret_borrow<py::dict>(d["columns"]))
+            {
+                read_column(item.first.cast<std::string>(), item.second, batch, names);
+            }
+        }
+    }
+    else
+    {
+        throw std::runtime_error("PythonDatasource: expected a dict or a pyarrow.RecordBatch per feature batch");
+    }
+
+    std::size_t size = batch.wkb.size();
+    if (!batch.ids.empty() && batch.ids.size() != size)
+    {
+        throw std::runtime_error("PythonDatasource: 'ids' length does not match number of geometries");
+    }
+    for (auto const& column : batch.columns)
+    {
+        if (column.size() != size)
+        {
+            throw std::runtime_error("PythonDatasource: attribute column length does not match number of geometries");
+        }
+    }
+}
+
+class python_featureset : public mapnik::Featureset
+{
+  public:
+    // requested_ids, when given, are the only ids batches may carry and each
+    // batch must carry them: used for features_by_ids pushdown
+    python_featureset(py::object iterator, std::set<std::string> const& names, std::string const& geometry_field,
+                      std::set<mapnik::value_integer> requested_ids = std::set<mapnik::value_integer>(),
+                      bool check_ids = false)
+        : iterator_(std::move(iterator)),
+          names_(names),
+          geometry_field_(geometry_field),
+          requested_ids_(std::move(requested_ids)),
+          check_ids_(check_ids) {}
+
+    ~python_featureset()
+    {
+        if (iterator_ && Py_IsInitialized())
+        {
+            py::gil_scoped_acquire gil;
+            iterator_ = py::object();
+        }
+        else
+        {
+            // the interpreter is gone, leak the reference rather than decref without it
+            iterator_.release();
+        }
+    }
+
+    mapnik::feature_ptr next() override
+    {
+        while (pos_ >= features_.size())
+        {
+            if (!fetch_batch()) return mapnik::feature_ptr();
+        }
+        return features_[pos_++];
+    }
+
+  private:
+    // The GIL is only held while pulling the next batch from the Python iterator
+    // and copying it into C++ containers, never while decoding individual features.
+    bool fetch_batch()
+    {
+        feature_batch batch;
+        {
+            py::gil_scoped_acquire gil;
+            if (!iterator_) return false;
+            try
+            {
+                PyObject* item = PyIter_Next(iterator_.ptr());
+                if (item == nullptr)
+                {
+                    iterator_ = py::object();
+                    if (PyErr_Occurred()) throw py::error_already_set();
+                    return false;
+                }
+                read_batch(py::reinterpret_steal<py::object>(item), geometry_field_, names_, batch);
+                if (check_ids_) check_ids(batch);
+            }
+            catch (py::error_already_set & ex)
+            {
+                iterator_ = py::object();
+                throw std::runtime_error(std::string("PythonDatasource: ") + ex.what());
+            }
+            catch (...)
+            {
+                iterator_ = py::object();
+                throw;
+            }
+        }
+
+        // iterating from Python holds the GIL, drop it while decoding
+        std::unique_ptr<py::gil_scoped_release> release;
+        if (PyGILState_Check()) release = std::make_unique<py::gil_scoped_release>();
+
+        features_.clear();
+        features_.reserve(batch.wkb.size());
+        pos_ = 0;
+        mapnik::context_ptr ctx = std::make_shared<mapnik::context_type>();
+        for (auto const& name : batch.names) ctx->push(name);
+        for (std::size_t i = 0; i < batch.wkb.size(); ++i)
+        {
+            mapnik::value_integer id = batch.ids.empty() ? ++next_id_ : batch.ids[i];
+            mapnik::feature_ptr feature(mapnik::feature_factory::create(ctx, id));
+            if (batch.has_geometry[i])
+            {
+                feature->set_geometry(mapnik::geometry_utils::from_wkb(batch.wkb[i].data(), batch.wkb[i].size()));
+            }
+            for (std::size_t j = 0; j < batch.names.size(); ++j)
+            {
+                feature->put(batch.names[j], batch.columns[j][i]);
+            }
+            features_.push_back(std::move(feature));
+        }
+        return true;
+    }
+
+    void check_ids(feature_batch const& batch) const
+    {
+        if (batch.ids.empty() && !batch.wkb.empty())
+        {
+            throw std::runtime_error("PythonDatasource: features_by_ids batches must carry 'ids'");
+        }
+        for (auto id : batch.ids)
+        {
+            if (requested_ids_.find(id) == requested_ids_.end())
+            {
+                throw std::runtime_error("PythonDatasource: features_by_ids returned id " + std::to_string(id) +
+                                         " which was not requested");
+            }
+        }
+    }
+
+    py::object iterator_;
+    std::set<std::string> names_;
+    std::string geometry_field_;
+    std::set<mapnik::value_integer> requested_ids_;
+    bool check_ids_;
+    std::vector<mapnik::feature_ptr> features_;
+    std::size_t pos_ = 0;
+    mapnik::value_integer next_id_ = 0;
+};
+
+class python_datasource : public mapnik::datasource, public python_mapnik::feature_id_lookup
+{
+    using geometry_type_result = decltype(std::declval<mapnik::datasource const&>().get_geometry_type());
+  public:
+    python_datasource(py::object provider,
+                      mapnik::box2d<double> const& envelope,
+                      geometry_type_result geometry_type,
+                      mapnik::datasource::datasource_t type,
+                      mapnik::layer_descriptor const& desc,
+                      std::string const& geometry_field,
+                      mapnik::parameters const& params)
+        : mapnik::datasource(params),
+          provider_(std::move(provider)),
+          envelope_(envelope),
+          geometry_type_(geometry_type),
+          type_(type),
+          desc_(desc),
+          geometry_field_(geometry_field) {}
+
+    ~python_datasource()
+    {
+        if (provider_ && Py_IsInitialized())
+        {
+            py::gil_scoped_acquire gil;
+            provider_ = py::object();
+        }
+        else
+        {
+            provider_.release();
+        }
+    }
+
+    mapnik::datasource::datasource_t type() const override
+    {
+        return type_;
+    }
+
+    mapnik::box2d<double> envelope() const override
+    {
+        return envelope_;
+    }
+
+    geometry_type_result get_geometry_type() const override
+    {
+        return geometry_type_;
+    }
+
+    mapnik::layer_descriptor get_descriptor() const override
+    {
+        return desc_;
+    }
+
+    mapnik::featureset_ptr features(mapnik::query const& q) const override
+    {
+        py::gil_scoped_acquire gil;
+        try
+        {
+            return make_featureset(provider_.attr("features")(q), q.property_names());
+        }
+        catch (py::error_already_set & ex)
+        {
+            throw std::runtime_error(std::string("PythonDatasource: ") + ex.what());
+        }
+    }
+
+    // Pushed down to the provider when it implements features_by_ids(ids, names).
+    mapnik::featureset_ptr features_by_ids(std::vector<mapnik::value_integer> const& ids,
+                                           std::set<std::string> const& names) const override
+    {
+        py::gil_scoped_acquire gil;
+        if (!py::hasattr(provider_, "features_by_ids")) return mapnik::featureset_ptr();
+        try
+        {
+            std::set<mapnik::value_integer> requested(ids.begin(), ids.end());
+            return make_featureset(provider_.attr("features_by_ids")(ids, names), names, std::move(requested), true);
+        }
+        catch (py::error_already_set & ex)
+        {
+            throw std::runtime_error(std::string("PythonDatasource: ") + ex.what());
+        }
+    }
+
+    mapnik::featureset_ptr features_at_point(mapnik::coord2d const& pt, double tol) const override
+    {
+        mapnik::box2d<double> box(pt.x - tol, pt.y - tol, pt.x + tol, pt.y + tol);
+        mapnik::query q(box);
+        for (auto const& attr : desc_.get_descriptors())
+        {
+            q.add_property_name(attr.get_name());
+        }
+        return features(q);
+    }
+
+    py::object provider() const
+    {
+        return provider_;
+    }
+
+  private:
+    // Normalizes the provider's answer into a featureset, the GIL must be held.
+    mapnik::featureset_ptr make_featureset(py::object result, std::set<std::string> const& names,
+                                           std::set<mapnik::value_integer> requested_ids = std::set<mapnik::value_integer>(),
+                                           bool check_ids = false) const
+    {
+        if (result.is_none()) return std::make_shared<mapnik::empty_featureset>();
+        if (py::hasattr(result, "to_batches")) // pyarrow.Table
+        {
+            result = result.attr("to_batches")();
+        }
+        else if (py::hasattr(result, "column_names") || py::isinstance<py::dict>(result))
+        {
+            // a single batch
+            py::list batches;
+            batches.append(result);
+            result = batches;
+        }
+        return std::make_shared<python_featureset>(py::iter(result), names, geometry_field_,
+                                                   std::move(requested_ids), check_ids);
+    }
+
+    py::object provider_;
+    mapnik::box2d<double> envelope_;
+    geometry_type_result geometry_type_;
+    mapnik::datasource::datasource_t type_;
+    mapnik::layer_descriptor desc_;
+    std::string geometry_field_;
+};
+
+unsigned field_type(std::string const& name)
+{
+    if (name == "int") return mapnik::Integer;
+    if (name == "float") return mapnik::Double;
+    if (name == "bool") return mapnik::Boolean;
+    if (name == "str") return mapnik::String;
+    throw std::runtime_error("PythonDatasource: unknown field type '" + name + "', expected one of int, float, bool or str");
+}
+
+std::shared_ptr<python_datasource> create_python_datasource(py::object const& provider,
+                                                            mapnik::box2d<double> const& envelope,
+                                                            py::object const& geometry_type,
+                                                            mapnik::datasource::datasource_t type,
+                                                            py::object const& fields,
+                                                            std::string const& geometry_field)
+{
+    if (!py::hasattr(provider, "features"))
+    {
+        throw std::runtime_error("PythonDatasource: provider must implement features(query)");
+    }
+    mapnik::parameters params;
+    params["type"] = std::string("python");
+    mapnik::layer_descriptor desc("python", "utf-8");
+    if (py::isinstance<py::dict>(fields))
+    {
+        for (auto item : py::reinterpret_borrow<py::dict>(fields))
+        {
+            desc.add_descriptor(mapnik::attribute_descriptor(item.first.cast<std::string>(),
+                                                             field_type(item.second.cast<std::string>())));
+        }
+    }
+    else if (!fields.is_none())
+    {
+        for (auto name : fields)
+        {
+            desc.add_descriptor(mapnik::attribute_descriptor(name.cast<std::string>(), mapnik::String));
+        }
+    }
+    decltype(std::declval<mapnik::datasource const&>().get_geometry_type()) geom_type;
+    if (!geometry_type.is_none())
+    {
+        geom_type = geometry_type.cast<mapnik::datasource_geometry_t>();
+    }
+    return std::make_shared<python_datasource>(provider, envelope, geom_type, type, desc, geometry_field, params);
+}
+
+} // namespace
+
+void export_python_datasource(py::module const& m)
+{
+    py::class_<python_datasource, mapnik::datasource, std::shared_ptr<python_datasource>>
+        (m, "PythonDatasource",
+         "A datasource whose features are computed in Python.\n"
+         "\n"
+         "The provider object must implement features(query) returning an\n"
+         "iterable of feature batches. A batch is either a dict:\n"
+         "\n"
+         "  {'wkb': [bytes, ...], 'columns': {'name': [values, ...]}, 'ids': [int, ...]}\n"
+         "\n"
+         "or a pyarrow RecordBatch (or Table) with a binary WKB geometry column.\n"
+         "Providers may also implement features_by_ids(ids, names) returning\n"
+         "batches (with 'ids') for Datasource.features_by_ids lookups.\n"
+         "The GIL is only acquired between batches while rendering.\n"
+         "\n"
+         "Usage:\n"
+         ">>> class Points:\n"
+         "...     def features(self, query):\n"
+         "...         yield {'wkb': [Geometry.from_wkt('POINT (5 6)').to_wkb(wkbByteOrder.NDR)],\n"
+         "...                'columns': {'label': ['foo-bar']}}\n"
+         ">>> ds = PythonDatasource(Points(), Box2d(0,-10,100,110), fields=['label'])\n"
+         ">>> lyr = Layer('python')\n"
+         ">>> lyr.datasource = ds\n")
+        .def(py::init(&create_python_datasource),
+             py::arg("provider"),
+             py::arg("envelope"),
+             py::arg("geometry_type") = py::none(),
+             py::arg("data_type") = mapnik::datasource::Vector,
+             py::arg("fields") = py::none(),
+             py::arg("geometry_field") = "geometry")
+        .def_property_readonly("provider", &python_datasource::provider,
+                               "The Python object providing the features")
+        ;
+
+    py::implicitly_convertible<python_datasource, mapnik::datasource>();
+}
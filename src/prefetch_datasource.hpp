@@ -0,0 +1,103 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_PREFETCH_DATASOURCE_HPP
+#define MAPNIK_PYTHON_PREFETCH_DATASOURCE_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/datasource.hpp>
+#include <mapnik/query.hpp>
+#include "vector_featureset.hpp"
+// stl
+#include <memory>
+
+namespace python_mapnik {
+
+// Wraps a layer datasource together with features fetched ahead of rendering.
+// Queries that fall inside the prefetched extent are answered from memory,
+// anything else goes to the wrapped datasource.
+class prefetched_datasource : public mapnik::datasource
+{
+    using geometry_type_result = decltype(std::declval<mapnik::datasource const&>().get_geometry_type());
+  public:
+    prefetched_datasource(mapnik::datasource_ptr inner,
+                          mapnik::box2d<double> const& bbox,
+                          std::shared_ptr<feature_vector const> features)
+        : mapnik::datasource(inner->params()),
+          inner_(std::move(inner)),
+          bbox_(bbox),
+          features_(std::move(features)) {}
+
+    mapnik::datasource::datasource_t type() const override
+    {
+        return inner_->type();
+    }
+
+    mapnik::box2d<double> envelope() const override
+    {
+        return inner_->envelope();
+    }
+
+    geometry_type_result get_geometry_type() const override
+    {
+        return inner_->get_geometry_type();
+    }
+
+    mapnik::layer_descriptor get_descriptor() const override
+    {
+        return inner_->get_descriptor();
+    }
+
+    mapnik::featureset_ptr features(mapnik::query const& q) const override
+    {
+        if (bbox_.contains(q.get_bbox()))
+        {
+            return std::make_shared<vector_featureset>(features_, q.get_bbox());
+        }
+        return inner_->features(q);
+    }
+
+    mapnik::featureset_ptr features_at_point(mapnik::coord2d const& pt, double tol) const override
+    {
+        return inner_->features_at_point(pt, tol);
+    }
+
+    mapnik::datasource_ptr inner() const
+    {
+        return inner_;
+    }
+
+    std::size_t size() const
+    {
+        return features_->size();
+    }
+
+  private:
+    mapnik::datasource_ptr inner_;
+    mapnik::box2d<double> bbox_;
+    std::shared_ptr<feature_vector const> features_;
+};
+
+} // namespace python_mapnik
+
+#endif //MAPNIK_PYTHON_PREFETCH_DATASOURCE_HPP
@@ -0,0 +1,141 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_THREAD_POOL_HPP
+#define MAPNIK_PYTHON_THREAD_POOL_HPP
+
+// stl
+#include <algorithm>
+#include <atomic>
+#include <condition_variable>
+#include <cstddef>
+#include <deque>
+#include <exception>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+namespace python_mapnik {
+
+inline std::size_t default_concurrency(std::size_t requested)
+{
+    if (requested > 0) return requested;
+    std::size_t hw = std::thread::hardware_concurrency();
+    return hw > 0 ? hw : 1;
+}
+
+// Calls fn(i) for every i in [0, count) using at most `threads` worker threads.
+// The first exception thrown by any task is rethrown on the calling thread once
+// all workers have finished. Callers are expected to release the GIL beforehand.
+template <typename Fn>
+void parallel_for(std::size_t count, std::size_t threads, Fn && fn)
+{
+    threads = std::min(default_concurrency(threads), count);
+    if (threads <= 1)
+    {
+        for (std::size_t i = 0; i < count; ++i) fn(i);
+        return;
+    }
+    std::atomic<std::size_t> next(0);
+    std::exception_ptr error;
+    std::mutex error_mutex;
+    auto worker = [&]() {
+        for (std::size_t i = next++; i < count; i = next++)
+        {
+            try
+            {
+                fn(i);
+            }
+            catch (...)
+            {
+                std::lock_guard<std::mutex> lock(error_mutex);
+                if (!error) error = std::current_exception();
+            }
+        }
+    };
+    std::vector<std::thread> pool;
+    pool.reserve(threads - 1);
+    for (std::size_t i = 1; i < threads; ++i) pool.emplace_back(worker);
+    worker();
+    for (auto & t : pool) t.join();
+    if (error) std::rethrow_exception(error);
+}
+
+// Process-wide pool of detached worker threads for background tasks that
+// outlive the calling Python frame (async feature streaming). Tasks must not
+// throw and must acquire the GIL themselves before touching Python objects.
+// The pool is never destroyed so that workers don't race interpreter shutdown.
+class task_pool
+{
+  public:
+    static task_pool & instance()
+    {
+        static task_pool * pool = new task_pool(default_concurrency(0));
+        return *pool;
+    }
+
+    void submit(std::function<void()> task)
+    {
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            tasks_.push_back(std::move(task));
+        }
+        cv_.notify_one();
+    }
+
+    std::size_t size() const { return threads_; }
+
+  private:
+    explicit task_pool(std::size_t threads)
+        : threads_(threads)
+    {
+        for (std::size_t i = 0; i < threads; ++i)
+        {
+            std::thread([this]() { run(); }).detach();
+        }
+    }
+
+    void run()
+    {
+        for (;;)
+        {
+            std::function<void()> task;
+            {
+                std::unique_lock<std::mutex> lock(mutex_);
+                cv_.wait(lock, [this]() { return !tasks_.empty(); });
+                task = std::move(tasks_.front());
+                tasks_.pop_front();
+            }
+            task();
+        }
+    }
+
+    std::size_t threads_;
+    std::mutex mutex_;
+    std::condition_variable cv_;
+    std::deque<std::function<void()>> tasks_;
+};
+
+} // namespace python_mapnik
+
+#endif //MAPNIK_PYTHON_THREAD_POOL_HPP
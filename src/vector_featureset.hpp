@@ -0,0 +1,84 @@
+/*****************************************************************************
+ *
+ * This file is part of Mapnik (c++ mapping toolkit)
+ *
+ * Copyright (C) 2024 Artem Pavlenko
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Lesser General Public
+ * License as published by the Free Software Foundation; either
+ * version 2.1 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Lesser General Public License for more details.
+ *
+ * You should have received a copy of the GNU Lesser General Public
+ * License along with this library; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ *****************************************************************************/
+
+#ifndef MAPNIK_PYTHON_VECTOR_FEATURESET_HPP
+#define MAPNIK_PYTHON_VECTOR_FEATURESET_HPP
+
+// mapnik
+#include <mapnik/config.hpp>
+#include <mapnik/feature.hpp>
+#include <mapnik/featureset.hpp>
+#include <mapnik/geometry/box2d.hpp>
+// stl
+#include <memory>
+#include <vector>
+
+namespace python_mapnik {
+
+using feature_vector = std::vector<mapnik::feature_ptr>;
+
+// Drains a featureset into memory.
+inline std::shared_ptr<feature_vector> read_features(mapnik::featureset_ptr const& fs)
+{
+    auto features = std::make_shared<feature_vector>();
+    if (!fs) return features;
+    for (mapnik::feature_ptr feature = fs->next(); feature; feature = fs->next())
+    {
+        features->push_back(std::move(feature));
+    }
+    return features;
+}
+
+// Featureset over features held in memory, optionally filtered by a bounding box.
+// The features are shared, not copied, so many featuresets can iterate the same vector.
+class vector_featureset : public mapnik::Featureset
+{
+  public:
+    explicit vector_featureset(std::shared_ptr<feature_vector const> features)
+        : features_(std::move(features)),
+          bbox_check_(false) {}
+
+    vector_featureset(std::shared_ptr<feature_vector const> features, mapnik::box2d<double> const& bbox)
+        : features_(std::move(features)),
+          bbox_(bbox),
+          bbox_check_(true) {}
+
+    mapnik::feature_ptr next() override
+    {
+        while (pos_ < features_->size())
+        {
+            mapnik::feature_ptr const& feature = (*features_)[pos_++];
+            if (!bbox_check_ || bbox_.intersects(feature->envelope())) return feature;
+        }
+        return mapnik::feature_ptr();
+    }
+
+  private:
+    std::shared_ptr<feature_vector const> features_;
+    mapnik::box2d<double> bbox_;
+    bool bbox_check_;
+    std::size_t pos_ = 0;
+};
+
+} // namespace python_mapnik
+
+#endif //MAPNIK_PYTHON_VECTOR_FEATURESET_HPP
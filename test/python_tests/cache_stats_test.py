@@ -0,0 +1,110 @@
+import mapnik
+import pytest
+
+
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">'
+       '<circle cx="5" cy="5" r="4" fill="red"/></svg>')
+
+
+@pytest.fixture
+def marker_map(tmp_path):
+    mapnik.clear_cache()
+    mapnik.set_cache_budget(markers=0, mapped_memory=0)
+    mapnik.track_cache_usage(True)
+    files = []
+    for i in range(3):
+        svg = tmp_path / ('marker%d.svg' % i)
+        svg.write_text(SVG)
+        files.append(str(svg))
+    png = tmp_path / 'pattern.png'
+    mapnik.Image(16, 16).save(str(png), 'png32')
+    files.append(str(png))
+    rules = ''.join('<Rule><MarkersSymbolizer file="%s"/></Rule>' % f for f in files[:3])
+    xml = '''<Map srs="epsg:4326">
+      <Style name="points">%s
+        <Rule><PolygonPatternSymbolizer file="%s"/></Rule>
+      </Style>
+      <Layer name="csv" srs="epsg:4326">
+        <StyleName>points</StyleName>
+        <Datasource>
+          <Parameter name="type">csv</Parameter>
+          <Parameter name="inline">wkt
+"POLYGON ((0 0, 1 0, 1 1, 0 0))"
+</Parameter>
+        </Datasource>
+      </Layer>
+    </Map>''' % (rules, files[3])
+    m = mapnik.Map(64, 64)
+    mapnik.load_map_from_string(m, xml)
+    m.zoom_all()
+    yield m, files
+    mapnik.track_cache_usage(False)
+    mapnik.set_cache_budget(markers=0, mapped_memory=0)
+    mapnik.clear_cache()
+
+
+def render(m):
+    mapnik.render(m, mapnik.Image(m.width, m.height))
+
+
+def test_cache_stats_after_render(marker_map):
+    m, files = marker_map
+    render(m)
+    stats = mapnik.cache_stats()['markers']
+    assert stats['entries'] == 4
+    # the decoded 16x16 pattern plus the sources of the three SVGs
+    assert stats['bytes'] == 16 * 16 * 4 + 3 * len(SVG)
+    render(m)
+    assert mapnik.cache_stats()['markers'] == stats
+    assert set(mapnik.cache_stats()) == {'markers', 'mapped_memory'}
+    assert set(stats) == {'entries', 'bytes', 'evictions', 'budget'}
+
+
+def test_cache_tracking_is_opt_in(marker_map):
+    m, files = marker_map
+    mapnik.track_cache_usage(False)
+    render(m)
+    assert mapnik.cache_stats()['markers']['entries'] == 0
+    # a budget turns accounting on
+    mapnik.set_cache_budget(markers=1 << 30)
+    render(m)
+    assert mapnik.cache_stats()['markers']['entries'] == 4
+
+
+def test_evict_cache(marker_map):
+    m, files = marker_map
+    render(m)
+    assert mapnik.evict_cache(files[3])
+    assert not mapnik.evict_cache(files[3])
+    stats = mapnik.cache_stats()['markers']
+    assert stats['entries'] == 3
+    assert stats['bytes'] == 3 * len(SVG)
+    assert stats['evictions'] == 1
+    render(m)
+    assert mapnik.cache_stats()['markers']['entries'] == 4
+
+
+def test_marker_budget_evicts_least_recently_used(marker_map):
+    m, files = marker_map
+    render(m)
+    budget = 16 * 16 * 4 + len(SVG)
+    mapnik.set_cache_budget(markers=budget)
+    stats = mapnik.cache_stats()['markers']
+    assert stats['budget'] == budget
+    # the first two SVGs were the least recently used
+    assert stats['entries'] == 2
+    assert stats['bytes'] == budget
+    assert not mapnik.evict_cache(files[0])
+    assert mapnik.evict_cache(files[2])
+    # evicted entries are loaded again by the next render, within the budget
+    render(m)
+    assert mapnik.cache_stats()['markers']['bytes'] <= budget
+
+
+def test_clear_cache_resets_entries(marker_map):
+    m, files = marker_map
+    render(m)
+    mapnik.clear_cache()
+    stats = mapnik.cache_stats()['markers']
+    assert stats['entries'] == 0
+    assert stats['bytes'] == 0
@@ -0,0 +1,74 @@
+import mapnik
+import pytest
+
+
+class CountingProvider:
+    def __init__(self):
+        self.queries = 0
+
+    def features(self, query):
+        self.queries += 1
+        points = [(x, y) for x in range(0, 100, 10) for y in range(0, 100, 10)]
+        yield {'wkb': [mapnik.Geometry.from_wkt('POINT (%d %d)' % p).to_wkb(mapnik.wkbByteOrder.NDR)
+                       for p in points]}
+
+
+@pytest.fixture
+def provider():
+    return CountingProvider()
+
+
+def query(minx, miny, maxx, maxy, scale=1000.0):
+    box = mapnik.Box2d(minx, miny, maxx, maxy)
+    return mapnik.Query(box, (256.0 / box.width(), 256.0 / box.height()), scale)
+
+
+def test_caching_datasource_reuses_features(provider):
+    ds = mapnik.CachingDatasource(mapnik.PythonDatasource(provider, mapnik.Box2d(0, 0, 100, 100)),
+                                  max_bytes=1024 * 1024, key='exact')
+    assert len(list(ds.features(query(0, 0, 35, 35)))) == 16
+    assert len(list(ds.features(query(0, 0, 35, 35)))) == 16
+    assert provider.queries == 1
+    stats = ds.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_ratio'] == pytest.approx(0.5)
+    assert stats['bytes'] > 0
+
+
+def test_caching_datasource_tile_key_shares_neighbours(provider):
+    ds = mapnik.CachingDatasource(mapnik.PythonDatasource(provider, mapnik.Box2d(0, 0, 100, 100)),
+                                  max_bytes=1024 * 1024)
+    # both extents snap to the same 16 unit grid cell
+    assert len(list(ds.features(query(0, 0, 15, 15)))) == 4
+    assert len(list(ds.features(query(2, 2, 14, 14)))) == 1
+    assert provider.queries == 1
+    # a different zoom level is a new entry
+    list(ds.features(query(0, 0, 15, 15, scale=8000.0)))
+    assert provider.queries == 2
+
+
+def test_caching_datasource_eviction(provider):
+    ds = mapnik.CachingDatasource(mapnik.PythonDatasource(provider, mapnik.Box2d(0, 0, 100, 100)),
+                                  max_bytes=1, key='exact')
+    list(ds.features(query(0, 0, 35, 35)))
+    list(ds.features(query(0, 0, 35, 35)))
+    assert provider.queries == 2
+    assert ds.stats()['entries'] == 0
+    ds.clear()
+
+
+def test_caching_datasource_as_layer_datasource(provider):
+    inner = mapnik.PythonDatasource(provider, mapnik.Box2d(0, 0, 100, 100))
+    ds = mapnik.CachingDatasource(inner, 1024 * 1024)
+    assert ds.inner is inner
+    assert ds.envelope() == inner.envelope()
+    lyr = mapnik.Layer('cached')
+    lyr.datasource = ds
+    assert lyr.datasource is ds
+
+
+def test_caching_datasource_bad_key(provider):
+    with pytest.raises(RuntimeError):
+        mapnik.CachingDatasource(mapnik.PythonDatasource(provider, mapnik.Box2d(0, 0, 100, 100)),
+                                 1024, key='nope')
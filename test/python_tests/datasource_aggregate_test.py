@@ -0,0 +1,51 @@
+import mapnik
+import pytest
+
+
+@pytest.fixture
+def csv_datasource():
+    return mapnik.CSV(inline='x,y,name,pop\n'
+                             '0,0,a,1\n'
+                             '1,1,b,2\n'
+                             '2,2,c,3\n'
+                             '3,3,d,10\n')
+
+
+def test_count(csv_datasource):
+    assert csv_datasource.count() == 4
+    assert csv_datasource.count(mapnik.Query(mapnik.Box2d(-0.5, -0.5, 1.5, 1.5))) == 2
+
+
+def test_aggregate_default_stats(csv_datasource):
+    result = csv_datasource.aggregate(None, ['pop'], bins=3)
+    assert result['count'] == 4
+    pop = result['fields']['pop']
+    assert pop['count'] == 4
+    assert pop['min'] == 1
+    assert pop['max'] == 10
+    assert pop['sum'] == 16
+    assert pop['histogram']['edges'] == pytest.approx([1, 4, 7, 10])
+    assert pop['histogram']['counts'] == [3, 0, 1]
+
+
+def test_aggregate_fixed_range_and_extent(csv_datasource):
+    query = mapnik.Query(mapnik.Box2d(0.5, 0.5, 3.5, 3.5))
+    result = csv_datasource.aggregate(query, ['pop'], stats=['count', 'extent', 'mean', 'histogram'],
+                                      bins=2, range={'pop': (0, 4)})
+    assert result['count'] == 3
+    assert result['extent'] == mapnik.Box2d(1, 1, 3, 3)
+    pop = result['fields']['pop']
+    assert pop['mean'] == pytest.approx(5)
+    assert 'min' not in pop
+    # 10 is outside the requested range
+    assert pop['histogram']['counts'] == [0, 2]
+
+
+def test_aggregate_ignores_strings(csv_datasource):
+    result = csv_datasource.aggregate(None, ['name'], stats=['count', 'min'])
+    assert result['fields']['name'] == {'count': 0, 'min': None}
+
+
+def test_aggregate_unknown_stat(csv_datasource):
+    with pytest.raises(RuntimeError):
+        csv_datasource.aggregate(None, ['pop'], stats=['median'])
@@ -0,0 +1,73 @@
+import json
+import mmap
+
+import mapnik
+import pytest
+
+
+CSV_DATA = 'x,y,name\n0,0,café\n1,1,b\n'.encode('utf-8')
+GEOJSON_DATA = json.dumps({'type': 'FeatureCollection', 'features': [
+    {'type': 'Feature', 'properties': {'name': 'a'},
+     'geometry': {'type': 'Point', 'coordinates': [1, 2]}}]}).encode('utf-8')
+
+
+@pytest.fixture
+def shared():
+    yield
+    mapnik.DatasourceCache.clear_shared()
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview])
+def test_csv_inline_buffer(wrap):
+    ds = mapnik.CSV(inline=wrap(CSV_DATA))
+    assert sorted(f['name'] for f in ds) == ['b', 'café']
+
+
+def test_geojson_inline_bytes():
+    ds = mapnik.GeoJSON(inline=GEOJSON_DATA)
+    features = list(ds)
+    assert len(features) == 1
+    assert features[0]['name'] == 'a'
+
+
+def test_csv_inline_mmap(tmp_path):
+    path = tmp_path / 'points.csv'
+    path.write_bytes(CSV_DATA)
+    with open(str(path), 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            ds = mapnik.CSV(inline=mm)
+    assert len(list(ds)) == 2
+
+
+def test_non_contiguous_buffer_rejected():
+    with pytest.raises(RuntimeError):
+        mapnik.CSV(inline=memoryview(CSV_DATA)[::2])
+
+
+def test_shared_inline_parsed_once(shared):
+    assert not mapnik.DatasourceCache.shared_stats()['enabled']
+    ds1 = mapnik.CSV(inline=CSV_DATA, share_instance=True)
+    ds2 = mapnik.CSV(inline=bytearray(CSV_DATA), share_instance=True)
+    assert ds1 is ds2
+    assert 'share_instance' not in ds1.parameters()
+    assert mapnik.CSV(inline=CSV_DATA) is not ds1
+
+
+def test_plugin_shared_parameter_passed_through(shared):
+    # 'shared' belongs to plugins (gdal), only share_instance is consumed
+    ds = mapnik.CSV(inline=CSV_DATA, shared=True)
+    assert 'shared' in ds.parameters()
+    assert mapnik.DatasourceCache.shared_stats()['entries'] == 0
+
+
+def test_shared_large_inline(shared):
+    rows = ''.join('%d,%d,n%d\n' % (i, i, i) for i in range(5000))
+    data = ('x,y,name\n' + rows).encode('utf-8')
+    ds1 = mapnik.CSV(inline=data, share_instance=True)
+    ds2 = mapnik.CSV(inline=data, share_instance=True)
+    assert ds1 is ds2
+    # a payload that differs in a single byte gets its own datasource
+    ds3 = mapnik.CSV(inline=data[:-2] + b'9\n', share_instance=True)
+    assert ds3 is not ds1
+    assert mapnik.DatasourceCache.invalidate(type='csv', inline=data, share_instance=True)
+    assert mapnik.CSV(inline=data, share_instance=True) is not ds1
@@ -0,0 +1,82 @@
+import mapnik
+import pytest
+
+
+@pytest.fixture
+def sharing():
+    mapnik.DatasourceCache.enable_sharing(max_entries=2)
+    yield
+    mapnik.DatasourceCache.disable_sharing()
+
+
+INLINE = 'x,y,name\n0,0,a\n1,1,b\n'
+
+
+def test_sharing_disabled_by_default():
+    stats = mapnik.DatasourceCache.shared_stats()
+    assert not stats['enabled']
+    ds1 = mapnik.CreateDatasource(type='csv', inline=INLINE)
+    ds2 = mapnik.CreateDatasource(type='csv', inline=INLINE)
+    assert ds1 is not ds2
+
+
+def test_identical_params_share_instance(sharing):
+    ds1 = mapnik.CreateDatasource(type='csv', inline=INLINE)
+    ds2 = mapnik.CreateDatasource(type='csv', inline=INLINE)
+    assert ds1 is ds2
+    stats = mapnik.DatasourceCache.shared_stats()
+    assert stats['enabled']
+    assert stats['entries'] == 1
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+
+
+def test_values_compared_by_string_form(sharing):
+    ds1 = mapnik.CreateDatasource(type='csv', inline=INLINE, row_limit=1)
+    ds2 = mapnik.CreateDatasource(type='csv', inline=INLINE, row_limit='1')
+    assert ds1 is ds2
+
+
+def test_lru_eviction(sharing):
+    ds1 = mapnik.CreateDatasource(type='csv', inline=INLINE, row_limit=1)
+    mapnik.CreateDatasource(type='csv', inline=INLINE, row_limit=2)
+    mapnik.CreateDatasource(type='csv', inline=INLINE, row_limit=1)
+    mapnik.CreateDatasource(type='csv', inline=INLINE, row_limit=3)
+    stats = mapnik.DatasourceCache.shared_stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    # row_limit=1 was used most recently and survived
+    assert mapnik.CreateDatasource(type='csv', inline=INLINE, row_limit=1) is ds1
+
+
+def test_invalidate(sharing):
+    ds1 = mapnik.CreateDatasource(type='csv', inline=INLINE)
+    assert mapnik.DatasourceCache.invalidate(type='csv', inline=INLINE)
+    assert not mapnik.DatasourceCache.invalidate(type='csv', inline=INLINE)
+    ds2 = mapnik.CreateDatasource(type='csv', inline=INLINE)
+    assert ds1 is not ds2
+
+
+def test_load_map_deduplicates_layers(sharing):
+    xml = '''<Map>
+      <Layer name="one"><Datasource>
+        <Parameter name="type">csv</Parameter>
+        <Parameter name="inline">x,y
+0,0
+</Parameter>
+      </Datasource></Layer>
+      <Layer name="two"><Datasource>
+        <Parameter name="type">csv</Parameter>
+        <Parameter name="inline">x,y
+0,0
+</Parameter>
+      </Datasource></Layer>
+    </Map>'''
+    m1 = mapnik.Map(256, 256)
+    mapnik.load_map_from_string(m1, xml)
+    m2 = mapnik.Map(256, 256)
+    mapnik.load_map_from_string(m2, xml)
+    ds = m1.layers[0].datasource
+    assert m1.layers[1].datasource is ds
+    assert m2.layers[0].datasource is ds
+    assert m2.layers[1].datasource is ds
@@ -0,0 +1,76 @@
+import asyncio
+
+import mapnik
+import pytest
+
+
+def make_datasource(count):
+    rows = ''.join('%d,%d,n%d\n' % (i % 360 - 180, i % 180 - 90, i) for i in range(count))
+    return mapnik.Datasource(type='csv', inline='x,y,name\n' + rows)
+
+
+async def collect(stream):
+    return [f['name'] async for f in stream]
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 256, 5000])
+def test_features_async_yields_all_features(batch_size):
+    ds = make_datasource(1000)
+    names = asyncio.run(collect(ds.features_async(batch_size=batch_size)))
+    assert names == [f['name'] for f in ds]
+
+
+def test_features_async_query():
+    ds = make_datasource(100)
+    query = mapnik.Query(mapnik.Box2d(-180, -90, -171, -81))
+    query.add_property_name('name')
+    names = asyncio.run(collect(ds.features_async(query, batch_size=4)))
+    assert sorted(names) == sorted(f['name'] for f in ds.features(query))
+
+
+def test_features_async_empty():
+    ds = mapnik.MemoryDatasource()
+    assert asyncio.run(collect(ds.features_async())) == []
+
+
+def test_features_async_concurrent_streams():
+    ds = make_datasource(500)
+
+    async def main():
+        return await asyncio.gather(*[collect(ds.features_async(batch_size=16, max_batches=1))
+                                      for _ in range(8)])
+    results = asyncio.run(main())
+    expected = [f['name'] for f in ds]
+    assert all(names == expected for names in results)
+
+
+def test_features_async_close_early():
+    ds = make_datasource(1000)
+
+    async def main():
+        stream = ds.features_async(batch_size=10)
+        names = []
+        async for feature in stream:
+            names.append(feature['name'])
+            if len(names) == 15:
+                break
+        await stream.aclose()
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+        return names
+    assert len(asyncio.run(main())) == 15
+
+
+def test_features_async_error():
+    class FailingProvider:
+        def features(self, query):
+            raise ValueError('boom')
+
+    ds = mapnik.PythonDatasource(FailingProvider(), mapnik.Box2d(0, 0, 1, 1))
+    with pytest.raises(RuntimeError, match='boom'):
+        asyncio.run(collect(ds.features_async()))
+
+
+def test_features_async_invalid_arguments():
+    with pytest.raises(RuntimeError):
+        make_datasource(1).features_async(batch_size=0)
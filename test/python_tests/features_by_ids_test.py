@@ -0,0 +1,101 @@
+import mapnik
+import pytest
+
+
+def wkb(wkt):
+    return mapnik.Geometry.from_wkt(wkt).to_wkb(mapnik.wkbByteOrder.NDR)
+
+
+@pytest.fixture
+def csv_datasource():
+    return mapnik.CSV(inline='x,y,name,pop\n0,0,a,1\n1,1,b,2\n2,2,c,3\n')
+
+
+def test_features_by_ids_fallback_index(csv_datasource):
+    features = list(csv_datasource.features_by_ids([3, 1, 99]))
+    assert [f.id() for f in features] == [3, 1]
+    assert [f['name'] for f in features] == ['c', 'a']
+
+
+def test_features_by_ids_fields(csv_datasource):
+    features = list(csv_datasource.features_by_ids([2], fields=['name']))
+    assert len(features) == 1
+    assert features[0]['name'] == 'b'
+    assert not features[0].has_key('pop')
+
+
+def test_features_by_ids_materialized(csv_datasource):
+    ds = csv_datasource.materialize()
+    assert [f['name'] for f in ds.features_by_ids([2, 3])] == ['b', 'c']
+
+
+def test_features_by_ids_python_pushdown():
+    class Provider:
+        def __init__(self):
+            self.requested = None
+
+        def features(self, query):
+            return None
+
+        def features_by_ids(self, ids, names):
+            self.requested = (ids, names)
+            return {'wkb': [wkb('POINT (%d %d)' % (i, i)) for i in ids],
+                    'columns': {'name': ['f%d' % i for i in ids]},
+                    'ids': ids}
+
+    provider = Provider()
+    ds = mapnik.PythonDatasource(provider, mapnik.Box2d(0, 0, 10, 10), fields=['name'])
+    features = list(ds.features_by_ids([7, 5]))
+    assert provider.requested == ([7, 5], {'name'})
+    assert [(f.id(), f['name']) for f in features] == [(7, 'f7'), (5, 'f5')]
+
+
+def test_features_by_ids_memory_datasource_sees_new_features():
+    ds = mapnik.MemoryDatasource()
+    ctx = mapnik.Context()
+    ctx.push('name')
+    for i in (1, 2):
+        feat = mapnik.Feature(ctx, i)
+        feat.geometry = mapnik.Geometry.from_wkt('POINT(%d %d)' % (i, i))
+        feat['name'] = 'f%d' % i
+        ds.add_feature(feat)
+    assert [f['name'] for f in ds.features_by_ids([2, 3])] == ['f2']
+    feat = mapnik.Feature(ctx, 3)
+    feat.geometry = mapnik.Geometry.from_wkt('POINT(3 3)')
+    feat['name'] = 'f3'
+    ds.add_feature(feat)
+    assert [f['name'] for f in ds.features_by_ids([3, 1])] == ['f3', 'f1']
+
+
+def test_features_by_ids_memory_datasource_without_geometry():
+    ds = mapnik.MemoryDatasource()
+    ctx = mapnik.Context()
+    ctx.push('name')
+    for i, wkt in ((1, 'POINT(1 1)'), (2, None), (3, 'GEOMETRYCOLLECTION EMPTY')):
+        feat = mapnik.Feature(ctx, i)
+        if wkt:
+            feat.geometry = mapnik.Geometry.from_wkt(wkt)
+        feat['name'] = 'f%d' % i
+        ds.add_feature(feat)
+    assert [f['name'] for f in ds.features_by_ids([3, 2, 1])] == ['f3', 'f2', 'f1']
+
+
+def test_features_by_ids_python_pushdown_validates_ids():
+    class Provider:
+        def __init__(self, batch):
+            self.batch = batch
+
+        def features(self, query):
+            return None
+
+        def features_by_ids(self, ids, names):
+            return self.batch
+
+    without_ids = {'wkb': [wkb('POINT (1 1)')]}
+    ds = mapnik.PythonDatasource(Provider(without_ids), mapnik.Box2d(0, 0, 10, 10))
+    with pytest.raises(RuntimeError, match="'ids'"):
+        list(ds.features_by_ids([1]))
+    unrequested = {'wkb': [wkb('POINT (1 1)')], 'ids': [8]}
+    ds = mapnik.PythonDatasource(Provider(unrequested), mapnik.Box2d(0, 0, 10, 10))
+    with pytest.raises(RuntimeError, match='not requested'):
+        list(ds.features_by_ids([1]))
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+
+import mapnik
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def restore_faces():
+    # faces registered by a test point at missing files or deleted tmp dirs
+    before = set(mapnik.FontEngine.face_names())
+    yield
+    for name in set(mapnik.FontEngine.face_names()) - before:
+        mapnik.FontEngine.unregister_face(name)
+
+
+@pytest.fixture
+def font_dir(tmp_path):
+    from mapnik.paths import fontscollectionpath
+    fonts = sorted(f for f in os.listdir(fontscollectionpath) if f.endswith('.ttf'))
+    if not fonts:
+        pytest.skip('no bundled fonts')
+    target = tmp_path / 'fonts'
+    target.mkdir()
+    shutil.copy(os.path.join(fontscollectionpath, fonts[0]), str(target))
+    return str(target)
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache' / 'fonts.json')
+    monkeypatch.setenv('MAPNIK_FONT_CACHE', path)
+    return path
+
+
+def test_scan_font_does_not_register(font_dir):
+    font = os.path.join(font_dir, os.listdir(font_dir)[0])
+    faces = mapnik.FontEngine.scan_font(font)
+    assert faces
+    name, index = faces[0]
+    assert index == 0
+    assert isinstance(name, str)
+
+
+def test_register_fonts_writes_cache(font_dir, cache_file):
+    mapnik.register_fonts(font_dir)
+    with open(cache_file) as f:
+        cache = json.load(f)
+    assert cache['version'] == 1
+    font = os.path.join(font_dir, os.listdir(font_dir)[0])
+    entry = cache['files'][font]
+    assert entry['size'] == os.path.getsize(font)
+    for name, _ in entry['faces']:
+        assert name in mapnik.FontEngine.face_names()
+
+
+def test_cached_faces_are_registered_without_scanning(font_dir, cache_file):
+    mapnik.register_fonts(font_dir)
+    with open(cache_file) as f:
+        cache = json.load(f)
+    font = os.path.join(font_dir, os.listdir(font_dir)[0])
+    # unchanged mtime and size: the cached entry is trusted as is
+    cache['files'][font]['faces'] = [['Font Cache Test Regular', 0]]
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f)
+    mapnik.register_fonts(font_dir)
+    assert 'Font Cache Test Regular' in mapnik.FontEngine.face_names()
+
+
+def test_modified_font_is_rescanned(font_dir, cache_file):
+    mapnik.register_fonts(font_dir)
+    with open(cache_file) as f:
+        cache = json.load(f)
+    font = os.path.join(font_dir, os.listdir(font_dir)[0])
+    cache['files'][font]['faces'] = [['Font Cache Stale Regular', 0]]
+    cache['files'][font]['mtime'] -= 10
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f)
+    mapnik.register_fonts(font_dir)
+    assert 'Font Cache Stale Regular' not in mapnik.FontEngine.face_names()
+    with open(cache_file) as f:
+        assert json.load(f)['files'][font]['faces'] != [['Font Cache Stale Regular', 0]]
+
+
+def test_register_face():
+    assert mapnik.FontEngine.register_face('Font Cache Missing Regular', '/nonexistent.ttf', 0)
+    assert not mapnik.FontEngine.register_face('Font Cache Missing Regular', '/other.ttf', 0)
+    assert 'Font Cache Missing Regular' in mapnik.FontEngine.face_names()
+    assert mapnik.FontEngine.unregister_face('Font Cache Missing Regular')
+    assert 'Font Cache Missing Regular' not in mapnik.FontEngine.face_names()
+    assert not mapnik.FontEngine.unregister_face('Font Cache Missing Regular')
@@ -0,0 +1,74 @@
+import json
+
+import mapnik
+import pytest
+
+WKTS = ['POINT(30 10)',
+        'LINESTRING(30 10,10 30,40 40)',
+        'POLYGON((35 10,10 20,15 40,45 45,35 10),(20 30,35 35,30 20,20 30))',
+        'MULTIPOINT(10 40,40 30,20 20,30 10)',
+        'MULTILINESTRING((10 10,20 20,10 40),(40 40,30 30,40 20,30 10))',
+        'MULTIPOLYGON(((30 20,45 40,10 40,30 20)),((15 5,40 10,10 20,5 10,15 5)))',
+        'GEOMETRYCOLLECTION(POINT(4 6),LINESTRING(4 6,7 10))']
+
+
+@pytest.mark.parametrize('wkt', WKTS)
+def test_geometry_geo_interface_matches_geojson(wkt):
+    geom = mapnik.Geometry.from_wkt(wkt)
+    assert geom.__geo_interface__ == json.loads(geom.to_geojson())
+
+
+@pytest.mark.parametrize('wkt', WKTS)
+def test_geometry_from_geo_interface_round_trip(wkt):
+    geom = mapnik.Geometry.from_wkt(wkt)
+    assert mapnik.Geometry.from_geo_interface(geom.__geo_interface__).to_wkt() == wkt
+    # objects providing __geo_interface__ are accepted too
+    assert mapnik.Geometry.from_geo_interface(geom).to_wkt() == wkt
+
+
+def test_geometry_from_geo_interface_tuples_and_z():
+    geom = mapnik.Geometry.from_geo_interface({'type': 'LineString',
+                                               'coordinates': ((0, 0, 5), (1.5, 2, 5))})
+    assert geom.to_wkt() == 'LINESTRING(0 0,1.5 2)'
+
+
+def test_geometry_from_geo_interface_invalid():
+    with pytest.raises(RuntimeError):
+        mapnik.Geometry.from_geo_interface({'type': 'Curve', 'coordinates': []})
+    with pytest.raises(RuntimeError):
+        mapnik.Geometry.from_geo_interface({'coordinates': [1, 2]})
+    with pytest.raises(RuntimeError):
+        mapnik.Geometry.from_geo_interface({'type': 'Point', 'coordinates': [1]})
+    with pytest.raises(RuntimeError):
+        mapnik.Geometry.from_geo_interface({'type': 'LineString', 'coordinates': 'abc'})
+
+
+def test_feature_geo_interface_matches_geojson():
+    ctx = mapnik.Context()
+    feat = mapnik.Feature(ctx, 7)
+    feat.geometry = mapnik.Geometry.from_wkt(WKTS[2])
+    feat['name'] = 'avión'
+    feat['value'] = 1.5
+    feat['flag'] = True
+    feat['count'] = 3
+    assert feat.__geo_interface__ == json.loads(feat.to_geojson())
+    empty = mapnik.Feature(ctx, 8)
+    assert empty.__geo_interface__ == json.loads(empty.to_geojson())
+
+
+def test_feature_from_geo_interface():
+    obj = {'type': 'Feature', 'id': 3,
+           'geometry': {'type': 'Point', 'coordinates': (1, 2)},
+           'properties': {'name': 'a', 'value': 2.5, 'nested': {'k': [1, 2]}, 'none': None}}
+    feat = mapnik.Feature.from_geo_interface(obj)
+    assert feat.id() == 3
+    assert feat.geometry.to_wkt() == 'POINT(1 2)'
+    assert feat['name'] == 'a'
+    assert feat['value'] == 2.5
+    assert json.loads(feat['nested']) == {'k': [1, 2]}
+    assert feat['none'] is None
+    ctx = mapnik.Context()
+    again = mapnik.Feature.from_geo_interface(feat, ctx)
+    assert again.__geo_interface__ == feat.__geo_interface__
+    with pytest.raises(RuntimeError):
+        mapnik.Feature.from_geo_interface({'type': 'Point', 'coordinates': (1, 2)})
@@ -0,0 +1,114 @@
+import math
+
+import mapnik
+import pytest
+
+np = pytest.importorskip('numpy')
+
+WKTS = ['POINT(30 10)',
+        'LINESTRING(30 10,10 30,40 40)',
+        'POLYGON((35 10,10 20,15 40,45 45,35 10),(20 30,35 35,30 20,20 30))',
+        'MULTIPOLYGON(((30 20,45 40,10 40,30 20)),((15 5,40 10,10 20,5 10,15 5)))']
+
+
+@pytest.fixture
+def geoms():
+    return mapnik.GeometryArray([mapnik.Geometry.from_wkt(wkt) for wkt in WKTS])
+
+
+def test_geometry_array_wkt_and_wkb_round_trip(geoms):
+    assert len(geoms) == 4
+    assert geoms.to_wkt() == WKTS
+    wkbs = geoms.to_wkb()
+    assert wkbs == [mapnik.Geometry.from_wkt(wkt).to_wkb(mapnik.wkbByteOrder.NDR) for wkt in WKTS]
+    assert mapnik.GeometryArray.from_wkb(wkbs).to_wkt() == WKTS
+    assert mapnik.GeometryArray.from_wkb(np.array(wkbs, dtype=object)).to_wkt() == WKTS
+
+
+def test_geometry_array_getitem(geoms):
+    assert geoms[1].to_wkt() == WKTS[1]
+    assert geoms[-1].to_wkt() == WKTS[-1]
+    with pytest.raises(IndexError):
+        geoms[4]
+
+
+def test_geometry_array_envelopes_and_centroids(geoms):
+    envelopes = geoms.envelopes()
+    assert envelopes.shape == (4, 4)
+    for env, wkt in zip(envelopes, WKTS):
+        box = mapnik.Geometry.from_wkt(wkt).envelope()
+        assert env.tolist() == [box.minx, box.miny, box.maxx, box.maxy]
+    centroids = geoms.centroids()
+    assert centroids.shape == (4, 2)
+    for c, wkt in zip(centroids, WKTS):
+        pt = mapnik.Geometry.from_wkt(wkt).centroid()
+        assert c.tolist() == pytest.approx([pt.x, pt.y])
+
+
+def test_geometry_array_predicates():
+    geoms = mapnik.GeometryArray.from_wkb([mapnik.Geometry.from_wkt('POINT(1 2)').to_wkb(mapnik.wkbByteOrder.NDR),
+                                           None])
+    assert geoms.is_empty().tolist() == [False, True]
+    assert geoms.is_valid().dtype == np.bool_
+    assert all(math.isnan(v) for v in geoms.envelopes()[1])
+    assert all(math.isnan(v) for v in geoms.centroids()[1])
+    assert geoms.to_wkb()[1] is None
+
+
+def test_geometry_array_from_ragged_arrays():
+    coords = np.array([[0, 0], [1, 1], [2, 2], [3, 3], [4, 4]], dtype='f8')
+    lines = mapnik.GeometryArray.from_ragged_arrays(mapnik.GeometryType.LineString, coords,
+                                                    [0, 2, 5], [0, 1, 2], [0, 1, 1, 2])
+    assert lines.is_empty().tolist() == [False, True, False]
+    assert lines[2].to_wkt() == 'LINESTRING(2 2,3 3,4 4)'
+    points = mapnik.GeometryArray.from_ragged_arrays(mapnik.GeometryType.MultiPoint, coords,
+                                                     [0, 1, 2, 3, 4, 5], [0, 1, 2, 3, 4, 5], [0, 2, 5])
+    assert points[0].to_wkt() == 'MULTIPOINT(0 0,1 1)'
+    # round trip through the single geometry ragged layout
+    mp = mapnik.Geometry.from_wkt(WKTS[3])
+    coords, part_offsets, ring_offsets = mp.to_ragged_arrays()
+    polys = mapnik.GeometryArray.from_ragged_arrays(mapnik.GeometryType.MultiPolygon, coords,
+                                                    ring_offsets, part_offsets, [0, len(part_offsets) - 1])
+    assert polys.to_wkt() == [WKTS[3]]
+
+
+def test_geometry_array_from_ragged_arrays_invalid():
+    coords = np.zeros((4, 2))
+    with pytest.raises(RuntimeError):
+        # a point needs exactly one coordinate
+        mapnik.GeometryArray.from_ragged_arrays(mapnik.GeometryType.Point, coords, [0, 2, 4], [0, 1, 2], [0, 1, 2])
+    with pytest.raises(RuntimeError):
+        # two parts for a single part type
+        mapnik.GeometryArray.from_ragged_arrays(mapnik.GeometryType.LineString, coords, [0, 2, 4], [0, 1, 2], [0, 2])
+    with pytest.raises(RuntimeError):
+        mapnik.GeometryArray.from_ragged_arrays(mapnik.GeometryType.LineString, coords, [0, 2, 4], [0, 1, 2], [0, 3])
+
+
+def test_memory_datasource_add_geometries(geoms):
+    ds = mapnik.MemoryDatasource()
+    assert ds.add_geometries(geoms, {'name': ['a', 'b', 'c', 'd'], 'value': np.arange(4),
+                                     'ratio': np.linspace(0, 1, 4, dtype='f4'),
+                                     'flag': np.array([True, False, True, False])},
+                             start_id=10) == 4
+    assert ds.num_features() == 4
+    features = list(ds.features(mapnik.Query(ds.envelope())))
+    assert sorted(f.id() for f in features) == [10, 11, 12, 13]
+    by_id = {f.id(): f for f in features}
+    assert by_id[11]['name'] == 'b'
+    assert by_id[13]['value'] == 3
+    assert isinstance(by_id[13]['value'], int)
+    assert by_id[12]['ratio'] == pytest.approx(2 / 3)
+    assert by_id[10]['flag'] is True and by_id[11]['flag'] is False
+    assert by_id[12].geometry.to_wkt() == WKTS[2]
+    with pytest.raises(RuntimeError):
+        ds.add_geometries(geoms, {'name': ['a']})
+    with pytest.raises(RuntimeError):
+        ds.add_geometries(geoms, {'value': np.zeros((4, 2))})
+
+
+def test_memory_datasource_add_geometries_updates_id_index(geoms):
+    ds = mapnik.MemoryDatasource()
+    ds.add_geometries(geoms, start_id=1)
+    assert [f.id() for f in ds.features_by_ids([2])] == [2]
+    ds.add_geometries(geoms, start_id=5)
+    assert [f.geometry.to_wkt() for f in ds.features_by_ids([8, 1])] == [WKTS[3], WKTS[0]]
@@ -0,0 +1,86 @@
+import json
+
+import mapnik
+import pytest
+
+WKTS = ['POINT(30 10)',
+        'LINESTRING(30 10,10 30,40 40)',
+        'POLYGON((35 10,10 20,15 40,45 45,35 10),(20 30,35 35,30 20,20 30))',
+        'MULTIPOINT(10 40,40 30,20 20,30 10)']
+
+
+def wkb(wkt):
+    return mapnik.Geometry.from_wkt(wkt).to_wkb(mapnik.wkbByteOrder.NDR)
+
+
+@pytest.mark.parametrize('threads', [1, 0, 3])
+def test_from_wkb_many(threads):
+    wkbs = [wkb(w) for w in WKTS] * 50
+    geoms = mapnik.Geometry.from_wkb_many(wkbs, threads=threads)
+    assert isinstance(geoms, mapnik.GeometryArray)
+    assert geoms.to_wkt() == WKTS * 50
+
+
+def test_from_wkb_many_buffers():
+    wkbs = [bytearray(wkb(WKTS[0])), memoryview(wkb(WKTS[1])), None]
+    geoms = mapnik.Geometry.from_wkb_many(iter(wkbs))
+    assert geoms[0].to_wkt() == WKTS[0]
+    assert geoms[1].to_wkt() == WKTS[1]
+    assert geoms.is_empty().tolist() == [False, False, True]
+
+
+def test_from_wkt_and_geojson_many():
+    assert mapnik.Geometry.from_wkt_many(WKTS).to_wkt() == WKTS
+    assert mapnik.Geometry.from_wkt_many([w.encode() for w in WKTS]).to_wkt() == WKTS
+    jsons = [mapnik.Geometry.from_wkt(w).to_geojson() for w in WKTS]
+    assert mapnik.Geometry.from_geojson_many(jsons).to_wkt() == WKTS
+
+
+def test_from_many_reports_every_failure():
+    with pytest.raises(RuntimeError) as err:
+        mapnik.Geometry.from_wkt_many(['POINT(1 2)', 'POINT(', 'LINESTRING(0 0,1 1)', 'nope'])
+    message = str(err.value)
+    assert '2 of 4' in message
+    assert 'index 1' in message and 'index 3' in message
+    with pytest.raises(RuntimeError, match='index 1'):
+        mapnik.Geometry.from_wkb_many([wkb(WKTS[0]), b'\x01\x99\x00'])
+    geoms = mapnik.Geometry.from_geojson_many(['{"type":"Point","coordinates":[1,2]}', '{'], errors='ignore')
+    assert geoms.is_empty().tolist() == [False, True]
+    with pytest.raises(RuntimeError):
+        mapnik.Geometry.from_wkt_many(WKTS, errors='bogus')
+    with pytest.raises(TypeError):
+        mapnik.Geometry.from_wkt_many([1])
+
+
+def test_from_wkb_many_valid_empty_geometries():
+    # a valid empty collection parses to an empty geometry, it is no failure
+    empty = [b'\x01\x07\x00\x00\x00\x00\x00\x00\x00',
+             b'\x00\x00\x00\x00\x06\x00\x00\x00\x00']
+    geoms = mapnik.Geometry.from_wkb_many(empty + [wkb(WKTS[0])])
+    assert geoms.is_empty().tolist() == [True, True, False]
+    with pytest.raises(RuntimeError, match='index 0'):
+        mapnik.Geometry.from_wkb_many([empty[0] + b'\x00'])
+
+
+def test_from_many_failure_mask():
+    pytest.importorskip('numpy')
+    geoms, failed = mapnik.Geometry.from_wkb_many([wkb(WKTS[0]), None, b'\x01\x99\x00'], errors='mask')
+    assert isinstance(geoms, mapnik.GeometryArray)
+    assert failed.dtype == bool
+    assert failed.tolist() == [False, False, True]
+    assert geoms.is_empty().tolist() == [False, True, True]
+    geoms, failed = mapnik.Geometry.from_wkt_many(['POINT(1 2)', 'POINT('], errors='mask')
+    assert failed.tolist() == [False, True]
+
+
+def test_to_many():
+    geoms = [mapnik.Geometry.from_wkt(w) for w in WKTS]
+    array = mapnik.GeometryArray(geoms)
+    assert mapnik.Geometry.to_wkt_many(geoms) == WKTS
+    assert mapnik.Geometry.to_wkt_many(array, threads=2) == WKTS
+    assert mapnik.Geometry.to_wkb_many(array) == [wkb(w) for w in WKTS]
+    xdr = mapnik.Geometry.to_wkb_many(geoms, mapnik.wkbByteOrder.XDR)
+    assert xdr[0] == geoms[0].to_wkb(mapnik.wkbByteOrder.XDR)
+    jsons = mapnik.Geometry.to_geojson_many(array)
+    assert [json.loads(j) for j in jsons] == [json.loads(g.to_geojson()) for g in geoms]
+    assert array.to_geojson() == jsons
@@ -0,0 +1,91 @@
+import gc
+
+import mapnik
+import pytest
+
+np = pytest.importorskip('numpy')
+
+
+def test_line_string_coords_view():
+    line = mapnik.LineString()
+    for x, y in ((30, 10), (10, 30), (40, 40)):
+        line.add_point(x, y)
+    coords = line.coords
+    assert coords.dtype == np.float64
+    assert coords.shape == (3, 2)
+    assert coords.tolist() == [[30, 10], [10, 30], [40, 40]]
+    assert not coords.flags.writeable
+    with pytest.raises(ValueError):
+        coords[0, 0] = 1
+    # numpy.asarray views the same storage
+    assert np.shares_memory(np.asarray(line), coords)
+    assert np.asarray(line, dtype='f4').dtype == np.float32
+
+
+def test_add_point_while_coords_view_alive():
+    line = mapnik.LineString.from_array(np.arange(8, dtype='f8').reshape(-1, 2))
+    coords = line.coords
+    array = np.asarray(line)
+    # growing the storage would leave the views reading freed memory
+    with pytest.raises(BufferError):
+        line.add_point(100, 100)
+    del coords
+    with pytest.raises(BufferError):
+        line.add_point(mapnik.Point(100, 100))
+    sliced = array[1:]
+    del array
+    with pytest.raises(BufferError):
+        line.add_point(100, 100)
+    assert sliced.tolist() == [[2, 3], [4, 5], [6, 7]]
+    del sliced
+    gc.collect()
+    line.add_point(100, 100)
+    assert line.coords.tolist()[-1] == [100, 100]
+    # copies don't hold on to the storage
+    copy = np.array(line, copy=True)
+    line.add_point(200, 200)
+    assert len(copy) == 5
+
+
+def test_coords_view_keeps_geometry_alive():
+    coords = mapnik.LineString.from_array(np.arange(2000, dtype='f8').reshape(-1, 2)).coords
+    gc.collect()
+    assert coords[-1].tolist() == [1998, 1999]
+
+
+def test_ring_and_multi_point_coords():
+    ring = mapnik.LinearRing()
+    ring.add_point(0, 0)
+    ring.add_point(1, 0)
+    assert ring.coords.tolist() == [[0, 0], [1, 0]]
+    assert mapnik.MultiPoint().coords.shape == (0, 2)
+
+
+@pytest.mark.parametrize('wkt,parts,rings,num_coords', [
+    ('POINT(30 10)', [0, 1], [0, 1], 1),
+    ('LINESTRING(30 10,10 30,40 40)', [0, 1], [0, 3], 3),
+    ('POLYGON((35 10,10 20,15 40,45 45,35 10),(20 30,35 35,30 20,20 30))', [0, 2], [0, 5, 9], 9),
+    ('MULTIPOINT((10 40),(40 30))', [0, 1, 2], [0, 1, 2], 2),
+    ('MULTILINESTRING((10 10,20 20,10 40),(40 40,30 30,40 20,30 10))', [0, 1, 2], [0, 3, 7], 7),
+    ('MULTIPOLYGON(((30 20,45 40,10 40,30 20)),((15 5,40 10,10 20,5 10,15 5)))', [0, 1, 2], [0, 4, 9], 9),
+    ('GEOMETRYCOLLECTION(POINT(4 6),LINESTRING(4 6,7 10))', [0, 1, 2], [0, 1, 3], 3),
+])
+def test_to_ragged_arrays(wkt, parts, rings, num_coords):
+    geom = mapnik.Geometry.from_wkt(wkt)
+    coords, part_offsets, ring_offsets = geom.to_ragged_arrays()
+    assert coords.shape == (num_coords, 2)
+    assert part_offsets.tolist() == parts
+    assert ring_offsets.tolist() == rings
+
+
+def test_to_ragged_arrays_round_trip():
+    wkt = 'MULTIPOLYGON(((40 40,20 45,45 30,40 40)),((20 35,10 30,10 10,30 5,45 20,20 35),(30 20,20 15,20 25,30 20)))'
+    coords, part_offsets, ring_offsets = mapnik.Geometry.from_wkt(wkt).to_ragged_arrays()
+    assert mapnik.MultiPolygon.from_arrays(coords, ring_offsets, part_offsets).to_wkt() == wkt
+
+
+def test_to_ragged_arrays_empty():
+    coords, part_offsets, ring_offsets = mapnik.Geometry.from_wkt('GEOMETRYCOLLECTION EMPTY').to_ragged_arrays()
+    assert coords.shape == (0, 2)
+    assert part_offsets.tolist() == [0]
+    assert ring_offsets.tolist() == [0]
@@ -0,0 +1,66 @@
+import mapnik
+import pytest
+
+np = pytest.importorskip('numpy')
+
+
+def test_line_string_from_array():
+    coords = np.array([[30, 10], [10, 30], [40, 40]], dtype='f8')
+    line = mapnik.LineString.from_array(coords)
+    assert line.to_wkt() == 'LINESTRING(30 10,10 30,40 40)'
+    # flat x,y pairs and other dtypes are accepted too
+    assert mapnik.LineString.from_array(coords.ravel()).to_wkt() == line.to_wkt()
+    assert mapnik.LineString.from_array(coords.astype('i4')).to_wkt() == line.to_wkt()
+    assert len(mapnik.LineString.from_array(np.empty((0, 2)))) == 0
+
+
+def test_multi_point_and_ring_from_array():
+    coords = np.array([[10, 40], [40, 30], [20, 20], [30, 10]], dtype='f8')
+    assert mapnik.MultiPoint.from_array(coords).to_wkt() == 'MULTIPOINT(10 40,40 30,20 20,30 10)'
+    ring = mapnik.LinearRing.from_array(coords)
+    assert [(p.x, p.y) for p in ring] == [tuple(c) for c in coords]
+
+
+def test_polygon_from_arrays():
+    coords = np.array([[35, 10], [10, 20], [15, 40], [45, 45], [35, 10],
+                       [20, 30], [35, 35], [30, 20], [20, 30]], dtype='f8')
+    poly = mapnik.Polygon.from_arrays(coords, np.array([0, 5, 9]))
+    assert poly.num_rings() == 2
+    assert poly.to_wkt() == 'POLYGON((35 10,10 20,15 40,45 45,35 10),(20 30,35 35,30 20,20 30))'
+
+
+def test_multi_line_string_from_arrays():
+    coords = np.array([[10, 10], [20, 20], [10, 40], [40, 40], [30, 30], [40, 20], [30, 10]], dtype='f8')
+    mls = mapnik.MultiLineString.from_arrays(coords, [0, 3, 7])
+    assert mls.to_wkt() == 'MULTILINESTRING((10 10,20 20,10 40),(40 40,30 30,40 20,30 10))'
+
+
+def test_multi_polygon_from_arrays():
+    coords = np.array([[30, 20], [45, 40], [10, 40], [30, 20],
+                       [15, 5], [40, 10], [10, 20], [5, 10], [15, 5]], dtype='f8')
+    mp = mapnik.MultiPolygon.from_arrays(coords, [0, 4, 9], [0, 1, 2])
+    assert mp.to_wkt() == 'MULTIPOLYGON(((30 20,45 40,10 40,30 20)),((15 5,40 10,10 20,5 10,15 5)))'
+    # a polygon spanning both rings
+    assert len(mapnik.MultiPolygon.from_arrays(coords, [0, 4, 9], [0, 2])) == 1
+
+
+def test_from_arrays_matches_add_point():
+    coords = np.random.default_rng(0).uniform(-180, 180, size=(1000, 2))
+    line = mapnik.LineString()
+    for x, y in coords:
+        line.add_point(x, y)
+    assert mapnik.LineString.from_array(coords).to_wkb(mapnik.wkbByteOrder.NDR) == \
+        line.to_wkb(mapnik.wkbByteOrder.NDR)
+
+
+@pytest.mark.parametrize('coords,offsets', [
+    (np.zeros((4, 3)), [0, 4]),
+    (np.zeros(5), [0, 2]),
+    (np.zeros((4, 2)), [0, 3]),
+    (np.zeros((4, 2)), [1, 4]),
+    (np.zeros((4, 2)), [0, 3, 2, 4]),
+    (np.zeros((4, 2)), []),
+])
+def test_from_arrays_invalid(coords, offsets):
+    with pytest.raises(RuntimeError):
+        mapnik.MultiLineString.from_arrays(coords, offsets)
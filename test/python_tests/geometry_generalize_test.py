@@ -0,0 +1,84 @@
+import mapnik
+import pytest
+
+BOX = mapnik.Box2d(0, 0, 10, 10)
+
+
+def envelope(geom):
+    box = geom.envelope()
+    return [box.minx, box.miny, box.maxx, box.maxy]
+
+
+def test_clip_points_and_lines():
+    assert mapnik.Geometry.from_wkt('POINT(5 5)').clip(BOX).to_wkt() == 'POINT(5 5)'
+    assert mapnik.Geometry.from_wkt('POINT(15 5)').clip(BOX).is_empty()
+    assert mapnik.Geometry.from_wkt('MULTIPOINT(1 1,20 20,2 2)').clip(BOX).to_wkt() == 'MULTIPOINT(1 1,2 2)'
+    assert mapnik.Geometry.from_wkt('LINESTRING(-5 5,15 5)').clip(BOX).to_wkt() == 'LINESTRING(0 5,10 5)'
+    # leaving and re-entering the box splits the line
+    line = mapnik.Geometry.from_wkt('LINESTRING(2 2,2 20,8 20,8 2)').clip(BOX)
+    assert line.type() == mapnik.GeometryType.MultiLineString
+    assert envelope(line) == [2, 2, 8, 10]
+    assert mapnik.Geometry.from_wkt('LINESTRING(20 20,30 30)').clip(BOX).is_empty()
+
+
+def test_clip_polygons():
+    square = mapnik.Geometry.from_wkt('POLYGON((-5 -5,5 -5,5 5,-5 5,-5 -5))')
+    clipped = square.clip(BOX)
+    assert clipped.type() == mapnik.GeometryType.Polygon
+    assert envelope(clipped) == [0, 0, 5, 5]
+    # a U shape cut across both arms comes back as two polygons
+    u_shape = mapnik.Geometry.from_wkt('POLYGON((1 5,1 20,9 20,9 5,7 5,7 15,3 15,3 5,1 5))')
+    clipped = u_shape.clip(BOX)
+    assert clipped.type() == mapnik.GeometryType.MultiPolygon
+    assert envelope(clipped) == [1, 5, 9, 10]
+    inside = 'POLYGON((1 1,2 1,2 2,1 2,1 1))'
+    assert mapnik.Geometry.from_wkt(inside).clip(BOX).to_wkt() == inside
+
+
+def test_clip_collection():
+    geom = mapnik.Geometry.from_wkt('GEOMETRYCOLLECTION(POINT(20 20),LINESTRING(-5 5,15 5))')
+    assert geom.clip(BOX).to_wkt() == 'GEOMETRYCOLLECTION(LINESTRING(0 5,10 5))'
+
+
+@pytest.mark.parametrize('algorithm', ['douglas-peucker', 'visvalingam-whyatt', 'radial-distance'])
+def test_simplify_line(algorithm):
+    line = mapnik.Geometry.from_wkt('LINESTRING(0 0,1 0.01,2 0,3 0.01,4 0,10 0)')
+    assert line.simplify(0, algorithm).to_wkt() == line.to_wkt()
+    simplified = line.simplify(3, algorithm)
+    assert simplified.type() == mapnik.GeometryType.LineString
+    assert len(simplified.to_wkt()) < len(line.to_wkt())
+    assert envelope(simplified) == [0, 0, 10, 0]
+
+
+def test_simplify_polygon():
+    poly = mapnik.Geometry.from_wkt('POLYGON((0 0,5 0.01,10 0,10 10,0 10,0 0))')
+    assert poly.simplify(0.1).to_wkt() == 'POLYGON((0 0,10 0,10 10,0 10,0 0))'
+    assert envelope(poly.simplify(0.1, algorithm='visvalingam-whyatt')) == [0, 0, 10, 10]
+    # rings simplified below a triangle are dropped
+    tiny = mapnik.Geometry.from_wkt('MULTIPOLYGON(((0 0,10 0,10 10,0 10,0 0)),((20 20,20.1 20,20.1 20.1,20 20)))')
+    assert tiny.simplify(1).type() == mapnik.GeometryType.MultiPolygon
+    assert envelope(tiny.simplify(1)) == [0, 0, 10, 10]
+    assert mapnik.Geometry.from_wkt('POINT(1 2)').simplify(10).to_wkt() == 'POINT(1 2)'
+
+
+def test_simplify_invalid_arguments():
+    line = mapnik.Geometry.from_wkt('LINESTRING(0 0,1 1)')
+    with pytest.raises(RuntimeError):
+        line.simplify(1, algorithm='bogus')
+    with pytest.raises(RuntimeError):
+        line.simplify(-1)
+
+
+@pytest.mark.parametrize('threads', [1, 0, 3])
+def test_geometry_array_clip_and_simplify(threads):
+    wkts = ['POINT(5 5)', 'LINESTRING(-5 5,15 5)', 'POLYGON((-5 -5,5 -5,5 5,-5 5,-5 -5))',
+            'LINESTRING(0 0,1 0.01,2 0,3 0.01,4 0,10 0)', 'POINT(15 15)'] * 20
+    geoms = mapnik.GeometryArray([mapnik.Geometry.from_wkt(w) for w in wkts])
+    clipped = geoms.clip(BOX, threads=threads)
+    assert isinstance(clipped, mapnik.GeometryArray)
+    assert clipped.to_wkt() == [mapnik.Geometry.from_wkt(w).clip(BOX).to_wkt() for w in wkts]
+    simplified = clipped.simplify(1, 'visvalingam-whyatt', threads=threads)
+    assert simplified.to_wkt() == [g.simplify(1, 'visvalingam-whyatt').to_wkt()
+                                   for g in (clipped[i] for i in range(len(clipped)))]
+    with pytest.raises(RuntimeError):
+        geoms.simplify(1, 'bogus')
@@ -0,0 +1,164 @@
+import json
+import os
+import random
+import struct
+
+import mapnik
+import pytest
+from mapnik import index
+
+
+def write_points(base, points):
+    """Write a point shapefile with a single 'name' column."""
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+
+    def header(length):
+        return (struct.pack('>7i', 9994, 0, 0, 0, 0, 0, length // 2) +
+                struct.pack('<2i4d4d', 1000, 1, min(xs), min(ys), max(xs), max(ys), 0, 0, 0, 0))
+    with open(base + '.shp', 'wb') as shp, open(base + '.shx', 'wb') as shx:
+        shp.write(header(100 + 28 * len(points)))
+        shx.write(header(100 + 8 * len(points)))
+        for i, (x, y) in enumerate(points):
+            shx.write(struct.pack('>2i', (100 + 28 * i) // 2, 10))
+            shp.write(struct.pack('>2i', i + 1, 10) + struct.pack('<i2d', 1, x, y))
+    with open(base + '.dbf', 'wb') as dbf:
+        dbf.write(struct.pack('<4BI2H20x', 3, 124, 1, 1, len(points), 65, 11))
+        dbf.write(struct.pack('<11sc4x2B14x', b'name', b'C', 10, 0) + b'\r')
+        for i in range(len(points)):
+            dbf.write(b' ' + ('p%d' % i).encode('ascii').ljust(10))
+        dbf.write(b'\x1a')
+
+
+@pytest.fixture
+def points():
+    rnd = random.Random(7)
+    return [(rnd.uniform(-180, 180), rnd.uniform(-85, 85)) for _ in range(300)]
+
+
+def query(bbox):
+    q = mapnik.Query(bbox)
+    q.add_property_name('name')
+    return q
+
+
+def names_in(ds, bbox):
+    return sorted(f['name'] for f in ds.features(query(bbox)))
+
+
+def expected(points, bbox):
+    return sorted('p%d' % i for i, (x, y) in enumerate(points)
+                  if bbox.minx <= x <= bbox.maxx and bbox.miny <= y <= bbox.maxy)
+
+
+BBOX = mapnik.Box2d(-20, -10, 40, 30)
+
+
+def test_build_shapefile_index(tmp_path, points):
+    base = str(tmp_path / 'points')
+    write_points(base, points)
+    assert index.build(base + '.shp') == {base + '.shp': 300}
+    assert (tmp_path / 'points.index').exists()
+    assert not (tmp_path / 'points.index.tmp').exists()
+    ds = mapnik.Shapefile(file=base + '.shp')
+    assert names_in(ds, BBOX) == expected(points, BBOX)
+
+
+def test_build_csv_and_geojson_index(tmp_path, points):
+    csv_path = str(tmp_path / 'points.csv')
+    with open(csv_path, 'w') as f:
+        f.write('name,x,y\n')
+        for i, (x, y) in enumerate(points):
+            f.write('"p%d",%r,%r\n' % (i, x, y))
+    json_path = str(tmp_path / 'points.geojson')
+    with open(json_path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {'name': 'p%d' % i},
+             'geometry': {'type': 'Point', 'coordinates': [x, y]}}
+            for i, (x, y) in enumerate(points)]}, f, indent=1)
+    counts = index.build([csv_path, json_path], threads=2)
+    assert counts == {csv_path: 300, json_path: 300}
+    ds = mapnik.Datasource(type='csv', file=csv_path)
+    assert names_in(ds, BBOX) == expected(points, BBOX)
+    ds = mapnik.Datasource(type='geojson', file=json_path, cache_features=False)
+    assert names_in(ds, BBOX) == expected(points, BBOX)
+
+
+def test_csv_index_skips_quoted_newlines(tmp_path):
+    path = str(tmp_path / 'multiline.csv')
+    with open(path, 'w') as f:
+        f.write('wkt|name\n"POINT (1 2)"|"a\nb"\n"LINESTRING (0 0, 5 5)"|c\n')
+    assert index.build(path) == {path: 2}
+    ds = mapnik.Datasource(type='csv', file=path)
+    assert sorted(f['name'] for f in ds) == ['a\nb', 'c']
+
+
+def test_hilbert_sort_shapefile(tmp_path, points):
+    base = str(tmp_path / 'points')
+    write_points(base, points)
+    assert index.build(base + '.shp', hilbert=True)[base + '.shp'] == 300
+    ds = mapnik.Shapefile(file=base + '.shp')
+    features = list(ds.features(query(ds.envelope())))
+    assert len(features) == 300
+    # attributes moved along with their geometries
+    for f in features:
+        env = f.envelope()
+        assert (env.minx, env.miny) == points[int(f['name'][1:])]
+    assert [f['name'] for f in features] != ['p%d' % i for i in range(300)]
+    assert names_in(ds, BBOX) == expected(points, BBOX)
+
+
+def test_hilbert_sort_geojson_keeps_neighbours_together(tmp_path):
+    path = str(tmp_path / 'grid.geojson')
+    coords = [(x, y) for y in range(16) for x in range(16)]
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {'x': x, 'y': y},
+             'geometry': {'type': 'Point', 'coordinates': [x, y]}} for x, y in coords]}, f)
+    assert index.hilbert_sort(path) == 256
+    with open(path) as f:
+        ordered = [tuple(feat['geometry']['coordinates']) for feat in json.load(f)['features']]
+    assert sorted(ordered) == sorted(coords)
+    # consecutive cells along a Hilbert curve are always adjacent
+    for (x0, y0), (x1, y1) in zip(ordered, ordered[1:]):
+        assert abs(x0 - x1) + abs(y0 - y1) == 1
+
+
+def test_hilbert_sort_rebuilds_existing_index(tmp_path, points):
+    base = str(tmp_path / 'points')
+    write_points(base, points)
+    index.build(base + '.shp')
+    with open(base + '.index', 'rb') as f:
+        before = f.read()
+    assert index.hilbert_sort(base + '.shp') == 300
+    with open(base + '.index', 'rb') as f:
+        assert f.read() != before
+    ds = mapnik.Shapefile(file=base + '.shp')
+    for f in ds.features(query(BBOX)):
+        env = f.envelope()
+        assert (env.minx, env.miny) == points[int(f['name'][1:])]
+    assert names_in(ds, BBOX) == expected(points, BBOX)
+
+
+def test_build_accepts_bytes_and_path_like(tmp_path, points):
+    base = str(tmp_path / 'points')
+    write_points(base, points)
+    path = base + '.csv'
+    with open(path, 'w') as f:
+        f.write('x;y;name\n')
+        for i, (x, y) in enumerate(points):
+            f.write('%r;%r;p%d\n' % (x, y, i))
+    counts = index.build([os.fsencode(base + '.shp'), tmp_path / 'points.csv'])
+    assert counts == {base + '.shp': 300, path: 300}
+    ds = mapnik.Datasource(type='csv', file=path)
+    assert names_in(ds, BBOX) == expected(points, BBOX)
+    assert index.hilbert_sort(os.fsencode(base + '.shp')) == 300
+
+
+def test_unknown_kind(tmp_path):
+    with pytest.raises(ValueError):
+        index.build(str(tmp_path / 'data.txt'))
+    with pytest.raises(ValueError):
+        index.hilbert_sort(str(tmp_path / 'data.csv'))
+    with pytest.raises(ValueError):
+        index.build(str(tmp_path / 'data.csv'), kind='kml')
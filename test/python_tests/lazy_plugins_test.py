@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+def run_python(code, lazy):
+    env = dict(os.environ, MAPNIK_LAZY_PLUGINS='1' if lazy else '0')
+    out = subprocess.run([sys.executable, '-c', code], env=env,
+                         stdout=subprocess.PIPE, check=True)
+    return out.stdout.decode('utf-8').strip()
+
+
+def loaded_plugin_files():
+    # input plugins mapped into this process, read back from the child
+    return ("import re\n"
+            "with open('/proc/self/maps') as f:\n"
+            "    print(sorted(set(re.findall(r'/([^/\\s]+\\.input)$', f.read(), re.M))))\n")
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason='needs /proc')
+def test_lazy_import_loads_no_plugins():
+    assert run_python('import mapnik\n' + loaded_plugin_files(), lazy=True) == '[]'
+    assert run_python('import mapnik\n' + loaded_plugin_files(), lazy=False) != '[]'
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason='needs /proc')
+def test_lazy_plugin_loaded_on_first_use():
+    code = ('import mapnik\n'
+            "ds = mapnik.Datasource(type='csv', inline='x,y\\n0,0\\n')\n"
+            'assert len(list(ds)) == 1\n' + loaded_plugin_files())
+    assert run_python(code, lazy=True) == "['csv.input']"
+
+
+def test_lazy_plugin_names_and_pending():
+    code = ('import mapnik\n'
+            'names = mapnik.DatasourceCache.plugin_names()\n'
+            'pending = mapnik.DatasourceCache.pending_plugins()\n'
+            "assert 'csv' in names and 'csv' in pending\n"
+            "mapnik.CSV(inline='x,y\\n0,0\\n')\n"
+            "assert 'csv' not in mapnik.DatasourceCache.pending_plugins()\n"
+            "assert 'csv' in mapnik.DatasourceCache.plugin_names()\n"
+            'mapnik.DatasourceCache.load_pending_plugins()\n'
+            'print(mapnik.DatasourceCache.pending_plugins())\n')
+    assert run_python(code, lazy=True) == '[]'
+
+
+def test_lazy_plugins_with_load_map():
+    code = ('import mapnik\n'
+            "xml = '''<Map><Layer name=\"l\"><Datasource>"
+            "<Parameter name=\"type\">csv</Parameter>"
+            "<Parameter name=\"inline\">x,y\n0,0\n</Parameter>"
+            "</Datasource></Layer></Map>'''\n"
+            'm = mapnik.Map(256, 256)\n'
+            'mapnik.load_map_from_string(m, xml)\n'
+            'print(len(list(m.layers[0].datasource)))\n')
+    assert run_python(code, lazy=True) == '1'
+
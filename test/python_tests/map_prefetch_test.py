@@ -0,0 +1,62 @@
+import mapnik
+import pytest
+
+
+def make_map(datasources):
+    m = mapnik.Map(256, 256)
+    s = mapnik.Style()
+    r = mapnik.Rule()
+    r.symbolizers.append(mapnik.DotSymbolizer())
+    s.rules.append(r)
+    m.append_style('points', s)
+    for i, ds in enumerate(datasources):
+        lyr = mapnik.Layer('layer-%d' % i)
+        lyr.datasource = ds
+        lyr.styles.append('points')
+        m.layers.append(lyr)
+    m.zoom_to_box(mapnik.Box2d(0, 0, 100, 100))
+    return m
+
+
+def csv(*points):
+    return mapnik.CSV(inline='x,y,name\n' + ''.join('%s,%s,p%d\n' % (x, y, i) for i, (x, y) in enumerate(points)))
+
+
+def test_prefetch_counts_and_restore():
+    ds1 = csv((10, 10), (20, 20))
+    ds2 = csv((50, 50), (500, 500))
+    m = make_map([ds1, ds2])
+    counts = m.prefetch(threads=2)
+    assert counts == {'layer-0': 2, 'layer-1': 1}
+    # prefetched layers keep the original datasource description
+    assert m.layers[0].datasource.parameters()['type'] == 'csv'
+    m.clear_prefetch()
+    assert m.layers[0].datasource is ds1
+    assert m.layers[1].datasource is ds2
+
+
+def test_prefetch_render_matches():
+    m = make_map([csv((10, 10), (20, 20)), csv((50, 50))])
+    expected = mapnik.Image(256, 256)
+    mapnik.render(m, expected)
+    m.prefetch()
+    im = mapnik.Image(256, 256)
+    mapnik.render(m, im)
+    m.clear_prefetch()
+    assert im.to_string() == expected.to_string()
+
+
+def test_prefetch_outside_extent_falls_back():
+    m = make_map([csv((10, 10), (200, 200))])
+    m.prefetch(extent=mapnik.Box2d(0, 0, 50, 50))
+    features = list(m.layers[0].datasource.features(mapnik.Query(mapnik.Box2d(0, 0, 300, 300))))
+    assert len(features) == 2
+    features = list(m.layers[0].datasource.features(mapnik.Query(mapnik.Box2d(0, 0, 50, 50))))
+    assert len(features) == 1
+    m.clear_prefetch()
+
+
+def test_prefetch_invalid_extent():
+    m = make_map([csv((10, 10))])
+    with pytest.raises(RuntimeError):
+        m.prefetch(extent=mapnik.Box2d(0, 0, 0, 0))
@@ -0,0 +1,54 @@
+import mapnik
+import pytest
+
+
+@pytest.fixture
+def points_map():
+    m = mapnik.Map(256, 256)
+    for name, rows in (('cities', '10,10,a\n50,50,b\n'), ('towns', '10,10,c\n90,90,d\n')):
+        lyr = mapnik.Layer(name)
+        lyr.datasource = mapnik.CSV(inline='x,y,name\n' + rows)
+        m.layers.append(lyr)
+    m.zoom_to_box(mapnik.Box2d(0, 0, 100, 100))
+    return m
+
+
+def test_query_points_all_layers(points_map):
+    hits = points_map.query_points([(10, 10), (50, 50), (30, 30)])
+    assert len(hits) == 3
+    assert sorted((h['layer'], h['properties']['name']) for h in hits[0]) == [('cities', 'a'), ('towns', 'c')]
+    assert [h['properties']['name'] for h in hits[1]] == ['b']
+    assert hits[2] == []
+
+
+def test_query_points_layer_selection(points_map):
+    hits = points_map.query_points([(10, 10)], layers=['towns'], fields=['name'])
+    assert [(h['layer'], h['properties']) for h in hits[0]] == [('towns', {'name': 'c'})]
+    hits = points_map.query_points([(10, 10)], layers=[0], fields=[])
+    assert [(h['layer'], h['properties']) for h in hits[0]] == [('cities', {})]
+
+
+def test_query_points_numpy(points_map):
+    np = pytest.importorskip('numpy')
+    hits = points_map.query_points(np.array([[90.0, 90.0], [10.0, 10.0]]), layers=['towns'])
+    assert [h['properties']['name'] for h in hits[0]] == ['d']
+    assert [h['properties']['name'] for h in hits[1]] == ['c']
+
+
+def test_query_points_tolerance(points_map):
+    # 3 pixels at 256px over 100 units is ~1.2 units
+    assert points_map.query_points([(11, 11)], layers=['cities'])[0] != []
+    assert points_map.query_points([(11, 11)], layers=['cities'], tolerance=0)[0] == []
+
+
+def test_query_points_bad_layer(points_map):
+    with pytest.raises(IndexError):
+        points_map.query_points([(10, 10)], layers=['missing'])
+
+
+def test_query_points_duplicate_and_inactive_layers(points_map):
+    hits = points_map.query_points([(10, 10)], layers=['towns', 1, 'towns'])
+    assert [h['layer'] for h in hits[0]] == ['towns']
+    points_map.layers[1].active = False
+    hits = points_map.query_points([(10, 10)])
+    assert [h['layer'] for h in hits[0]] == ['cities']
@@ -0,0 +1,87 @@
+import mapnik
+import pytest
+
+
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">'
+       '<circle cx="5" cy="5" r="4" fill="red"/></svg>')
+
+
+@pytest.fixture
+def warm_map(tmp_path):
+    faces = mapnik.FontEngine.face_names()
+    if not faces:
+        pytest.skip('no fonts registered')
+    svg = tmp_path / 'marker.svg'
+    svg.write_text(SVG)
+    # load_map checks files exist, so this one is removed after loading
+    missing = tmp_path / 'missing.svg'
+    missing.write_text(SVG)
+    xml = '''<Map srs="epsg:3857">
+      <FontSet name="fonts"><Font face-name="%(face)s"/></FontSet>
+      <Style name="points">
+        <Rule>
+          <MarkersSymbolizer file="%(svg)s"/>
+          <PointSymbolizer file="[icon]"/>
+          <TextSymbolizer fontset-name="fonts" size="10">[name]</TextSymbolizer>
+        </Rule>
+        <Rule>
+          <MaxScaleDenominator>1000</MaxScaleDenominator>
+          <MarkersSymbolizer file="%(missing)s"/>
+        </Rule>
+      </Style>
+      <Layer name="csv" srs="epsg:4326">
+        <StyleName>points</StyleName>
+        <Datasource>
+          <Parameter name="type">csv</Parameter>
+          <Parameter name="inline">x,y,name,icon
+1,2,a,b.png
+</Parameter>
+        </Datasource>
+      </Layer>
+    </Map>''' % {'face': faces[0], 'svg': svg, 'missing': missing}
+    m = mapnik.Map(256, 256)
+    mapnik.load_map_from_string(m, xml)
+    missing.unlink()
+    return m, faces[0], str(svg), str(missing)
+
+
+def test_warmup_report(warm_map):
+    m, face, svg, missing = warm_map
+    report = m.warmup()
+    assert report['fonts']['count'] == 1
+    assert report['fonts']['missing'] == []
+    # the attribute based [icon] path can't be loaded ahead of time
+    assert report['markers']['count'] == 1
+    assert report['markers']['missing'] == [missing]
+    assert report['datasources']['count'] == 1
+    assert report['datasources']['failed'] == []
+    assert report['projections']['count'] == 1
+    for step in ('fonts', 'markers', 'datasources', 'projections'):
+        assert report[step]['seconds'] >= 0
+    assert report['seconds'] >= 0
+
+
+def test_warmup_scales(warm_map):
+    m, face, svg, missing = warm_map
+    # the rule with the missing marker is only active up to 1:1000
+    report = m.warmup(scales=[1e6])
+    assert report['markers']['missing'] == []
+    assert m.warmup(scales=[500])['markers']['missing'] == [missing]
+
+
+def test_warmup_missing_font():
+    m = mapnik.Map(256, 256)
+    fontset = mapnik.FontSet('broken')
+    fontset.add_face_name('No Such Font Regular')
+    m.append_fontset('broken', fontset)
+    report = m.warmup()
+    assert report['fonts']['missing'] == ['No Such Font Regular']
+    assert report['datasources']['count'] == 0
+
+
+def test_warmup_then_render(warm_map):
+    m, _, _, _ = warm_map
+    m.warmup()
+    m.zoom_all()
+    im = mapnik.Image(m.width, m.height)
+    mapnik.render(m, im)
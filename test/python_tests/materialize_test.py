@@ -0,0 +1,51 @@
+import mapnik
+import pytest
+
+
+@pytest.fixture
+def csv_datasource():
+    return mapnik.CSV(inline='x,y,name,pop\n'
+                             '0,0,null island,0\n'
+                             '10,10,ten,10\n'
+                             '-120,45,west,100\n')
+
+
+def test_materialize_keeps_features(csv_datasource):
+    ds = csv_datasource.materialize()
+    assert ds.fields() == csv_datasource.fields()
+    features = list(ds)
+    assert [f['name'] for f in features] == ['null island', 'ten', 'west']
+    assert ds.envelope() == csv_datasource.envelope()
+
+
+def test_materialize_bbox_query(csv_datasource):
+    for index in (True, False):
+        ds = csv_datasource.materialize(index=index)
+        query = mapnik.Query(mapnik.Box2d(-1, -1, 11, 11))
+        query.add_property_name('name')
+        assert [f['name'] for f in ds.features(query)] == ['null island', 'ten']
+
+
+def test_materialize_fields(csv_datasource):
+    ds = csv_datasource.materialize(fields=['name'])
+    assert ds.fields() == ['name']
+    feature = next(iter(ds))
+    assert not feature.has_key('pop')
+
+
+def test_materialize_reproject(csv_datasource):
+    ds = csv_datasource.materialize(target_srs='epsg:3857')
+    features = list(ds)
+    assert features[0].geometry.to_wkt() == 'POINT(0 0)'
+    transform = mapnik.ProjTransform(mapnik.Projection('epsg:4326'), mapnik.Projection('epsg:3857'))
+    expected = transform.forward(mapnik.Coord(10, 10))
+    envelope = features[1].geometry.envelope()
+    assert envelope.minx == pytest.approx(expected.x)
+    assert envelope.miny == pytest.approx(expected.y)
+
+
+def test_materialize_for_layer(csv_datasource):
+    lyr = mapnik.Layer('cities')
+    lyr.datasource = csv_datasource.materialize(target_srs='epsg:3857', source_srs=lyr.srs)
+    lyr.srs = 'epsg:3857'
+    assert len(list(lyr.datasource)) == 3
@@ -1,5 +1,6 @@
 import os
 import pickle
+import struct
 import pytest
 import mapnik
 from .utilities import execution_path
@@ -32,3 +33,94 @@ def test_projection_pickle():
 def test_coord_pickle():
     c = mapnik.Coord(-1, 52)
     assert pickle.loads(pickle.dumps(c)) == c
+
+def test_geometry_pickle():
+    for wkt in ['POINT(30 10)',
+                'POLYGON((35 10,10 20,15 40,45 45,35 10),(20 30,35 35,30 20,20 30))',
+                'GEOMETRYCOLLECTION(POINT(4 6),LINESTRING(4 6,7 10))']:
+        geom = mapnik.Geometry.from_wkt(wkt)
+        assert pickle.loads(pickle.dumps(geom)).to_wkt() == wkt
+    empty = pickle.loads(pickle.dumps(mapnik.Geometry.from_wkt('GEOMETRYCOLLECTION EMPTY')))
+    assert empty.is_empty()
+
+def test_context_pickle():
+    ctx = mapnik.Context()
+    ctx.push('name')
+    ctx.push('value')
+    feat = mapnik.Feature(pickle.loads(pickle.dumps(ctx)), 1)
+    feat['value'] = 2
+    assert list(feat.attributes.keys()) == ['name', 'value']
+
+def make_features():
+    ctx = mapnik.Context()
+    features = []
+    for i in range(3):
+        feat = mapnik.Feature(ctx, i + 1)
+        feat.geometry = mapnik.Geometry.from_wkt('POINT({} {})'.format(i, -i))
+        feat['name'] = 'avión {}'.format(i)
+        feat['count'] = i
+        feat['ratio'] = i / 2.0
+        feat['flag'] = i % 2 == 0
+        features.append(feat)
+    features.append(mapnik.Feature(mapnik.Context(), 9))
+    return features
+
+def test_feature_pickle():
+    for feat in make_features():
+        copy = pickle.loads(pickle.dumps(feat))
+        assert copy.id() == feat.id()
+        assert copy.attributes == feat.attributes
+        assert copy.geometry.to_wkt() == feat.geometry.to_wkt()
+    copy = pickle.loads(pickle.dumps(make_features()[0]))
+    assert type(copy['flag']) is bool
+    assert type(copy['count']) is int
+
+def test_dumps_loads_features():
+    features = make_features()
+    data = mapnik.dumps_features(features)
+    assert isinstance(data, bytes)
+    loaded = mapnik.loads_features(data)
+    assert [f.__geo_interface__ for f in loaded] == [f.__geo_interface__ for f in features]
+    # features sharing a context keep sharing one
+    loaded[0]['extra'] = 1
+    assert 'extra' in loaded[1].attributes
+    assert 'extra' not in loaded[3].attributes
+    ctx = mapnik.Context()
+    rebound = mapnik.loads_features(memoryview(data), ctx)
+    assert all(f.context() is ctx for f in rebound)
+    assert [f.__geo_interface__ for f in rebound] == [f.__geo_interface__ for f in features]
+    assert 'name' in mapnik.Feature(ctx, 1).attributes
+    assert mapnik.loads_features(mapnik.dumps_features([])) == []
+
+def test_dumps_features_featureset():
+    ds = mapnik.MemoryDatasource()
+    for feat in make_features()[:3]:
+        ds.add_feature(feat)
+    loaded = mapnik.loads_features(mapnik.dumps_features(ds.features(mapnik.Query(ds.envelope()))))
+    assert sorted(f.id() for f in loaded) == [1, 2, 3]
+
+def test_loads_features_invalid():
+    data = mapnik.dumps_features(make_features())
+    with pytest.raises(RuntimeError):
+        mapnik.loads_features(b'not features')
+    with pytest.raises(RuntimeError):
+        mapnik.loads_features(data[:-3])
+    with pytest.raises(RuntimeError):
+        mapnik.loads_features(data + b'\x00')
+
+def test_loads_features_little_endian():
+    # the format is little endian on every host
+    data = (b'MNKF\x01' + struct.pack('<II', 1, 1) + struct.pack('<I', 0) + struct.pack('<I', 1) + b'a' +
+            struct.pack('<QIqII', 1, 0, 7, 0, 1) + struct.pack('<IBq', 0, 2, 42))
+    feature, = mapnik.loads_features(data)
+    assert feature.id() == 7
+    assert feature['a'] == 42
+    assert mapnik.dumps_features([feature]) == data
+
+def test_loads_features_huge_counts():
+    # counts are checked against the data left before anything is allocated
+    header = b'MNKF\x01'
+    with pytest.raises(RuntimeError, match='truncated'):
+        mapnik.loads_features(header + struct.pack('<I', 0xffffffff))
+    with pytest.raises(RuntimeError, match='truncated'):
+        mapnik.loads_features(header + struct.pack('<II', 1, 0xffffffff))
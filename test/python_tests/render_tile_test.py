@@ -0,0 +1,67 @@
+import mapnik
+import pytest
+
+
+@pytest.fixture
+def point_map():
+    m = mapnik.Map(256, 256)
+    m.background = mapnik.Color('steelblue')
+    s = mapnik.Style()
+    r = mapnik.Rule()
+    r.symbolizers.append(mapnik.DotSymbolizer())
+    s.rules.append(r)
+    m.append_style('points', s)
+    lyr = mapnik.Layer('points')
+    lyr.datasource = mapnik.CSV(inline='x,y\n10,10\n')
+    lyr.styles.append('points')
+    m.layers.append(lyr)
+    return m
+
+
+def test_map_has_features(point_map):
+    point_map.zoom_to_box(mapnik.Box2d(0, 0, 20, 20))
+    assert point_map.has_features()
+    point_map.zoom_to_box(mapnik.Box2d(50, 50, 70, 70))
+    assert not point_map.has_features()
+    point_map.layers[0].active = False
+    point_map.zoom_to_box(mapnik.Box2d(0, 0, 20, 20))
+    assert not point_map.has_features()
+
+
+def test_render_tile_skip_empty(point_map):
+    point_map.zoom_to_box(mapnik.Box2d(50, 50, 70, 70))
+    blank = mapnik.render_tile(point_map, 'png', skip_empty=True)
+    assert mapnik.render_tile(point_map, 'png') == blank
+    # the cached background is reused for other empty extents
+    point_map.zoom_to_box(mapnik.Box2d(80, 80, 100, 100))
+    assert mapnik.render_tile(point_map, 'png', skip_empty=True) is blank
+    im = mapnik.Image.from_string(blank)
+    assert im.is_solid()
+
+
+def test_render_tile_with_features(point_map):
+    point_map.zoom_to_box(mapnik.Box2d(0, 0, 20, 20))
+    encoded = mapnik.render_tile(point_map, 'png', skip_empty=True)
+    assert not mapnik.Image.from_string(encoded).is_solid()
+
+
+def test_map_has_features_layer_buffer_size(point_map):
+    # the point is one map unit (12.8 pixels) outside the extent
+    point_map.zoom_to_box(mapnik.Box2d(11, 11, 31, 31))
+    assert not point_map.has_features()
+    point_map.layers[0].buffer_size = 16
+    assert point_map.has_features()
+    point_map.buffer_size = 16
+    point_map.layers[0].buffer_size = 4
+    assert not point_map.has_features()
+
+
+def test_render_tile_blank_cache_is_bounded(point_map, monkeypatch):
+    monkeypatch.setattr(mapnik, '_BLANK_TILES_MAX', 2)
+    mapnik._blank_tiles.clear()
+    for size in (16, 32, 48):
+        point_map.resize(size, size)
+        point_map.zoom_to_box(mapnik.Box2d(50, 50, 70, 70))
+        mapnik.render_tile(point_map, 'png', skip_empty=True)
+    assert len(mapnik._blank_tiles) == 2
+    assert [key[:2] for key in mapnik._blank_tiles] == [(32, 32), (48, 48)]
@@ -0,0 +1,73 @@
+import mapnik
+import pytest
+from mapnik import tiles
+
+
+@pytest.fixture
+def zurich_map():
+    m = mapnik.Map(256, 256)
+    m.srs = 'epsg:3857'
+    lyr = mapnik.Layer('points')
+    lyr.datasource = mapnik.CSV(inline='x,y,name\n8.5,47.3,zurich\n')
+    lyr.styles.append('points')
+    m.layers.append(lyr)
+    return m
+
+
+def test_tile_bbox():
+    assert tiles.tile_bbox(0, 0, 0) == mapnik.Box2d(-tiles.MERCATOR_MAX, -tiles.MERCATOR_MAX,
+                                                    tiles.MERCATOR_MAX, tiles.MERCATOR_MAX)
+    box = tiles.tile_bbox(1, 1, 0)
+    assert box.minx == pytest.approx(0)
+    assert box.miny == pytest.approx(0)
+
+
+def test_scale_denominator_matches_map():
+    m = mapnik.Map(256, 256)
+    m.srs = 'epsg:3857'
+    m.zoom_to_box(tiles.tile_bbox(3, 1, 1))
+    assert tiles.scale_denominator(3) == pytest.approx(m.scale_denominator())
+
+
+def test_datasource_has_features():
+    ds = mapnik.CSV(inline='x,y\n1,1\n')
+    assert ds.has_features(mapnik.Box2d(0, 0, 2, 2))
+    assert not ds.has_features(mapnik.Box2d(5, 5, 6, 6))
+
+
+def test_plan_only_tiles_with_data(zurich_map):
+    planned = list(tiles.plan(zurich_map, range(0, 6)))
+    assert [(t.z, t.x, t.y) for t in planned] == [(0, 0, 0), (1, 1, 0), (2, 2, 1), (3, 4, 2), (4, 8, 5), (5, 16, 11)]
+    assert not any(t.empty for t in planned)
+
+
+def test_plan_include_empty(zurich_map):
+    planned = list(tiles.plan(zurich_map, range(0, 4), include_empty=True))
+    assert len(planned) == 1 + 4 + 16 + 64
+    assert sum(1 for t in planned if not t.empty) == 4
+
+
+def test_plan_bbox_and_scale_limits(zurich_map):
+    assert list(tiles.plan(zurich_map, [5], bbox=(-10, -10, 0, 0))) == []
+    zurich_map.layers[0].minimum_scale_denominator = tiles.scale_denominator(3)
+    planned = list(tiles.plan(zurich_map, range(0, 6)))
+    assert [t.z for t in planned] == [0, 1, 2, 3]
+
+
+def test_plan_skips_layers_without_styles(zurich_map):
+    zurich_map.layers[0].styles.clear()
+    assert list(tiles.plan(zurich_map, range(0, 3))) == []
+
+
+def test_plan_layer_buffer_size_wins(zurich_map):
+    def planned():
+        return sorted((t.x, t.y) for t in tiles.plan(zurich_map, [5]))
+    lyr = zurich_map.layers[0]
+    zurich_map.buffer_size = 64
+    buffered = planned()
+    assert len(buffered) > 1
+    lyr.buffer_size = 0
+    assert planned() == [(16, 11)]
+    zurich_map.buffer_size = 0
+    lyr.buffer_size = 64
+    assert planned() == buffered
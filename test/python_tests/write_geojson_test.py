@@ -0,0 +1,71 @@
+import io
+import json
+
+import mapnik
+import pytest
+
+
+@pytest.fixture
+def ds():
+    return mapnik.Datasource(type='csv', inline='wkt,name,value\n'
+                             '"POINT (1.123456789 2)",a "quoted",1\n'
+                             '"LINESTRING (0 0, 1 1)",b,2.5\n'
+                             '"POLYGON ((0 0, 4 0, 4 4, 0 0))",c;d,\n')
+
+
+def test_datasource_write_geojson(ds):
+    out = io.BytesIO()
+    assert ds.write_geojson(None, out) == 3
+    collection = json.loads(out.getvalue().decode('utf-8'))
+    assert collection['type'] == 'FeatureCollection'
+    features = collection['features']
+    assert [f['geometry']['type'] for f in features] == ['Point', 'LineString', 'Polygon']
+    assert features[0]['properties'] == {'name': 'a "quoted"', 'value': 1}
+    assert features[1]['properties']['value'] == 2.5
+    assert features[0]['id'] == list(ds)[0].id()
+    # same content as the per feature serializer
+    expected = [json.loads(f.to_geojson()) for f in ds]
+    assert features == expected
+
+
+def test_write_ndjson_fields_and_precision(ds):
+    out = io.BytesIO()
+    assert ds.write_geojson(None, out, ndjson=True, precision=2, fields=['name']) == 3
+    lines = out.getvalue().decode('utf-8').splitlines()
+    assert len(lines) == 3
+    first = json.loads(lines[0])
+    assert first['geometry']['coordinates'] == [1.12, 2]
+    assert first['properties'] == {'name': 'a "quoted"'}
+
+
+def test_featureset_write_geojson_query(ds):
+    out = io.BytesIO()
+    query = mapnik.Query(mapnik.Box2d(0.5, 1.5, 1.5, 2.5))
+    query.add_property_name('name')
+    fs = ds.features(query)
+    assert fs.write_geojson(out) == 2
+    names = [f['properties']['name'] for f in json.loads(out.getvalue())['features']]
+    assert sorted(names) == ['a "quoted"', 'c;d']
+
+
+def test_write_geojson_empty():
+    ds = mapnik.MemoryDatasource()
+    out = io.BytesIO()
+    assert ds.write_geojson(None, out) == 0
+    assert json.loads(out.getvalue()) == {'type': 'FeatureCollection', 'features': []}
+
+
+def test_write_geojson_large_output_in_chunks(tmp_path):
+    rows = ''.join('%d,%d,%s\n' % (i, i, 'n' * 40) for i in range(40000))
+    ds = mapnik.Datasource(type='csv', inline='x,y,name\n' + rows)
+
+    class Recorder(io.BytesIO):
+        calls = 0
+
+        def write(self, data):
+            Recorder.calls += 1
+            return io.BytesIO.write(self, data)
+    out = Recorder()
+    assert ds.write_geojson(None, out, ndjson=True) == 40000
+    assert Recorder.calls > 1
+    assert len(out.getvalue().splitlines()) == 40000